@@ -0,0 +1,201 @@
+"""
+Synthetic Data Generators
+Seeded cohorts, placement posts and resumes for the benchmarks
+
+Every generator takes its own random source, so the same seed always
+produces the same data set regardless of what else has run.
+"""
+import random
+from datetime import date, timedelta
+from typing import Dict, List, Any
+
+import numpy as np
+
+from services.skill_matcher import get_default_matcher
+
+DEPARTMENTS = ["CSE", "ECE", "EEE", "MECH", "CIVIL", "IT"]
+FIRST_NAMES = ["Aarav", "Diya", "Kiran", "Meera", "Rahul", "Sneha", "Vikram", "Ananya"]
+LAST_NAMES = ["Sharma", "Reddy", "Iyer", "Patel", "Nair", "Gupta", "Rao", "Das"]
+COMPANIES = ["Infosys", "TCS", "Wipro", "Zoho", "Accenture", "Freshworks", "Deloitte", "Amazon", "Razorpay", "Cognizant"]
+ROLES = ["Software Engineer", "Data Analyst", "Backend Developer", "Frontend Developer",
+         "DevOps Engineer", "ML Engineer", "QA Engineer", "Cloud Associate"]
+FILLER = [
+    "Designed and implemented", "Collaborated with a team to build", "Optimized the performance of",
+    "Maintained and extended", "Led the migration of", "Wrote automated tests for"
+]
+THINGS = [
+    "a REST API for course registration", "an attendance tracking dashboard", "a data pipeline for sensor logs",
+    "a chatbot for student queries", "a recommendation engine", "an inventory management system"
+]
+
+# Free-text skill spellings students and recruiters actually type, besides dictionary names
+EXTRA_SKILLS = ["Problem Solving", "Communication", "MS Office", "AutoCAD", "MATLAB", "Excel", "Teamwork"]
+
+
+def skill_vocabulary() -> List[str]:
+    """Skill names used by the generators: the dictionary plus a few non-dictionary ones"""
+    return get_default_matcher().canonical + EXTRA_SKILLS
+
+
+def _skill_weights(vocabulary: List[str]) -> np.ndarray:
+    # Zipf-like popularity: a few skills (python, java, sql...) are everywhere
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1) ** 0.8
+    return weights / weights.sum()
+
+
+def session_dates(sessions: int, start: date = date(2024, 7, 1)) -> List[str]:
+    """ISO dates of consecutive working days (Monday to Saturday)"""
+    dates = []
+    day = start
+    while len(dates) < sessions:
+        if day.weekday() != 6:
+            dates.append(day.isoformat())
+        day += timedelta(days=1)
+    return dates
+
+
+def generate_cohort(seed: int, students: int, sessions: int = 90) -> Dict[str, Any]:
+    """
+    Synthetic cohort of students sharing one attendance calendar
+    
+    Attendance rates follow a skewed distribution (most students attend
+    regularly, a tail does not); about one student in ten starts dropping
+    off partway through the term, which is what the anomaly detector looks for.
+    
+    Returns:
+        {"dates": [...], "attendance": students x sessions uint8 matrix,
+         "students": [{"student_id", "department", "semester", "attendance",
+                       "internal_marks", "skills", "applications_count"}]}
+    """
+    rng = np.random.default_rng(seed)
+    py_rng = random.Random(seed)
+    vocabulary = skill_vocabulary()
+    weights = _skill_weights(vocabulary)
+    
+    rates = np.clip(rng.beta(6, 1.5, students), 0.2, 1.0)
+    matrix = (rng.random((students, sessions)) < rates[:, None]).astype(np.uint8)
+    drop_off = rng.random(students) < 0.1
+    for i in np.flatnonzero(drop_off):
+        start = rng.integers(sessions // 3, max(sessions // 3 + 1, sessions - 5))
+        matrix[i, start:] &= (rng.random(sessions - start) < 0.3).astype(np.uint8)
+    
+    ability = rng.normal(65, 15, students)
+    marks_counts = rng.integers(0, 7, students)
+    skills_counts = rng.integers(0, 12, students)
+    semesters = rng.integers(1, 9, students)
+    applications = rng.poisson(2, students)
+    
+    records = []
+    for i in range(students):
+        marks = np.clip(rng.normal(ability[i], 8, marks_counts[i]), 0, 100).round(1)
+        picks = rng.choice(len(vocabulary), size=skills_counts[i], replace=False, p=weights)
+        skills = [vocabulary[j] for j in picks]
+        # Students type skills with inconsistent casing
+        skills = [s.title() if py_rng.random() < 0.5 else s for s in skills]
+        records.append({
+            "student_id": f"S{i:06d}",
+            "department": DEPARTMENTS[i % len(DEPARTMENTS)],
+            "semester": int(semesters[i]),
+            "attendance": round(float(matrix[i].mean()) * 100, 1),
+            "internal_marks": marks.tolist(),
+            "skills": skills,
+            "applications_count": int(applications[i])
+        })
+    
+    return {"dates": session_dates(sessions), "attendance": matrix, "students": records}
+
+
+def attendance_records(cohort: Dict[str, Any], index: int) -> List[Dict[str, Any]]:
+    """One student's attendance in the request shape of detect_anomalies"""
+    return [{"date": d, "status": int(s)} for d, s in zip(cohort["dates"], cohort["attendance"][index])]
+
+
+def generate_posts(seed: int, count: int) -> List[Dict[str, Any]]:
+    """Placement posts with 2-8 required skills each (a few with none)"""
+    rng = np.random.default_rng(seed)
+    vocabulary = skill_vocabulary()
+    weights = _skill_weights(vocabulary)
+    posts = []
+    for i in range(count):
+        n_skills = 0 if rng.random() < 0.03 else int(rng.integers(2, 9))
+        picks = rng.choice(len(vocabulary), size=n_skills, replace=False, p=weights)
+        posts.append({
+            "id": f"P{i:05d}",
+            "company": COMPANIES[i % len(COMPANIES)],
+            "title": ROLES[int(rng.integers(len(ROLES)))],
+            "required_skills": [vocabulary[j] for j in picks]
+        })
+    return posts
+
+
+def generate_resume_text(rng: random.Random, sections: int = 1) -> str:
+    """Synthetic resume text; sections > 1 repeats the body to make longer resumes"""
+    skills = get_default_matcher().canonical
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    lines = [
+        name,
+        f"{name.split()[0].lower()}{rng.randint(1, 999)}@example.com | {rng.randint(6000000000, 9999999999)}",
+        "Objective: " + " ".join(rng.choice(FILLER).lower() + " " + rng.choice(THINGS) for _ in range(3)),
+        "",
+    ]
+    for _ in range(sections):
+        lines += ["Skills: " + ", ".join(rng.sample(skills, 8)), ""]
+        lines += ["Projects:"]
+        lines += [f"{rng.choice(FILLER)} {rng.choice(THINGS)} using {rng.choice(skills)}" for _ in range(4)]
+        lines += ["", "Experience:"]
+        lines += [f"Intern at Company {rng.randint(1, 50)}: {rng.choice(FILLER).lower()} {rng.choice(THINGS)}"
+                  for _ in range(3)]
+        lines += ["", f"Education: B.Tech, University {rng.randint(1, 20)}, {rng.randint(2018, 2026)}", ""]
+    return "\n".join(lines)
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def render_pdf(text: str, lines_per_page: int = 60) -> bytes:
+    """
+    Minimal single-font PDF with one text line per source line
+    
+    Written by hand so the benchmarks need no PDF authoring library; the
+    output is a valid PDF that pdfplumber extracts line by line.
+    """
+    lines = text.split("\n")
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    n = len(pages)
+    
+    # 1 catalog, 2 page tree, 3 font, then a page object and a content stream per page
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>"
+         % (" ".join(f"{4 + 2 * i} 0 R" for i in range(n)), n)).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, page_lines in enumerate(pages):
+        ops = ["BT /F1 10 Tf 12 TL 50 780 Td"]
+        ops += [f"({_pdf_escape(line)}) Tj T*" for line in page_lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", "replace")
+        objects.append(
+            (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {5 + 2 * i} 0 R "
+             f"/Resources << /Font << /F1 3 0 R >> >> >>").encode()
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+    
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def generate_resume_pdfs(seed: int, count: int, max_sections: int = 6) -> List[bytes]:
+    """Resume PDFs from one to several pages long (1 to max_sections repeated blocks)"""
+    rng = random.Random(seed)
+    return [render_pdf(generate_resume_text(rng, rng.randint(1, max_sections))) for _ in range(count)]
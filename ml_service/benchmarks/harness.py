@@ -0,0 +1,101 @@
+"""
+Benchmark Harness
+Timing helpers and run metadata shared by the benchmark scenarios
+"""
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Any, Callable, Optional, Sequence
+
+import numpy as np
+
+
+def _summary(samples_s: List[float]) -> Dict[str, float]:
+    samples = sorted(s * 1000 for s in samples_s)
+    return {
+        "runs": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p50_ms": round(samples[len(samples) // 2], 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "max_ms": round(samples[-1], 4)
+    }
+
+
+def measure(fn: Callable[[], Any], repeat: int = 5, warmup: int = 1) -> Dict[str, float]:
+    """Latency of a whole call, over repeat runs after warmup runs"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return _summary(samples)
+
+
+def measure_each(fn: Callable[[Any], Any], items: Sequence[Any], budget_s: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Per-item latency of fn over items, and the resulting throughput
+    
+    With a budget, stops once budget_s seconds have been spent; the result
+    then reports how far it got and the projected time for all items, which
+    is how a scenario that does not scale shows up. items may be a range,
+    so huge workloads need not be materialized up front.
+    """
+    samples = []
+    started = time.perf_counter()
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - start)
+        if budget_s is not None and start - started > budget_s:
+            break
+    elapsed = time.perf_counter() - started
+    result = _summary(samples)
+    result.update({
+        "items": len(items),
+        "completed": len(samples),
+        "seconds": round(elapsed, 4),
+        "items_per_second": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "complete": len(samples) == len(items)
+    })
+    if not result["complete"]:
+        result["projected_seconds"] = round(elapsed * len(items) / len(samples), 2)
+    return result
+
+
+def measure_once(fn: Callable[[], Any], items: int) -> Dict[str, Any]:
+    """Wall time of one bulk call covering items inputs"""
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    return {
+        "items": items,
+        "seconds": round(elapsed, 4),
+        "items_per_second": round(items / elapsed, 1) if elapsed else 0.0
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def run_metadata() -> Dict[str, Any]:
+    """Where and on what the benchmark ran, so result files can be compared"""
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count()
+    }
@@ -0,0 +1,112 @@
+"""
+Resume Field Extraction Benchmark
+Compares the legacy per-field regex scans with the single segmentation pass
+
+Run from ml_service/:  python -m benchmarks.resume_sections [--resumes 500] [--seed 7]
+"""
+import argparse
+import json
+import random
+import re
+import statistics
+import time
+from typing import Dict, List, Any, Callable
+
+from services.resume import ResumeParser, segment_sections
+
+from .generators import generate_resume_text
+
+
+# Field extraction as it was before the segmentation pass (uncompiled, one scan per
+# field). The skills dictionary scan is left out of both sides: it is the same
+# single matcher pass either way.
+def _legacy_extract(text: str) -> Dict[str, Any]:
+    email = re.findall(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', text)
+    phone = ""
+    for pattern in [r'\b\d{10}\b', r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b',
+                    r'\b\+?\d{1,3}[-.\s]?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}\b']:
+        matches = re.findall(pattern, text)
+        if matches:
+            phone = matches[0]
+            break
+    skills = []
+    match = re.search(r'(?:skills?|technical skills?|technologies?)[:]\s*(.+?)(?:\n\n|\n[A-Z]|$)',
+                      text, re.IGNORECASE | re.DOTALL)
+    if match:
+        skills = [s.strip() for s in re.split(r'[,;•\n]', match.group(1)) if len(s.strip()) > 2]
+    
+    def sections(pattern: str, limit: int) -> List[str]:
+        found = [m.group(1).strip()[:200] for m in re.finditer(pattern, text, re.IGNORECASE | re.DOTALL)]
+        return [f for f in found if f][:limit]
+    
+    summary = ""
+    for pattern in [r'(?:summary|objective|about)[:]\s*(.+?)(?:\n\n|\n(?:Education|Experience|Skills)|$)',
+                    r'^(.{0,300})(?:\n\n|\n(?:Education|Experience|Skills))']:
+        match = re.search(pattern, text, re.IGNORECASE | re.DOTALL | re.MULTILINE)
+        if match and len(match.group(1).strip()) > 50:
+            summary = match.group(1).strip()[:300]
+            break
+    return {
+        "email": email[0] if email else "",
+        "phone": phone,
+        "skills": skills,
+        "projects": sections(r'(?:project|projects?)[:]\s*(.+?)(?:\n\n|\n(?:Education|Experience|Skills)|$)', 5),
+        "education": sections(r'(?:education|degree|university|college)[:]\s*(.+?)(?:\n\n|\n(?:Experience|Skills|Projects)|$)', 3),
+        "experience": sections(r'(?:experience|work|employment)[:]\s*(.+?)(?:\n\n|\n(?:Education|Skills|Projects)|$)', 5),
+        "summary": summary
+    }
+
+
+def _segmented_extract(parser: ResumeParser) -> Callable[[str], Dict[str, Any]]:
+    def extract(text: str) -> Dict[str, Any]:
+        sections = segment_sections(text)
+        return {
+            "email": parser._extract_email(text, sections),
+            "phone": parser._extract_phone(text, sections),
+            "skills": parser._extract_listed_skills(sections),
+            "projects": parser._extract_projects(sections),
+            "education": parser._extract_education(sections),
+            "experience": parser._extract_experience(sections),
+            "summary": parser._extract_summary(sections)
+        }
+    return extract
+
+
+def _time_per_resume(extract: Callable[[str], Any], corpus: List[str]) -> Dict[str, float]:
+    samples = []
+    for text in corpus:
+        start = time.perf_counter()
+        extract(text)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "mean_us": round(statistics.fmean(samples), 1),
+        "p50_us": round(samples[len(samples) // 2], 1),
+        "p95_us": round(samples[int(len(samples) * 0.95)], 1)
+    }
+
+
+def run(resumes: int = 500, seed: int = 7) -> Dict[str, Any]:
+    """Benchmark both implementations on short (1 block) and long (8 blocks) resumes"""
+    rng = random.Random(seed)
+    parser = ResumeParser()
+    results = {"resumes": resumes, "seed": seed, "cases": {}}
+    for label, blocks in (("short", 1), ("long", 8)):
+        corpus = [generate_resume_text(rng, blocks) for _ in range(resumes)]
+        legacy = _time_per_resume(_legacy_extract, corpus)
+        segmented = _time_per_resume(_segmented_extract(parser), corpus)
+        results["cases"][label] = {
+            "avg_chars": round(statistics.fmean(len(t) for t in corpus)),
+            "legacy": legacy,
+            "segmented": segmented,
+            "speedup": round(legacy["mean_us"] / segmented["mean_us"], 2)
+        }
+    return results
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--resumes", type=int, default=500)
+    arg_parser.add_argument("--seed", type=int, default=7)
+    args = arg_parser.parse_args()
+    print(json.dumps(run(args.resumes, args.seed), indent=2))
@@ -0,0 +1,270 @@
+"""
+Service Benchmark Suite
+Microbenchmarks and end-to-end scenarios for every ML service, from one class to a whole campus
+
+Run from ml_service/:
+    python -m benchmarks.suite [--scales class,department,campus] [--services risk,skills]
+                               [--seed 42] [--budget 30] [--output results.json] [--baseline old.json]
+
+Microbenchmarks time single calls on a sample of inputs. End-to-end
+scenarios run the workload a scale implies (e.g. every student against every
+post); per-item scenarios stop after --budget seconds and report the
+projected total instead, which marks where a service stops scaling.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from typing import Dict, List, Any, Callable
+
+from services.attendance import AttendanceAnomalyDetector, IncrementalAnomalyDetector
+from services.recommend import PlacementRecommender
+from services.resume import ResumeParser, extract_text
+from services.resume_cache import ResumeCache
+from services.resume_pipeline import ResumePipeline
+from services.risk import RiskPredictor
+from services.skills import SkillGapAnalyzer
+
+from .generators import attendance_records, generate_cohort, generate_posts, generate_resume_pdfs
+from .harness import measure, measure_each, measure_once, run_metadata
+
+SCALES = {
+    "class": {"students": 60, "posts": 20, "sessions": 90, "resumes": 20},
+    "department": {"students": 600, "posts": 100, "sessions": 90, "resumes": 100},
+    "campus": {"students": 10000, "posts": 500, "sessions": 90, "resumes": 300},
+}
+
+# Inputs timed individually by the microbenchmarks
+MICRO_SAMPLE = 500
+
+
+def bench_attendance(data: Dict[str, Any], budget: float) -> Dict[str, Any]:
+    cohort = data["cohort"]
+    detector = AttendanceAnomalyDetector()
+    students = len(cohort["students"])
+    sample = range(min(MICRO_SAMPLE, students))
+    sample_records = [attendance_records(cohort, i) for i in sample]
+    
+    def incremental() -> None:
+        tracker = IncrementalAnomalyDetector()
+        ids = [s["student_id"] for s in cohort["students"]]
+        for day, date in enumerate(cohort["dates"]):
+            column = cohort["attendance"][:, day].tolist()
+            for student_id, status in zip(ids, column):
+                tracker.record(student_id, date, status)
+    
+    return {
+        "micro": {
+            "detect_anomalies": measure_each(detector.detect_anomalies, sample_records)
+        },
+        "end_to_end": {
+            # Per-student requests, including building each request's records
+            "cohort_per_student": measure_each(
+                lambda i: detector.detect_anomalies(attendance_records(cohort, i)), range(students), budget
+            ),
+            "cohort_matrix": measure_once(
+                lambda: detector.detect_anomalies_matrix(cohort["attendance"], cohort["dates"]), students
+            ),
+            "incremental_term": measure_once(incremental, students * len(cohort["dates"]))
+        }
+    }
+
+
+def bench_risk(data: Dict[str, Any], budget: float) -> Dict[str, Any]:
+    students = data["cohort"]["students"]
+    predictor = RiskPredictor()
+    args = [(s["attendance"], s["internal_marks"], len(s["skills"]), s["applications_count"], s["semester"])
+            for s in students]
+    columns = [list(column) for column in zip(*args)]
+    return {
+        "micro": {
+            "predict": measure_each(lambda a: predictor.predict(*a), args[:MICRO_SAMPLE])
+        },
+        "end_to_end": {
+            "cohort_per_student": measure_each(lambda a: predictor.predict(*a), args, budget),
+            "cohort_batch": measure_once(lambda: predictor.predict_batch(*columns), len(args))
+        }
+    }
+
+
+def bench_skills(data: Dict[str, Any], budget: float) -> Dict[str, Any]:
+    students = [s["skills"] for s in data["cohort"]["students"]]
+    posts = [p["required_skills"] for p in data["posts"]]
+    analyzer = SkillGapAnalyzer()
+    n_posts = len(posts)
+    
+    def pair(k: int):
+        return students[k // n_posts], posts[k % n_posts]
+    
+    return {
+        "micro": {
+            "analyze": measure_each(
+                lambda k: analyzer.analyze(*pair(k)), range(min(MICRO_SAMPLE, len(students) * n_posts))
+            )
+        },
+        "end_to_end": {
+            # What the HOD skill-gap route asks for: every student against every post
+            "students_x_posts_per_pair": measure_each(
+                lambda k: analyzer.analyze(*pair(k)), range(len(students) * n_posts), budget
+            ),
+            "students_x_posts_matrix": measure_once(
+                lambda: analyzer.analyze_matrix(students, posts), len(students) * n_posts
+            )
+        }
+    }
+
+
+def bench_recommend(data: Dict[str, Any], budget: float) -> Dict[str, Any]:
+    students = [s["skills"] for s in data["cohort"]["students"]]
+    posts = data["posts"]
+    recommender = PlacementRecommender()
+    indexed = PlacementRecommender()
+    return {
+        "micro": {
+            "recommend": measure_each(lambda skills: recommender.recommend(skills, posts), students[:MICRO_SAMPLE]),
+            "register_posts": measure(lambda: PlacementRecommender().register_posts(posts), repeat=3)
+        },
+        "end_to_end": {
+            "all_students_scan": measure_each(lambda skills: recommender.recommend(skills, posts), students, budget),
+            "index_build": measure_once(lambda: indexed.register_posts(posts), len(posts)),
+            "all_students_indexed_top10": measure_each(
+                lambda skills: indexed.recommend_indexed(skills, 10), students, budget
+            )
+        }
+    }
+
+
+async def _pipeline_run(pdfs: List[bytes], workers: int) -> None:
+    pipeline = ResumePipeline(workers=workers, cache=None)
+    try:
+        async for _ in pipeline.parse_many(enumerate(pdfs)):
+            pass
+    finally:
+        pipeline.shutdown()
+
+
+def bench_resume(data: Dict[str, Any], budget: float) -> Dict[str, Any]:
+    pdfs = data["resumes"]
+    parser = ResumeParser()
+    # Pay for the lazy spaCy load before anything is timed
+    parser.parse(pdfs[0])
+    cached = ResumeParser(cache=ResumeCache(max_entries=len(pdfs)))
+    for pdf in pdfs:
+        cached.parse(pdf)
+    return {
+        "micro": {
+            "extract_text": measure_each(extract_text, pdfs[:MICRO_SAMPLE]),
+            "parse": measure_each(parser.parse, pdfs[:MICRO_SAMPLE]),
+            "parse_cache_hit": measure_each(cached.parse, pdfs[:MICRO_SAMPLE])
+        },
+        "end_to_end": {
+            "avg_pdf_bytes": round(sum(len(p) for p in pdfs) / len(pdfs)),
+            "serial": measure_each(parser.parse, pdfs, budget),
+            # Includes starting the worker processes
+            "pipeline_2_workers": measure_once(lambda: asyncio.run(_pipeline_run(pdfs, 2)), len(pdfs))
+        }
+    }
+
+
+SERVICES: Dict[str, Callable[[Dict[str, Any], float], Dict[str, Any]]] = {
+    "attendance": bench_attendance,
+    "recommend": bench_recommend,
+    "resume": bench_resume,
+    "risk": bench_risk,
+    "skills": bench_skills,
+}
+
+
+def build_data(scale: Dict[str, int], seed: int, services: List[str]) -> Dict[str, Any]:
+    """Synthetic inputs for one scale; resumes are only rendered when needed"""
+    return {
+        "cohort": generate_cohort(seed, scale["students"], scale["sessions"]),
+        "posts": generate_posts(seed + 1, scale["posts"]),
+        "resumes": generate_resume_pdfs(seed + 2, scale["resumes"]) if "resume" in services else []
+    }
+
+
+def run(scales: List[str], services: List[str], seed: int = 42, budget: float = 30.0) -> Dict[str, Any]:
+    results: Dict[str, Any] = {
+        "meta": run_metadata(),
+        "config": {"seed": seed, "budget_seconds": budget, "micro_sample": MICRO_SAMPLE},
+        "scales": {}
+    }
+    for name in scales:
+        scale = SCALES[name]
+        data = build_data(scale, seed, services)
+        scale_results = {"size": scale}
+        for service in services:
+            print(f"[{name}] {service}...", file=sys.stderr)
+            scale_results[service] = SERVICES[service](data, budget)
+        results["scales"][name] = scale_results
+    return results
+
+
+def _timings(results: Dict[str, Any]) -> Dict[str, float]:
+    """Flatten results into {"scale/service/kind/scenario": seconds per item or call}"""
+    flat = {}
+    for scale, services in results.get("scales", {}).items():
+        for service, kinds in services.items():
+            if service == "size":
+                continue
+            for kind, scenarios in kinds.items():
+                for scenario, stats in scenarios.items():
+                    if not isinstance(stats, dict):
+                        continue
+                    key = f"{scale}/{service}/{kind}/{scenario}"
+                    if "mean_ms" in stats:
+                        flat[key] = stats["mean_ms"]
+                    elif stats.get("items_per_second"):
+                        flat[key] = 1000 / stats["items_per_second"]
+    return flat
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Per-scenario change against a baseline result file
+    
+    Returns:
+        {scenario: {"baseline_ms", "current_ms", "ratio"}}; ratio > 1 is slower
+    """
+    before, after = _timings(baseline), _timings(current)
+    return {
+        key: {
+            "baseline_ms": round(before[key], 4),
+            "current_ms": round(after[key], 4),
+            "ratio": round(after[key] / before[key], 3) if before[key] else None
+        }
+        for key in sorted(before.keys() & after.keys())
+    }
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--scales", default="class,department",
+                            help=f"Comma-separated scales ({', '.join(SCALES)})")
+    arg_parser.add_argument("--services", default=",".join(SERVICES),
+                            help=f"Comma-separated services ({', '.join(SERVICES)})")
+    arg_parser.add_argument("--seed", type=int, default=42)
+    arg_parser.add_argument("--budget", type=float, default=30.0,
+                            help="Seconds a per-item end-to-end scenario may run before it is projected")
+    arg_parser.add_argument("--output", help="Write JSON here instead of stdout")
+    arg_parser.add_argument("--baseline", help="Earlier result file to compare against")
+    args = arg_parser.parse_args()
+    
+    scales = [s for s in args.scales.split(",") if s]
+    services = [s for s in args.services.split(",") if s]
+    unknown = [s for s in scales if s not in SCALES] + [s for s in services if s not in SERVICES]
+    if unknown:
+        arg_parser.error(f"Unknown scale or service: {', '.join(unknown)}")
+    
+    report = run(scales, services, args.seed, args.budget)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["comparison"] = compare(json.load(f), report)
+    
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
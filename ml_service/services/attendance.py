@@ -1,17 +1,57 @@
 """
 Attendance Anomaly Detection Service
-Detects anomalies in student attendance patterns
+Detects anomalies in student attendance patterns and forecasts end-of-term attendance
 """
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence, Tuple, TYPE_CHECKING
 from datetime import datetime
+import os
 import numpy as np
-from collections import Counter
+from collections import Counter, deque
+
+from . import metrics
+
+if TYPE_CHECKING:
+    from .feature_store import FeatureStore
+
+_MATRIX_ITEMS = metrics.BATCH_ITEMS.labels("attendance", "detect_anomalies_matrix")
+
+
+def _z_flags_absence(total: int, total_sq: int, n: int) -> bool:
+    """
+    Whether an absence's z-score |(0 - mean) / std| exceeds 1.5, decided in
+    integers from the sum and sum of squares of n statuses
+    
+    With variance (n * total_sq - total**2) / n**2 the rule is
+    4 * total**2 > 9 * (n * total_sq - total**2). A float std can land on
+    either side of 1.5 when the two are equal (e.g. 18 of 26 days present),
+    depending on the order of the days; this way every detector agrees.
+    """
+    spread = n * total_sq - total * total
+    if spread == 0:
+        # std 0 counts as 1
+        return 2 * abs(total) > 3 * n
+    return 4 * total * total > 9 * spread
+
+
+def _classify_pattern(attendance_rate: float, anomaly_ratio: float) -> Tuple[str, float]:
+    """Attendance pattern and confidence from the attendance rate and share of anomalous days"""
+    # If many anomalies detected, mark as at-risk
+    if anomaly_ratio > 0.2:
+        return "at-risk", 0.85
+    if attendance_rate >= 0.85:
+        return "regular", 0.9
+    elif attendance_rate >= 0.70:
+        return "mostly_regular", 0.7
+    elif attendance_rate >= 0.50:
+        return "inconsistent", 0.8
+    return "at-risk", 0.9
 
 
 class AttendanceAnomalyDetector:
     def __init__(self):
         pass
     
+    @metrics.timed("attendance", "detect_anomalies")
     def detect_anomalies(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         Detect anomalies in attendance records
@@ -56,6 +96,7 @@ class AttendanceAnomalyDetector:
         window_size = min(5, len(statuses))
         moving_averages = []
         anomaly_days = []
+        anomaly_set = set()
         
         for i in range(len(statuses)):
             start_idx = max(0, i - window_size + 1)
@@ -67,38 +108,22 @@ class AttendanceAnomalyDetector:
             if i >= window_size - 1:
                 if statuses[i] == 0 and avg > 0.7:
                     anomaly_days.append(dates[i])
+                    anomaly_set.add(dates[i])
         
         # Calculate z-scores for more sophisticated detection
         if len(statuses) > 5:
-            mean_attendance = np.mean(statuses)
-            std_attendance = np.std(statuses) if np.std(statuses) > 0 else 1
+            z_flagged = _z_flags_absence(sum(statuses), sum(s * s for s in statuses), len(statuses))
             
             for i, (date, status) in enumerate(zip(dates, statuses)):
                 if i >= window_size - 1:
-                    z_score = abs((status - mean_attendance) / std_attendance)
                     # If absent and z-score indicates anomaly
-                    if status == 0 and z_score > 1.5 and date not in anomaly_days:
+                    if status == 0 and z_flagged and date not in anomaly_set:
                         anomaly_days.append(date)
+                        anomaly_set.add(date)
         
         # Determine pattern
-        if attendance_rate >= 0.85:
-            pattern = "regular"
-            confidence = 0.9
-        elif attendance_rate >= 0.70:
-            pattern = "mostly_regular"
-            confidence = 0.7
-        elif attendance_rate >= 0.50:
-            pattern = "inconsistent"
-            confidence = 0.8
-        else:
-            pattern = "at-risk"
-            confidence = 0.9
-        
-        # If many anomalies detected, mark as at-risk
         anomaly_ratio = len(anomaly_days) / len(dates) if dates else 0
-        if anomaly_ratio > 0.2:
-            pattern = "at-risk"
-            confidence = 0.85
+        pattern, confidence = _classify_pattern(attendance_rate, anomaly_ratio)
         
         return {
             "pattern": pattern,
@@ -109,4 +134,421 @@ class AttendanceAnomalyDetector:
             "present_days": sum(statuses),
             "absent_days": len(statuses) - sum(statuses)
         }
+    
+    @metrics.timed("attendance", "detect_anomalies_matrix")
+    def detect_anomalies_matrix(self, matrix: np.ndarray, dates: Optional[Sequence[str]] = None,
+                                n_days: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Detect anomalies for every student of a course at once
+        
+        Args:
+            matrix: students x days array of attendance (1=present, 0=absent).
+                    A uint8 array produced by np.packbits(..., axis=1) is also
+                    accepted when n_days is given.
+            dates: Date label for each day column (defaults to the column index)
+            n_days: Number of days in a bit-packed matrix
+            
+        Returns:
+            One result per student (row), in the same shape as detect_anomalies
+        """
+        matrix = np.asarray(matrix)
+        if n_days is not None:
+            matrix = np.unpackbits(matrix.astype(np.uint8, copy=False), axis=1, count=n_days)
+        if matrix.ndim != 2:
+            raise ValueError("Attendance matrix must be 2-dimensional (students x days)")
+        _MATRIX_ITEMS.observe(matrix.shape[0])
+        
+        n_students, n = matrix.shape
+        if dates is None:
+            dates = list(range(n))
+        elif len(dates) != n:
+            raise ValueError("dates must have one entry per day column")
+        
+        if n == 0:
+            return [{
+                "pattern": "insufficient_data",
+                "anomaly_days": [],
+                "confidence": 0.0
+            } for _ in range(n_students)]
+        
+        statuses = (matrix != 0).astype(np.int64)
+        present = statuses.sum(axis=1)
+        attendance_rate = present / n
+        absent = statuses == 0
+        
+        # Moving average over a full window, via cumulative sums
+        window_size = min(5, n)
+        csum = np.zeros((n_students, n + 1), dtype=np.int64)
+        np.cumsum(statuses, axis=1, out=csum[:, 1:])
+        checked = np.zeros(n, dtype=bool)
+        checked[window_size - 1:] = True
+        window_avg = np.zeros((n_students, n))
+        window_avg[:, window_size - 1:] = (csum[:, window_size:] - csum[:, :n - window_size + 1]) / window_size
+        drop_anomaly = absent & checked & (window_avg > 0.7)
+        
+        # z-score of an absence (same value for every absent day of a student)
+        if n > 5:
+            # Statuses are 0/1, so the sum of squares is the present count (see _z_flags_absence)
+            spread = n * present - present * present
+            z_flagged = np.where(spread == 0, 2 * present > 3 * n, 4 * present * present > 9 * spread)
+            z_anomaly = absent & checked & z_flagged[:, None] & ~drop_anomaly
+        else:
+            z_anomaly = np.zeros_like(drop_anomaly)
+        
+        anomaly_count = drop_anomaly.sum(axis=1) + z_anomaly.sum(axis=1)
+        anomaly_ratio = anomaly_count / n
+        
+        pattern_codes = np.select(
+            [anomaly_ratio > 0.2, attendance_rate >= 0.85, attendance_rate >= 0.70, attendance_rate >= 0.50],
+            [4, 0, 1, 2], default=3
+        )
+        patterns = ["regular", "mostly_regular", "inconsistent", "at-risk", "at-risk"]
+        confidences = [0.9, 0.7, 0.8, 0.9, 0.85]
+        rates = np.round(attendance_rate * 100, 2)
+        
+        results = []
+        for i in range(n_students):
+            # Moving-average anomalies come first, then z-score ones, as in detect_anomalies
+            first_days = np.flatnonzero(drop_anomaly[i])[:10]
+            if len(first_days) < 10:
+                first_days = np.concatenate([first_days, np.flatnonzero(z_anomaly[i])[:10 - len(first_days)]])
+            code = pattern_codes[i]
+            results.append({
+                "pattern": patterns[code],
+                "anomaly_days": [dates[d] for d in first_days.tolist()],
+                "confidence": confidences[code],
+                "attendance_rate": float(rates[i]),
+                "total_days": n,
+                "present_days": int(present[i]),
+                "absent_days": n - int(present[i])
+            })
+        return results
+    
+    def detect_stored(self, store: "FeatureStore",
+                      student_ids: Optional[Sequence[Any]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Detect anomalies for students held in a FeatureStore, by ID
+        
+        Students sharing a session calendar are scored together through
+        detect_anomalies_matrix, straight from the store's arrays.
+        
+        Args:
+            store: Feature store holding the attendance events
+            student_ids: Students to score (every student in the store when None)
+            
+        Returns:
+            Mapping of student ID to a result shaped like detect_anomalies
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        for ids, dates, matrix in store.attendance_groups(student_ids):
+            if matrix.shape[1] == 0:
+                group_results = [self.detect_anomalies([]) for _ in ids]
+            else:
+                group_results = self.detect_anomalies_matrix(matrix, dates)
+            results.update(zip(ids, group_results))
+        order = store.student_ids(with_features=False) if student_ids is None else [str(sid) for sid in student_ids]
+        return {sid: results[sid] for sid in order if sid in results}
+
 
+class AttendanceState:
+    """
+    Rolling attendance state of one student, updated in O(1) per session
+    
+    Keeps a ring buffer of the last WINDOW sessions with its running sum, the
+    running sum and sum of squares of all statuses (for mean/std), and the
+    anomaly bookkeeping detect_anomalies would produce over the full history:
+    the moving-window anomalies (a set plus the first ten), and the absent
+    days the z-score rule flags whenever it applies.
+    
+    Sessions are assumed to arrive in date order with distinct dates, which is
+    how the anomaly route builds its records.
+    """
+    WINDOW = 5
+    
+    def __init__(self):
+        self.window: deque = deque(maxlen=self.WINDOW)
+        self.window_sum = 0
+        self.count = 0
+        self.total = 0
+        self.total_sq = 0
+        self.anomaly_dates = set()
+        self.first_anomalies: List[Any] = []
+        # Absent days past the first window that are not window anomalies;
+        # they become anomalies while the z-score rule is triggered
+        self.absent_checked = 0
+        self.first_z_candidates: List[Any] = []
+    
+    def update(self, date: Any, status: int) -> None:
+        """Add one session (status 1=present, 0=absent)"""
+        status = 1 if int(status) else 0
+        if len(self.window) == self.WINDOW:
+            self.window_sum -= self.window[0][1]
+        self.window.append((date, status))
+        self.window_sum += status
+        self.count += 1
+        self.total += status
+        self.total_sq += status * status
+        
+        if self.count >= self.WINDOW and status == 0:
+            self.absent_checked += 1
+            if self.window_sum / self.WINDOW > 0.7:
+                self.anomaly_dates.add(date)
+                if len(self.first_anomalies) < 10:
+                    self.first_anomalies.append(date)
+            elif len(self.first_z_candidates) < 10:
+                self.first_z_candidates.append(date)
+    
+    def result(self) -> Dict[str, Any]:
+        """Current anomaly status, same shape as detect_anomalies"""
+        n = self.count
+        if n == 0:
+            return {
+                "pattern": "insufficient_data",
+                "anomaly_days": [],
+                "confidence": 0.0
+            }
+        
+        if n < self.WINDOW:
+            # The window spans the whole history; only the last day is checked
+            last_date, last_status = self.window[-1]
+            anomaly_days = [last_date] if last_status == 0 and self.total / n > 0.7 else []
+            anomaly_count = len(anomaly_days)
+        else:
+            anomaly_days = list(self.first_anomalies)
+            anomaly_count = len(self.anomaly_dates)
+            if n > self.WINDOW:
+                if _z_flags_absence(self.total, self.total_sq, n):
+                    anomaly_count += self.absent_checked - len(self.anomaly_dates)
+                    anomaly_days += self.first_z_candidates[:10 - len(anomaly_days)]
+        
+        attendance_rate = self.total / n
+        pattern, confidence = _classify_pattern(attendance_rate, anomaly_count / n)
+        return {
+            "pattern": pattern,
+            "anomaly_days": anomaly_days,
+            "confidence": round(confidence, 2),
+            "attendance_rate": round(attendance_rate * 100, 2),
+            "total_days": n,
+            "present_days": self.total,
+            "absent_days": n - self.total
+        }
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable snapshot"""
+        return {
+            "window": [list(item) for item in self.window],
+            "count": self.count,
+            "total": self.total,
+            "total_sq": self.total_sq,
+            "anomaly_dates": list(self.anomaly_dates),
+            "first_anomalies": self.first_anomalies,
+            "absent_checked": self.absent_checked,
+            "first_z_candidates": self.first_z_candidates
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AttendanceState":
+        state = cls()
+        state.window.extend((date, status) for date, status in data["window"])
+        state.window_sum = sum(status for _, status in state.window)
+        state.count = data["count"]
+        state.total = data["total"]
+        state.total_sq = data["total_sq"]
+        state.anomaly_dates = set(data["anomaly_dates"])
+        state.first_anomalies = list(data["first_anomalies"])
+        state.absent_checked = data["absent_checked"]
+        state.first_z_candidates = list(data["first_z_candidates"])
+        return state
+
+
+class IncrementalAnomalyDetector:
+    """
+    Keeps an AttendanceState per student so anomaly status stays current as
+    attendance is marked, without reprocessing history
+    
+    States are keyed by str(student_id), as in the feature store, so 42 and
+    "42" are one student and the keys survive a snapshot round trip.
+    """
+    
+    def __init__(self):
+        self.states: Dict[str, AttendanceState] = {}
+    
+    def record(self, student_id: Any, date: Any, status: int) -> Dict[str, Any]:
+        """Add one session for a student and return the updated status"""
+        student_id = str(student_id)
+        state = self.states.get(student_id)
+        if state is None:
+            state = self.states[student_id] = AttendanceState()
+        state.update(date, status)
+        return state.result()
+    
+    def load_history(self, student_id: Any, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Replace a student's state with one built from past records
+        (oldest first, same format as detect_anomalies)
+        """
+        state = AttendanceState()
+        for record in records:
+            try:
+                state.update(record.get("date", ""), int(record.get("status", 0)))
+            except (ValueError, KeyError):
+                continue
+        self.states[str(student_id)] = state
+        return state.result()
+    
+    def status(self, student_id: Any) -> Dict[str, Any]:
+        """Current anomaly status of a student"""
+        state = self.states.get(str(student_id))
+        return state.result() if state is not None else AttendanceState().result()
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-serializable snapshot of every student's state"""
+        return {student_id: state.to_dict() for student_id, state in self.states.items()}
+    
+    def restore(self, snapshot: Dict[str, Any]) -> None:
+        """Replace all states with those from a snapshot"""
+        self.states = {str(student_id): AttendanceState.from_dict(data) for student_id, data in snapshot.items()}
+
+
+# Attendance levels RiskPredictor cares about: below 60% / 65% it raises
+# risk, below 75% it recommends improving attendance
+FORECAST_THRESHOLDS = (75, 65, 60)
+# Sessions in a term when the caller does not say
+TERM_SESSIONS = int(os.environ.get("ATTENDANCE_TERM_SESSIONS", "90"))
+# Half-life, in sessions, of the weight recent attendance gets in the forecast
+FORECAST_HALFLIFE = float(os.environ.get("ATTENDANCE_FORECAST_HALFLIFE", "10"))
+# Points the recent rate must differ from the overall rate to count as a trend
+TREND_MARGIN = 5.0
+
+_FORECAST_ITEMS = metrics.BATCH_ITEMS.labels("attendance", "forecast_matrix")
+
+
+class AttendanceForecaster:
+    """
+    Projects end-of-term attendance from the sessions held so far
+    
+    Remaining sessions are assumed to be attended at the student's recent
+    rate, an exponentially weighted mean of past sessions (half-life
+    FORECAST_HALFLIFE sessions), so a student who has started skipping is
+    projected lower than their overall percentage suggests. A whole cohort
+    is one matrix-vector product.
+    """
+    
+    def __init__(self, halflife: float = FORECAST_HALFLIFE, thresholds: Sequence[float] = FORECAST_THRESHOLDS):
+        self.halflife = halflife
+        self.thresholds = tuple(thresholds)
+    
+    @metrics.timed("attendance", "forecast_matrix")
+    def forecast_matrix(self, matrix: np.ndarray, total_sessions: Optional[int] = None,
+                        n_days: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Forecast every student of a course at once
+        
+        Args:
+            matrix: students x sessions-held array of attendance (1=present, 0=absent);
+                    bit-packed rows are accepted with n_days, as in detect_anomalies_matrix
+            total_sessions: Sessions in the whole term (TERM_SESSIONS when None;
+                            never fewer than those already held)
+            n_days: Number of sessions in a bit-packed matrix
+            
+        Returns:
+            One forecast per student (row):
+            {"forecast": projected end-of-term %, "current_attendance", "recent_rate",
+             "trend", "sessions_held", "sessions_remaining", "max_attainable",
+             "classes_can_miss": {"75": n, "65": n, "60": n}}
+        """
+        matrix = np.asarray(matrix)
+        if n_days is not None:
+            matrix = np.unpackbits(matrix.astype(np.uint8, copy=False), axis=1, count=n_days)
+        if matrix.ndim != 2:
+            raise ValueError("Attendance matrix must be 2-dimensional (students x sessions)")
+        _FORECAST_ITEMS.observe(matrix.shape[0])
+        
+        n_students, held = matrix.shape
+        total = max(held, total_sessions if total_sessions is not None else TERM_SESSIONS)
+        remaining = total - held
+        statuses = (matrix != 0).astype(np.float64)
+        present = statuses.sum(axis=1)
+        
+        if held:
+            # Newest session weighs 1, one half-life earlier weighs 0.5, ...
+            weights = 0.5 ** (np.arange(held - 1, -1, -1) / self.halflife)
+            recent = statuses @ (weights / weights.sum())
+            current = present / held
+        else:
+            recent = current = np.zeros(n_students)
+        projected_present = present + recent * remaining
+        forecast = np.round(projected_present / total * 100, 2) if total else np.zeros(n_students)
+        max_attainable = np.round((present + remaining) / total * 100, 2) if total else np.zeros(n_students)
+        
+        # Misses m keep a student at or above t% while present + remaining - m >= t% of total
+        can_miss = {
+            threshold: np.clip(np.floor(present + remaining - threshold / 100 * total + 1e-9), 0, remaining).astype(int)
+            for threshold in self.thresholds
+        }
+        
+        trend_delta = (recent - current) * 100
+        trends = np.where(trend_delta >= TREND_MARGIN, "improving",
+                          np.where(trend_delta <= -TREND_MARGIN, "declining", "stable"))
+        current_pct = np.round(current * 100, 2)
+        recent_pct = np.round(recent * 100, 2)
+        
+        results = []
+        for i in range(n_students):
+            results.append({
+                "forecast": float(forecast[i]) if held else None,
+                "current_attendance": float(current_pct[i]) if held else None,
+                "recent_rate": float(recent_pct[i]) if held else None,
+                "trend": str(trends[i]) if held else "insufficient_data",
+                "sessions_held": held,
+                "sessions_remaining": remaining,
+                "max_attainable": float(max_attainable[i]),
+                "classes_can_miss": {str(t): int(can_miss[t][i]) for t in self.thresholds}
+            })
+        return results
+    
+    def forecast(self, records: List[Dict[str, Any]], total_sessions: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Forecast one student from attendance records (same format as detect_anomalies)
+        """
+        statuses = []
+        for record in records:
+            try:
+                statuses.append(1 if int(record.get("status", 0)) else 0)
+            except (ValueError, KeyError):
+                continue
+        return self.forecast_matrix(np.array([statuses], dtype=np.uint8).reshape(1, len(statuses)),
+                                    total_sessions)[0]
+    
+    def forecast_stored(self, store: "FeatureStore", student_ids: Optional[Sequence[Any]] = None,
+                        total_sessions: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Forecast students held in a FeatureStore, by ID (students sharing a
+        session calendar are forecast together)
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        for ids, _, matrix in store.attendance_groups(student_ids):
+            results.update(zip(ids, self.forecast_matrix(matrix, total_sessions)))
+        order = store.student_ids(with_features=False) if student_ids is None else [str(sid) for sid in student_ids]
+        return {sid: results[sid] for sid in order if sid in results}
+    
+    def cohort_summary(self, forecasts: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Department-wide view of a set of forecasts
+        
+        Returns:
+            {"students", "average_forecast", "projected_below": {"75": n, ...},
+             "cannot_reach": {"75": n, ...}, "trends": {"declining": n, ...}}
+        """
+        projected = np.array([f["forecast"] for f in forecasts if f["forecast"] is not None], dtype=np.float64)
+        attainable = np.array([f["max_attainable"] for f in forecasts], dtype=np.float64)
+        trends: Dict[str, int] = {}
+        for f in forecasts:
+            trends[f["trend"]] = trends.get(f["trend"], 0) + 1
+        return {
+            "students": len(forecasts),
+            "average_forecast": round(float(projected.mean()), 2) if len(projected) else None,
+            "projected_below": {str(t): int((projected < t).sum()) for t in self.thresholds},
+            "cannot_reach": {str(t): int((attainable < t).sum()) for t in self.thresholds},
+            "trends": trends
+        }
@@ -0,0 +1,541 @@
+"""
+Attendance Ingestion Service
+Streams attendance exports (CSV or XLSX) into per-student anomaly summaries
+
+Two layouts are recognised from the header row:
+    
+    long    one row per mark: student, date, status
+            (e.g. student_id,date,status / S001,2025-09-01,P)
+    wide    one row per student, one column per day
+            (e.g. HallTicketNo,2025-09-01,2025-09-02,... / 247Z1A0401,P,A,...)
+
+Rows are read in chunks and folded into per-student state as they go, so
+memory grows with the number of students, never with the number of rows.
+Long exports keep an AttendanceState per student, which gives the same
+result as detect_anomalies over that student's full history; several marks
+on one day (one per period) collapse into a single day, present if any of
+them is. Wide chunks are scored directly through detect_anomalies_matrix.
+
+Long exports must list each student's days in date order (exports written
+day by day or student by student both do); a mark dated before the
+student's latest day is counted as out of order and skipped.
+
+Run from ml_service/:  python -m services.attendance_ingest export.csv [--output summary.csv]
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
+import os
+import sys
+import zipfile
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Sequence, Tuple, Union
+from xml.etree import ElementTree
+
+import numpy as np
+
+from . import metrics
+from .attendance import AttendanceAnomalyDetector, AttendanceState
+
+CHUNK_ROWS = int(os.environ.get("ATTENDANCE_INGEST_CHUNK_ROWS", "5000"))
+
+LAYOUT_LONG = "long"
+LAYOUT_WIDE = "wide"
+
+# Header names recognised when columns are not given explicitly (compared lowercased, separators removed)
+STUDENT_COLUMNS = ("studentid", "student", "hallticketno", "hallticket", "rollno", "roll", "regno", "usn", "id")
+DATE_COLUMNS = ("date", "day", "sessiondate", "classdate")
+STATUS_COLUMNS = ("status", "attendance", "present", "mark", "value")
+
+PRESENT_VALUES = frozenset({"1", "p", "present", "y", "yes", "true"})
+ABSENT_VALUES = frozenset({"0", "a", "absent", "n", "no", "false", "ab"})
+
+DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%Y/%m/%d", "%d.%m.%Y", "%d-%b-%Y", "%d %b %Y")
+# Spreadsheet serial day numbers (1954..2119) are read as dates
+_SERIAL_RANGE = (20000, 80000)
+_SERIAL_EPOCH = date(1899, 12, 30)
+
+# Number of header rows searched before giving up (sheets often carry a title block)
+MAX_HEADER_ROWS = 50
+# Bound on remembered raw date/status cells
+MAX_CACHED_VALUES = 10000
+
+ROWS = metrics.counter("ml_attendance_ingest_rows_total", "Attendance export rows read, by outcome", ("outcome",))
+_ROWS_USED = ROWS.labels("used")
+_ROWS_SKIPPED = ROWS.labels("skipped")
+_ROWS_OUT_OF_ORDER = ROWS.labels("out_of_order")
+_STAGE_CHUNK = metrics.Stage("attendance_ingest", "chunk")
+
+_SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+
+class IngestError(ValueError):
+    """The export could not be read as attendance (no header, unknown layout, bad file)"""
+
+
+def _normalize_header(value: Any) -> str:
+    return "".join(ch for ch in str(value or "").lower() if ch.isalnum())
+
+
+def parse_date(value: Any) -> Optional[str]:
+    """ISO date for a cell value, or None when it is not a date"""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if _SERIAL_RANGE[0] <= value <= _SERIAL_RANGE[1]:
+            return (_SERIAL_EPOCH + timedelta(days=int(value))).isoformat()
+        return None
+    text = str(value or "").strip()
+    if not text:
+        return None
+    if text.replace(".", "", 1).isdigit():
+        return parse_date(float(text))
+    text = text.split("T")[0].split(" ")[0] if len(text) > 10 and text[4:5] == "-" else text
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_status(value: Any) -> Optional[int]:
+    """1 for present, 0 for absent, None for anything else (blank, holiday, leave codes)"""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return 1 if value else 0
+    text = str(value or "").strip().lower()
+    if text in PRESENT_VALUES:
+        return 1
+    if text in ABSENT_VALUES:
+        return 0
+    return None
+
+
+def iter_csv_rows(source: Union[str, os.PathLike, io.TextIOBase], delimiter: Optional[str] = None) -> Iterator[List[str]]:
+    """Rows of a CSV file (delimiter sniffed when not given)"""
+    handle = open(source, newline="", encoding="utf-8-sig") if isinstance(source, (str, os.PathLike)) else source
+    try:
+        if delimiter is None:
+            sample = handle.read(8192)
+            try:
+                delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+            except csv.Error:
+                delimiter = ","
+            rows = csv.reader(_rejoin(sample, handle), delimiter=delimiter)
+        else:
+            rows = csv.reader(handle, delimiter=delimiter)
+        yield from rows
+    finally:
+        if handle is not source:
+            handle.close()
+
+
+def _rejoin(sample: str, handle: io.TextIOBase) -> Iterator[str]:
+    """Lines of a text stream whose first chunk was already read for sniffing"""
+    lines = sample.splitlines(keepends=True)
+    if lines and not lines[-1].endswith(("\n", "\r")):
+        # The sample ended mid-line; finish that line from the stream
+        lines[-1] += handle.readline()
+    yield from lines
+    yield from handle
+
+
+def iter_xlsx_rows(source: Union[str, os.PathLike, io.BufferedIOBase], sheet: Optional[str] = None) -> Iterator[List[Any]]:
+    """
+    Rows of one worksheet of an XLSX workbook, streamed from the zip
+    
+    Reads the sheet XML incrementally (cells are dropped as soon as their
+    row is yielded), so large sheets are not loaded whole. Cell values come
+    back as str, float or None; missing cells are None.
+    
+    Args:
+        source: Path or binary file object
+        sheet: Worksheet name (the first sheet when None)
+    """
+    try:
+        workbook = zipfile.ZipFile(source)
+    except zipfile.BadZipFile as exc:
+        raise IngestError(f"Not an XLSX workbook: {exc}") from exc
+    with workbook:
+        sheet_path = _xlsx_sheet_path(workbook, sheet)
+        shared = _xlsx_shared_strings(workbook)
+        with workbook.open(sheet_path) as stream:
+            row: List[Any] = []
+            sheet_data = None
+            for event, element in ElementTree.iterparse(stream, events=("start", "end")):
+                if element.tag == _SHEET_NS + "row":
+                    if event == "start":
+                        row = []
+                    else:
+                        yield row
+                        # Detach the finished row so the tree never holds more than one
+                        if sheet_data is not None:
+                            sheet_data.clear()
+                elif element.tag == _SHEET_NS + "sheetData" and event == "start":
+                    sheet_data = element
+                elif element.tag == _SHEET_NS + "c" and event == "end":
+                    column = _xlsx_column_index(element.get("r", "")) if element.get("r") else len(row)
+                    if column > len(row):
+                        row.extend([None] * (column - len(row)))
+                    row.append(_xlsx_cell_value(element, shared))
+                    element.clear()
+
+
+def _xlsx_sheet_path(workbook: zipfile.ZipFile, sheet: Optional[str]) -> str:
+    names = set(workbook.namelist())
+    try:
+        book = ElementTree.fromstring(workbook.read("xl/workbook.xml"))
+        rels = ElementTree.fromstring(workbook.read("xl/_rels/workbook.xml.rels"))
+    except KeyError as exc:
+        raise IngestError("XLSX workbook is missing its workbook part") from exc
+    targets = {rel.get("Id"): rel.get("Target", "") for rel in rels}
+    for entry in book.iter(_SHEET_NS + "sheet"):
+        if sheet is None or entry.get("name") == sheet:
+            target = targets.get(entry.get(_REL_NS + "id"), "").lstrip("/")
+            path = target if target.startswith("xl/") else "xl/" + target
+            if path in names:
+                return path
+    raise IngestError(f"Worksheet not found: {sheet}" if sheet else "XLSX workbook has no worksheets")
+
+
+def _xlsx_shared_strings(workbook: zipfile.ZipFile) -> List[str]:
+    if "xl/sharedStrings.xml" not in workbook.namelist():
+        return []
+    strings = []
+    with workbook.open("xl/sharedStrings.xml") as stream:
+        for _, element in ElementTree.iterparse(stream):
+            if element.tag == _SHEET_NS + "si":
+                strings.append("".join(text.text or "" for text in element.iter(_SHEET_NS + "t")))
+                element.clear()
+    return strings
+
+
+def _xlsx_column_index(reference: str) -> int:
+    index = 0
+    for ch in reference:
+        if not ch.isalpha():
+            break
+        index = index * 26 + (ord(ch.upper()) - 64)
+    return index - 1
+
+
+def _xlsx_cell_value(cell: ElementTree.Element, shared: List[str]) -> Any:
+    kind = cell.get("t")
+    if kind == "inlineStr":
+        return "".join(text.text or "" for text in cell.iter(_SHEET_NS + "t"))
+    value = cell.find(_SHEET_NS + "v")
+    if value is None or value.text is None:
+        return None
+    if kind == "s":
+        return shared[int(value.text)]
+    if kind in ("str", "e"):
+        return value.text
+    if kind == "b":
+        return value.text == "1"
+    try:
+        return float(value.text)
+    except ValueError:
+        return value.text
+
+
+def iter_rows(source: Union[str, os.PathLike], file_format: Optional[str] = None,
+              sheet: Optional[str] = None) -> Iterator[List[Any]]:
+    """
+    Rows of a CSV or XLSX export; the format follows the extension unless given
+    
+    Raises:
+        IngestError: If the format is unknown, or the file is a legacy binary .xls workbook
+    """
+    if file_format is None:
+        suffix = os.path.splitext(str(source))[1].lower()
+        if suffix == ".xls":
+            raise IngestError("legacy .xls is not supported; export as .xlsx or .csv")
+        file_format = "xlsx" if suffix in (".xlsx", ".xlsm") else "csv"
+    if file_format == "xlsx":
+        return iter_xlsx_rows(source, sheet)
+    if file_format == "csv":
+        return iter_csv_rows(source)
+    raise IngestError(f"Unknown export format: {file_format} (expected csv or xlsx)")
+
+
+class _Layout:
+    """Where the student, date and status values sit in each data row"""
+    
+    def __init__(self, kind: str, student: int, date_column: int = -1, status: int = -1,
+                 day_columns: Sequence[Tuple[int, str]] = ()):
+        self.kind = kind
+        self.student = student
+        self.date = date_column
+        self.status = status
+        self.day_columns = list(day_columns)
+
+
+def _find_column(headers: List[str], wanted: Optional[str], candidates: Sequence[str]) -> int:
+    if wanted is not None:
+        key = _normalize_header(wanted)
+        return headers.index(key) if key in headers else -1
+    for candidate in candidates:
+        if candidate in headers:
+            return headers.index(candidate)
+    return -1
+
+
+def detect_layout(row: List[Any], student_column: Optional[str] = None, date_column: Optional[str] = None,
+                  status_column: Optional[str] = None) -> Optional[_Layout]:
+    """Layout described by a header row, or None when the row is not a header"""
+    headers = [_normalize_header(cell) for cell in row]
+    student = _find_column(headers, student_column, STUDENT_COLUMNS)
+    if student < 0:
+        return None
+    day_columns = [(i, day) for i, day in ((i, parse_date(cell)) for i, cell in enumerate(row))
+                   if day is not None and i != student]
+    date_index = _find_column(headers, date_column, DATE_COLUMNS)
+    status_index = _find_column(headers, status_column, STATUS_COLUMNS)
+    if date_index >= 0 and status_index >= 0 and not day_columns:
+        return _Layout(LAYOUT_LONG, student, date_index, status_index)
+    if day_columns:
+        day_columns.sort(key=lambda item: item[1])
+        return _Layout(LAYOUT_WIDE, student, day_columns=day_columns)
+    return None
+
+
+def _cell(row: List[Any], index: int) -> Any:
+    return row[index] if 0 <= index < len(row) else None
+
+
+def _student_key(value: Any) -> str:
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value if value is not None else "").strip()
+
+
+class AttendanceIngestor:
+    """
+    Folds attendance export rows into per-student anomaly state
+    
+    Feed rows (header first) with feed(), then read summary(). ingest()
+    does both for a file.
+    """
+    
+    def __init__(self, detector: Optional[AttendanceAnomalyDetector] = None, chunk_rows: int = CHUNK_ROWS,
+                 student_column: Optional[str] = None, date_column: Optional[str] = None,
+                 status_column: Optional[str] = None):
+        self.detector = detector or AttendanceAnomalyDetector()
+        self.chunk_rows = chunk_rows
+        self._columns = (student_column, date_column, status_column)
+        self.layout: Optional[_Layout] = None
+        # Long layout: student -> state, plus the day being collected (date, status)
+        self._states: Dict[str, AttendanceState] = {}
+        self._pending: Dict[str, Tuple[str, int]] = {}
+        # Wide layout: student -> finished result
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self.rows_read = 0
+        self.rows_used = 0
+        self.rows_skipped = 0
+        self.rows_out_of_order = 0
+        # Raw cell -> parsed value; exports repeat the same few dates and codes on every row
+        self._dates: Dict[Any, Optional[str]] = {}
+        self._statuses: Dict[Any, Optional[int]] = {}
+    
+    def feed(self, rows: Iterable[List[Any]]) -> None:
+        """Consume rows chunk by chunk; the header is located among the first rows"""
+        rows = iter(rows)
+        if self.layout is None:
+            for row in itertools.islice(rows, MAX_HEADER_ROWS):
+                self.layout = detect_layout(row, *self._columns)
+                if self.layout is not None:
+                    break
+            else:
+                raise IngestError("No header row with a student column and date/status columns found")
+        
+        while True:
+            chunk = list(itertools.islice(rows, self.chunk_rows))
+            if not chunk:
+                break
+            with _STAGE_CHUNK():
+                if self.layout.kind == LAYOUT_LONG:
+                    self._feed_long(chunk)
+                else:
+                    self._feed_wide(chunk)
+            self.rows_read += len(chunk)
+    
+    def _feed_long(self, chunk: List[List[Any]]) -> None:
+        layout = self.layout
+        dates, statuses = self._dates, self._statuses
+        if len(dates) > MAX_CACHED_VALUES or len(statuses) > MAX_CACHED_VALUES:
+            dates.clear()
+            statuses.clear()
+        marks = []
+        for row in chunk:
+            student = _student_key(_cell(row, layout.student))
+            raw_day, raw_status = _cell(row, layout.date), _cell(row, layout.status)
+            day = dates.get(raw_day, "")
+            if day == "":
+                day = dates[raw_day] = parse_date(raw_day)
+            status = statuses.get(raw_status, -1)
+            if status == -1:
+                status = statuses[raw_status] = parse_status(raw_status)
+            if not student or day is None or status is None:
+                self.rows_skipped += 1
+                continue
+            marks.append((day, student, status))
+        # Rows within a chunk may be in any order
+        marks.sort(key=lambda mark: mark[0])
+        
+        states, pending = self._states, self._pending
+        used = out_of_order = 0
+        for day, student, status in marks:
+            current = pending.get(student)
+            if current is None:
+                states[student] = AttendanceState()
+                pending[student] = (day, status)
+            elif day == current[0]:
+                if status and not current[1]:
+                    pending[student] = (day, 1)
+            elif day > current[0]:
+                states[student].update(*current)
+                pending[student] = (day, status)
+            else:
+                out_of_order += 1
+                continue
+            used += 1
+        self.rows_used += used
+        self.rows_out_of_order += out_of_order
+        _ROWS_USED.inc(used)
+        _ROWS_OUT_OF_ORDER.inc(out_of_order)
+        _ROWS_SKIPPED.inc(len(chunk) - len(marks))
+    
+    def _feed_wide(self, chunk: List[List[Any]]) -> None:
+        layout = self.layout
+        columns = [index for index, _ in layout.day_columns]
+        dates = [day for _, day in layout.day_columns]
+        students, vectors, partial = [], [], []
+        for row in chunk:
+            student = _student_key(_cell(row, layout.student))
+            if not student:
+                self.rows_skipped += 1
+                _ROWS_SKIPPED.inc()
+                continue
+            statuses = [parse_status(_cell(row, index)) for index in columns]
+            if None in statuses:
+                # Days without a mark for this student (not enrolled yet, holiday)
+                partial.append((student, statuses))
+            else:
+                students.append(student)
+                vectors.append(statuses)
+        
+        if vectors:
+            matrix = np.array(vectors, dtype=np.uint8)
+            self._results.update(zip(students, self.detector.detect_anomalies_matrix(matrix, dates)))
+        for student, statuses in partial:
+            state = AttendanceState()
+            for day, status in zip(dates, statuses):
+                if status is not None:
+                    state.update(day, status)
+            self._results[student] = state.result()
+        used = len(students) + len(partial)
+        self.rows_used += used
+        _ROWS_USED.inc(used)
+    
+    def results(self) -> Dict[str, Dict[str, Any]]:
+        """Anomaly result per student (shaped like detect_anomalies), in first-seen order"""
+        if self.layout is not None and self.layout.kind == LAYOUT_LONG:
+            results = {}
+            for student, state in self._states.items():
+                # Score the day still being collected without closing it
+                day, status = self._pending[student]
+                scored = AttendanceState.from_dict(state.to_dict()) if state.count else AttendanceState()
+                scored.update(day, status)
+                results[student] = scored.result()
+            return results
+        return dict(self._results)
+    
+    def summary(self) -> Dict[str, Any]:
+        """Per-student results with row counts and a pattern breakdown"""
+        students = self.results()
+        patterns: Dict[str, int] = {}
+        for result in students.values():
+            patterns[result["pattern"]] = patterns.get(result["pattern"], 0) + 1
+        return {
+            "layout": self.layout.kind if self.layout is not None else None,
+            "rows_read": self.rows_read,
+            "rows_used": self.rows_used,
+            "rows_skipped": self.rows_skipped,
+            "rows_out_of_order": self.rows_out_of_order,
+            "students_count": len(students),
+            "patterns": patterns,
+            "students": students
+        }
+    
+    def ingest(self, source: Union[str, os.PathLike], file_format: Optional[str] = None,
+               sheet: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Stream one export file and summarize it
+        
+        Args:
+            source: CSV or XLSX path
+            file_format: "csv" or "xlsx" (from the extension when None)
+            sheet: XLSX worksheet name (the first sheet when None)
+        
+        Returns:
+            summary() of everything ingested so far
+        
+        Raises:
+            IngestError: If the file has no recognisable header or is not a workbook
+        """
+        self.feed(iter_rows(source, file_format, sheet))
+        return self.summary()
+
+
+SUMMARY_FIELDS = ("student_id", "pattern", "confidence", "attendance_rate", "total_days",
+                  "present_days", "absent_days", "anomaly_days")
+
+
+def write_summary(summary: Dict[str, Any], output: Union[str, os.PathLike, io.TextIOBase]) -> None:
+    """Write a summary as CSV (one row per student) or, for a .json path, as JSON"""
+    if isinstance(output, (str, os.PathLike)) and str(output).lower().endswith(".json"):
+        with open(output, "w", encoding="utf-8") as handle:
+            json.dump(summary, handle, indent=2)
+        return
+    handle = open(output, "w", newline="", encoding="utf-8") if isinstance(output, (str, os.PathLike)) else output
+    try:
+        writer = csv.writer(handle)
+        writer.writerow(SUMMARY_FIELDS)
+        for student, result in summary["students"].items():
+            writer.writerow([student] + [result.get(field, "") for field in SUMMARY_FIELDS[1:-1]]
+                            + [" ".join(str(day) for day in result.get("anomaly_days", []))])
+    finally:
+        if handle is not output:
+            handle.close()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    arg_parser.add_argument("export", help="CSV or XLSX attendance export")
+    arg_parser.add_argument("--output", help="Summary file (.csv or .json); printed as JSON when omitted")
+    arg_parser.add_argument("--format", choices=("csv", "xlsx"))
+    arg_parser.add_argument("--sheet")
+    arg_parser.add_argument("--student-column")
+    arg_parser.add_argument("--date-column")
+    arg_parser.add_argument("--status-column")
+    arg_parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = arg_parser.parse_args()
+    
+    ingestor = AttendanceIngestor(chunk_rows=args.chunk_rows, student_column=args.student_column,
+                                  date_column=args.date_column, status_column=args.status_column)
+    try:
+        result = ingestor.ingest(args.export, args.format, args.sheet)
+    except IngestError as exc:
+        sys.exit(f"error: {exc}")
+    if args.output:
+        write_summary(result, args.output)
+        print(json.dumps({key: value for key, value in result.items() if key != "students"}, indent=2))
+    else:
+        print(json.dumps(result, indent=2))
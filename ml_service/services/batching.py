@@ -0,0 +1,305 @@
+"""
+Request Coalescing Service
+Collects single-item requests arriving close together and runs them as one batch
+"""
+import asyncio
+import numbers
+import os
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+import numpy as np
+
+from . import metrics
+from .attendance import AttendanceAnomalyDetector
+from .risk import RiskPredictor, RISK_FACTOR_MESSAGES
+from .skills import SkillGapAnalyzer
+
+DEFAULT_MAX_BATCH_SIZE = int(os.environ.get("ML_BATCH_MAX_SIZE", "256"))
+DEFAULT_MAX_WAIT_MS = float(os.environ.get("ML_BATCH_MAX_WAIT_MS", "2"))
+DEFAULT_MAX_QUEUE = int(os.environ.get("ML_BATCH_MAX_QUEUE", "4096"))
+
+BATCH_SIZE = metrics.histogram("ml_coalesced_batch_size", "Requests coalesced into one batch",
+                               ("batcher",), metrics.SIZE_BUCKETS)
+QUEUE_DEPTH = metrics.gauge("ml_coalescer_queue_depth", "Requests waiting to be batched", ("batcher",))
+REJECTED = metrics.counter("ml_coalescer_rejected_total", "Requests refused because the queue was full",
+                           ("batcher",))
+
+
+class QueueFullError(Exception):
+    """Raised when a batcher's queue is at max depth and the caller asked not to wait"""
+
+
+class BatcherClosedError(Exception):
+    """Raised for items submitted to a closed batcher, or still waiting in it when it closed"""
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent submit() calls into batches
+    
+    A batch closes when it holds max_batch_size items or max_wait_ms after
+    its first item arrived, whichever comes first. batch_fn receives the list
+    of items and returns one result per item (an Exception instance fails
+    just that item). If batch_fn raises, the items are re-run one at a time so
+    only the callers whose own item fails get the exception. The queue holds
+    at most max_queue items: submit() waits for room, or raises
+    QueueFullError when block is False. close() fails every item still
+    waiting with BatcherClosedError, as it does later submit() calls.
+    """
+    
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE, max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+                 max_queue: int = DEFAULT_MAX_QUEUE, name: str = "default"):
+        self.batch_fn = batch_fn
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._closed = False
+        self.batches = 0
+        self.items = 0
+        self._batch_size = BATCH_SIZE.labels(name)
+        self._queue_depth = QUEUE_DEPTH.labels(name)
+        self._rejected = REJECTED.labels(name)
+        self._stage = metrics.Stage("batching", name)
+    
+    async def submit(self, item: Any, block: bool = True) -> Any:
+        """
+        Queue one item and wait for its result
+        
+        Raises:
+            QueueFullError: If the queue is full and block is False
+            BatcherClosedError: If the batcher is closed, or closes before the item runs
+        """
+        if self._closed:
+            raise BatcherClosedError(f"Batcher {self.name} is closed")
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run())
+        
+        future = asyncio.get_running_loop().create_future()
+        if block:
+            await self._queue.put((item, future))
+            if self._closed:
+                # Room was made by close() draining the queue
+                self._fail_queued()
+        else:
+            try:
+                self._queue.put_nowait((item, future))
+            except asyncio.QueueFull:
+                self._rejected.inc()
+                raise QueueFullError("Request queue is full")
+        return await future
+    
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_wait
+            try:
+                while len(batch) < self.max_batch_size:
+                    if not queue.empty():
+                        batch.append(queue.get_nowait())
+                        continue
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # Closed while this batch was filling
+                self._fail(batch)
+                raise
+            self._dispatch(batch)
+    
+    def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        # Callers that gave up (cancelled) are dropped from the batch
+        batch = [(item, future) for item, future in batch if not future.done()]
+        if not batch:
+            return
+        self.batches += 1
+        self.items += len(batch)
+        self._batch_size.observe(len(batch))
+        self._queue_depth.set(self._queue.qsize())
+        try:
+            with self._stage():
+                results = self.batch_fn([item for item, _ in batch])
+        except Exception:
+            # One bad item must not fail the unrelated callers batched with it
+            results = [self._run_single(item) for item, _ in batch]
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+    
+    def _fail(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(BatcherClosedError(f"Batcher {self.name} closed before the item ran"))
+    
+    def _fail_queued(self) -> None:
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        self._fail(batch)
+        self._queue_depth.set(0)
+    
+    def _run_single(self, item: Any) -> Any:
+        try:
+            return self.batch_fn([item])[0]
+        except Exception as e:
+            return e
+    
+    def stats(self) -> Dict[str, Any]:
+        """Batches run, items processed and current queue depth"""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "average_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue
+        }
+    
+    async def close(self) -> None:
+        """Stop the background worker and fail every item still waiting"""
+        self._closed = True
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._queue is not None:
+            self._fail_queued()
+
+
+class ServiceCoalescer:
+    """
+    Drop-in async front for the per-student service calls
+    
+    predict_risk, analyze_skill_gap and detect_anomalies take the same
+    arguments and return the same results as RiskPredictor.predict,
+    SkillGapAnalyzer.analyze and AttendanceAnomalyDetector.detect_anomalies,
+    but concurrent calls are executed together through the batch APIs.
+    """
+    
+    def __init__(self, risk_predictor: Optional[RiskPredictor] = None,
+                 skill_analyzer: Optional[SkillGapAnalyzer] = None,
+                 anomaly_detector: Optional[AttendanceAnomalyDetector] = None, **batcher_options):
+        self.risk_predictor = risk_predictor or RiskPredictor()
+        self.skill_analyzer = skill_analyzer or SkillGapAnalyzer()
+        self.anomaly_detector = anomaly_detector or AttendanceAnomalyDetector()
+        self.risk = MicroBatcher(self._risk_batch, name="risk", **batcher_options)
+        self.skill_gap = MicroBatcher(self.skill_analyzer.analyze_many, name="skill_gap", **batcher_options)
+        self.anomaly = MicroBatcher(self._anomaly_batch, name="anomaly", **batcher_options)
+    
+    async def predict_risk(self, attendance: float, internal_marks: List[float], skills_count: int,
+                           applications_count: int, semester: int) -> Dict[str, Any]:
+        return await self.risk.submit((attendance, internal_marks, skills_count, applications_count, semester))
+    
+    async def analyze_skill_gap(self, student_skills: List[str], required_skills: List[str]) -> Dict[str, Any]:
+        return await self.skill_gap.submit((student_skills, required_skills))
+    
+    async def detect_anomalies(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return await self.anomaly.submit(records)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "risk": self.risk.stats(),
+            "skill_gap": self.skill_gap.stats(),
+            "anomaly": self.anomaly.stats()
+        }
+    
+    async def close(self) -> None:
+        for batcher in (self.risk, self.skill_gap, self.anomaly):
+            await batcher.close()
+    
+    def _risk_batch(self, requests: List[Tuple]) -> List[Any]:
+        results: List[Any] = [None] * len(requests)
+        valid = []
+        for i, request in enumerate(requests):
+            error = _risk_input_error(*request)
+            if error is not None:
+                results[i] = error
+            else:
+                valid.append(i)
+        if not valid:
+            return results
+        
+        attendance, internal_marks, skills_count, applications_count, semester = zip(*(requests[i] for i in valid))
+        batch = self.risk_predictor.predict_batch(
+            list(attendance), [marks or [] for marks in internal_marks], list(skills_count),
+            list(applications_count), list(semester)
+        )
+        recommendation_sets = batch["recommendation_sets"]
+        for i, level, score, factors, index in zip(
+                valid, batch["risk_levels"], batch["risk_scores"], batch["risk_factors"],
+                batch["recommendation_index"]):
+            results[i] = {
+                "risk_level": level,
+                "risk_score": score,
+                "risk_factors": [RISK_FACTOR_MESSAGES[code] for code in factors],
+                "recommendations": list(recommendation_sets[index])
+            }
+        return results
+    
+    def _anomaly_batch(self, requests: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        results: List[Any] = [None] * len(requests)
+        # Students of the same course share session dates: one matrix per date list
+        groups: Dict[Tuple, List[Tuple[int, List[int]]]] = {}
+        for i, records in enumerate(requests):
+            dates, statuses = [], []
+            for record in records:
+                try:
+                    status = int(record.get("status", 0))
+                except (ValueError, KeyError):
+                    continue
+                dates.append(record.get("date", ""))
+                statuses.append(status)
+            # detect_anomalies drops repeated dates (e.g. several LEFT JOIN rows
+            # for one session) before its z-score pass; the matrix path cannot
+            if (not statuses or any(status not in (0, 1) for status in statuses)
+                    or _has_duplicates(dates)):
+                results[i] = self.anomaly_detector.detect_anomalies(records)
+                continue
+            try:
+                groups.setdefault(tuple(dates), []).append((i, statuses))
+            except TypeError:
+                # Unhashable dates; score this one on its own
+                results[i] = self.anomaly_detector.detect_anomalies(records)
+        
+        for dates, members in groups.items():
+            matrix = np.array([statuses for _, statuses in members], dtype=np.uint8)
+            for (i, _), result in zip(members, self.anomaly_detector.detect_anomalies_matrix(matrix, list(dates))):
+                results[i] = result
+        return results
+
+
+def _risk_input_error(attendance: Any, internal_marks: List[float], skills_count: Any,
+                      applications_count: Any, semester: Any) -> Optional[Exception]:
+    """
+    TypeError for inputs RiskPredictor.predict cannot compare, which the
+    vectorized path would otherwise turn into NaN and score silently
+    """
+    checked = [("attendance", attendance), ("skills_count", skills_count),
+               ("applications_count", applications_count), ("semester", semester)]
+    checked += [("internal_marks", mark) for mark in internal_marks or ()]
+    for name, value in checked:
+        if not isinstance(value, numbers.Real):
+            return TypeError(f"{name} must be numeric, not {type(value).__name__}")
+    return None
+
+
+def _has_duplicates(dates: List[Any]) -> bool:
+    try:
+        return len(set(dates)) != len(dates)
+    except TypeError:
+        return False
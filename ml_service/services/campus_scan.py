@@ -0,0 +1,383 @@
+"""
+Campus Scan Service
+Nightly at-risk, attendance-anomaly and skill-gap sweep over a whole institution, sharded across processes
+
+The cohort's arrays are copied once into shared memory blocks; each worker
+process attaches to them at startup, so a shard task is just a (start, end)
+pair and no student data is pickled on the way in. Every shard runs the
+column-oriented service APIs (predict_columns, detect_anomalies_matrix,
+analyze_matrix) over its slice, and the parent folds shard results into
+per-student rows and department aggregates as they complete, so progress
+and partial aggregates are available while the scan runs.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Dict, List, Any, Callable, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import metrics
+from .attendance import AttendanceAnomalyDetector
+from .risk import RiskPredictor
+from .skills import SkillGapAnalyzer
+from .wire import InternedLists
+
+DEFAULT_WORKERS = int(os.environ.get("CAMPUS_SCAN_WORKERS", str(os.cpu_count() or 1)))
+DEFAULT_SHARD_SIZE = int(os.environ.get("CAMPUS_SCAN_SHARD_SIZE", "2000"))
+
+SHARDS = metrics.counter("ml_campus_scan_shards_total", "Campus scan shards completed").labels()
+STAGE_SHARD = metrics.Stage("campus_scan", "shard")
+STAGE_MERGE = metrics.Stage("campus_scan", "merge")
+
+# Arrays placed in shared memory, in CampusCohort attribute names
+_SHARED_ARRAYS = ("attendance", "marks_values", "marks_offsets", "applications_count", "semester",
+                  "skill_offsets", "skill_ids", "attendance_matrix")
+
+
+class CampusCohort:
+    """
+    Every student of a scan in columnar form
+    
+    Marks and skills are flattened with offsets (student i owns
+    marks_values[marks_offsets[i]:marks_offsets[i + 1]]), as in
+    RiskPredictor.predict_columns and InternedLists. attendance_matrix is
+    optional; without it the anomaly sweep is skipped. All students share
+    one session calendar (dates).
+    """
+    
+    def __init__(self, student_ids: Sequence[str], departments: Sequence[str], attendance: np.ndarray,
+                 marks_values: np.ndarray, marks_offsets: np.ndarray, skills: InternedLists,
+                 applications_count: np.ndarray, semester: np.ndarray,
+                 attendance_matrix: Optional[np.ndarray] = None, dates: Optional[Sequence[str]] = None):
+        self.student_ids = [str(sid) for sid in student_ids]
+        self.departments = [str(d) for d in departments]
+        self.attendance = np.asarray(attendance, dtype=np.float64)
+        self.marks_values = np.asarray(marks_values, dtype=np.float64)
+        self.marks_offsets = np.asarray(marks_offsets, dtype=np.int64)
+        self.skills = skills
+        self.skill_offsets = skills.offsets
+        self.skill_ids = skills.ids
+        self.applications_count = np.asarray(applications_count, dtype=np.int64)
+        self.semester = np.asarray(semester, dtype=np.int64)
+        self.attendance_matrix = (np.asarray(attendance_matrix, dtype=np.uint8)
+                                  if attendance_matrix is not None else None)
+        self.dates = list(dates) if dates is not None else None
+        n = len(self.student_ids)
+        if (len(self.departments) != n or len(self.attendance) != n or len(skills) != n
+                or len(self.applications_count) != n or len(self.semester) != n):
+            raise ValueError("Every cohort column must have one entry per student")
+        if len(self.marks_offsets) != n + 1:
+            raise ValueError("marks_offsets must have one entry per student plus one")
+        if self.attendance_matrix is not None and self.attendance_matrix.shape[0] != n:
+            raise ValueError("attendance_matrix must have one row per student")
+    
+    @classmethod
+    def from_records(cls, students: Sequence[Dict[str, Any]], attendance_matrix: Optional[np.ndarray] = None,
+                     dates: Optional[Sequence[str]] = None) -> "CampusCohort":
+        """
+        Cohort from student records shaped like the risk route's input plus
+        department and skills ({"student_id", "department", "attendance",
+        "internal_marks", "skills", "applications_count", "semester"})
+        """
+        marks = [student.get("internal_marks") or [] for student in students]
+        marks_offsets = np.zeros(len(students) + 1, dtype=np.int64)
+        np.cumsum([len(m) for m in marks], out=marks_offsets[1:])
+        return cls(
+            [student.get("student_id", "") for student in students],
+            [student.get("department", "") for student in students],
+            np.array([student.get("attendance", 0) for student in students], dtype=np.float64),
+            np.array([value for m in marks for value in m], dtype=np.float64),
+            marks_offsets,
+            InternedLists.from_lists([student.get("skills") or [] for student in students]),
+            np.array([student.get("applications_count", 0) for student in students], dtype=np.int64),
+            np.array([student.get("semester", 1) for student in students], dtype=np.int64),
+            attendance_matrix, dates
+        )
+    
+    def __len__(self) -> int:
+        return len(self.student_ids)
+
+
+# Worker side
+
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(layout: Dict[str, Tuple[str, Tuple[int, ...], str]], vocabulary: List[str],
+                 dates: Optional[List[str]], posts_required_skills: List[List[str]]) -> None:
+    """Attach to the cohort's shared memory and build the services once per worker"""
+    blocks = {name: shared_memory.SharedMemory(name=block) for name, (block, _, _) in layout.items()}
+    arrays = {name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=blocks[name].buf)
+              for name, (_, shape, dtype) in layout.items()}
+    _worker.update(blocks=blocks, vocabulary=vocabulary, dates=dates,
+                   posts_required_skills=posts_required_skills, **_services())
+    _worker["arrays"] = arrays
+
+
+def _services() -> Dict[str, Any]:
+    return {"risk": RiskPredictor(), "anomaly": AttendanceAnomalyDetector(), "skills": SkillGapAnalyzer()}
+
+
+def _scan_in_worker(start: int, end: int) -> Dict[str, Any]:
+    return _scan_shard(_worker["arrays"], _worker, start, end)
+
+
+def _scan_shard(arrays: Dict[str, np.ndarray], context: Dict[str, Any], start: int, end: int) -> Dict[str, Any]:
+    """Risk, anomaly and skill-gap results for students [start, end)"""
+    began = time.perf_counter()
+    marks_offsets = arrays["marks_offsets"][start:end + 1]
+    skill_offsets = arrays["skill_offsets"][start:end + 1]
+    skills = InternedLists(context["vocabulary"], skill_offsets - skill_offsets[0],
+                           arrays["skill_ids"][skill_offsets[0]:skill_offsets[-1]])
+    skills_count = skills.lengths()
+    
+    risk = context["risk"].predict_columns(
+        arrays["attendance"][start:end],
+        arrays["marks_values"][marks_offsets[0]:marks_offsets[-1]],
+        marks_offsets - marks_offsets[0],
+        skills_count,
+        arrays["applications_count"][start:end],
+        arrays["semester"][start:end]
+    )
+    
+    anomalies = None
+    if "attendance_matrix" in arrays:
+        anomalies = context["anomaly"].detect_anomalies_matrix(arrays["attendance_matrix"][start:end],
+                                                                context["dates"])
+    
+    posts = context["posts_required_skills"]
+    best_match = best_post = post_sums = None
+    if posts:
+        match = context["skills"].analyze_matrix(skills, posts, top_missing=0, as_arrays=True)["match_percentages"]
+        best_post = match.argmax(axis=1)
+        best_match = match[np.arange(len(match)), best_post]
+        # Per-post sums over students with any skills, for the campus-wide averages
+        post_sums = match[skills_count > 0].sum(axis=0)
+    
+    return {
+        "start": start,
+        "end": end,
+        "risk_levels": risk["risk_levels"],
+        "risk_scores": risk["risk_scores"],
+        "risk_factors": risk["risk_factors"],
+        "anomalies": anomalies,
+        "best_match": best_match,
+        "best_post": best_post,
+        "post_sums": post_sums,
+        "students_analyzed": int((skills_count > 0).sum()),
+        "seconds": time.perf_counter() - began
+    }
+
+
+# Parent side
+
+class _DepartmentTotals:
+    __slots__ = ("students", "risk_levels", "risk_score_sum", "patterns", "match_sum", "match_count")
+    
+    def __init__(self):
+        self.students = 0
+        self.risk_levels: Dict[str, int] = {"low": 0, "medium": 0, "high": 0}
+        self.risk_score_sum = 0.0
+        self.patterns: Dict[str, int] = {}
+        self.match_sum = 0.0
+        self.match_count = 0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "students": self.students,
+            "risk_levels": dict(self.risk_levels),
+            "average_risk_score": round(self.risk_score_sum / self.students, 2) if self.students else 0.0,
+            "attendance_patterns": dict(self.patterns),
+            "average_best_match": round(self.match_sum / self.match_count, 2) if self.match_count else None
+        }
+
+
+class CampusScan:
+    """
+    Shards a CampusCohort across a process pool and merges the results
+        
+        scan = CampusScan(workers=16)
+        result = scan.run(cohort, posts_required_skills, progress=print)
+        scan.status()   # from another thread while run() is going
+    
+    With workers=1 the shards run in this process, one after another.
+    """
+    
+    def __init__(self, workers: int = DEFAULT_WORKERS, shard_size: int = DEFAULT_SHARD_SIZE):
+        self.workers = max(1, workers)
+        self.shard_size = max(1, shard_size)
+        self._lock = threading.Lock()
+        self._status: Dict[str, Any] = {"state": "idle"}
+    
+    def shards(self, n_students: int) -> List[Tuple[int, int]]:
+        """(start, end) ranges covering n_students"""
+        return [(start, min(start + self.shard_size, n_students)) for start in range(0, n_students, self.shard_size)]
+    
+    def iter_shards(self, cohort: CampusCohort,
+                    posts_required_skills: Sequence[Sequence[str]] = ()) -> Iterator[Dict[str, Any]]:
+        """Shard results in completion order (see _scan_shard for their shape)"""
+        posts = [list(skills) for skills in posts_required_skills]
+        ranges = self.shards(len(cohort))
+        arrays = {name: getattr(cohort, name) for name in _SHARED_ARRAYS if getattr(cohort, name) is not None}
+        
+        if self.workers == 1 or len(ranges) <= 1:
+            context = {"vocabulary": cohort.skills.vocabulary, "dates": cohort.dates,
+                       "posts_required_skills": posts, **_services()}
+            for start, end in ranges:
+                with STAGE_SHARD():
+                    yield _scan_shard(arrays, context, start, end)
+            return
+        
+        blocks: List[shared_memory.SharedMemory] = []
+        try:
+            layout = {}
+            for name, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                blocks.append(block)
+                np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+                layout[name] = (block.name, array.shape, array.dtype.str)
+            
+            with ProcessPoolExecutor(
+                max_workers=min(self.workers, len(ranges)),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(layout, cohort.skills.vocabulary, cohort.dates, posts)
+            ) as executor:
+                futures = [executor.submit(_scan_in_worker, start, end) for start, end in ranges]
+                try:
+                    for future in as_completed(futures):
+                        result = future.result()
+                        STAGE_SHARD.record(result["seconds"])
+                        yield result
+                finally:
+                    for future in futures:
+                        future.cancel()
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+    
+    def run(self, cohort: CampusCohort, posts_required_skills: Sequence[Sequence[str]] = (),
+            progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Scan the whole cohort
+        
+        Args:
+            cohort: Students to scan
+            posts_required_skills: Required skills of each active post (skill-gap
+                                   sweep skipped when empty)
+            progress: Called after every shard with the same dict status() returns
+        
+        Returns:
+            {"students": [per-student row], "departments": {name: aggregates},
+             "posts": [{"average_match_percentage", "students_analyzed"}],
+             "shards", "workers", "duration_s"}
+        """
+        began = time.perf_counter()
+        n = len(cohort)
+        ranges = self.shards(n)
+        rows: List[Optional[Dict[str, Any]]] = [None] * n
+        departments: Dict[str, _DepartmentTotals] = {}
+        post_sums = np.zeros(len(posts_required_skills))
+        analyzed = 0
+        done = students_done = 0
+        self._set_status("running", 0, len(ranges), 0, n, {}, began)
+        
+        try:
+            for shard in self.iter_shards(cohort, posts_required_skills):
+                with STAGE_MERGE():
+                    self._merge(cohort, shard, rows, departments)
+                    if shard["post_sums"] is not None:
+                        post_sums += shard["post_sums"]
+                        analyzed += shard["students_analyzed"]
+                SHARDS.inc()
+                done += 1
+                students_done += shard["end"] - shard["start"]
+                status = self._set_status("running", done, len(ranges), students_done, n, departments, began)
+                if progress is not None:
+                    progress(status)
+        except BaseException as exc:
+            self._set_status("failed", done, len(ranges), students_done, n, departments, began,
+                             error=str(exc) or type(exc).__name__)
+            raise
+        
+        self._set_status("finished", done, len(ranges), students_done, n, departments, began)
+        return {
+            "students": rows,
+            "departments": {name: totals.to_dict() for name, totals in sorted(departments.items())},
+            "posts": [
+                {"average_match_percentage": round(float(total / analyzed), 2) if analyzed else 0.0,
+                 "students_analyzed": analyzed}
+                for total in post_sums.tolist()
+            ],
+            "shards": len(ranges),
+            "workers": self.workers,
+            "duration_s": round(time.perf_counter() - began, 3)
+        }
+    
+    def _merge(self, cohort: CampusCohort, shard: Dict[str, Any], rows: List[Optional[Dict[str, Any]]],
+               departments: Dict[str, _DepartmentTotals]) -> None:
+        start = shard["start"]
+        anomalies = shard["anomalies"]
+        best_match, best_post = shard["best_match"], shard["best_post"]
+        for offset in range(shard["end"] - start):
+            i = start + offset
+            department = cohort.departments[i]
+            row = {
+                "student_id": cohort.student_ids[i],
+                "department": department,
+                "risk_level": shard["risk_levels"][offset],
+                "risk_score": shard["risk_scores"][offset],
+                "risk_factors": shard["risk_factors"][offset]
+            }
+            totals = departments.get(department)
+            if totals is None:
+                totals = departments[department] = _DepartmentTotals()
+            totals.students += 1
+            totals.risk_levels[row["risk_level"]] += 1
+            totals.risk_score_sum += row["risk_score"]
+            if anomalies is not None:
+                anomaly = anomalies[offset]
+                row["attendance_pattern"] = anomaly["pattern"]
+                row["anomaly_days"] = anomaly["anomaly_days"]
+                totals.patterns[anomaly["pattern"]] = totals.patterns.get(anomaly["pattern"], 0) + 1
+            if best_match is not None:
+                row["best_match_percentage"] = float(best_match[offset])
+                row["best_post_index"] = int(best_post[offset])
+                if cohort.skill_offsets[i + 1] > cohort.skill_offsets[i]:
+                    totals.match_sum += row["best_match_percentage"]
+                    totals.match_count += 1
+            rows[i] = row
+    
+    def _set_status(self, state: str, shards_done: int, shards_total: int, students_done: int,
+                    students_total: int, departments: Dict[str, _DepartmentTotals], began: float,
+                    error: Optional[str] = None) -> Dict[str, Any]:
+        status = {
+            "state": state,
+            "shards_done": shards_done,
+            "shards_total": shards_total,
+            "students_done": students_done,
+            "students_total": students_total,
+            "elapsed_s": round(time.perf_counter() - began, 3),
+            "departments": {name: totals.to_dict() for name, totals in sorted(departments.items())}
+        }
+        if error is not None:
+            status["error"] = error
+        with self._lock:
+            self._status = status
+        return status
+    
+    def status(self) -> Dict[str, Any]:
+        """
+        Progress of the current (or last) run, with department aggregates so far
+        
+        state is "idle", "running", "finished", or "failed" (with the exception's
+        message under "error")
+        """
+        with self._lock:
+            return dict(self._status)
@@ -0,0 +1,398 @@
+"""
+Feature Store Service
+Columnar, memory-mapped student features shared by every worker on the host
+
+Layout (all files are raw little-endian arrays, append-only):
+    
+    ids.bin                 student IDs, fixed width, one per student ordinal
+    rows_*.bin              one entry per student version: student ordinal,
+                            attendance rate, semester, applications count,
+                            and (start, length) into marks.bin / skills.bin
+    marks.bin               marks values, flat
+    skills.bin              interned skill IDs, flat (names listed in the manifest)
+    events_*.bin            attendance events: student ordinal, day ordinal, status
+    manifest.json           element count of every file, written last
+
+Upserting a student appends a new version row; the newest row wins.
+Attendance events are appended as they arrive; the last event for a
+(student, day) pair wins. Readers map only as many elements as the
+manifest lists, so a reader never sees a half-written append, and pages
+are shared through the OS page cache instead of being copied per worker.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, List, Any, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single writer process assumed
+    fcntl = None
+
+DEFAULT_STORE_DIR = os.environ.get("FEATURE_STORE_DIR", "feature_store")
+
+ID_WIDTH = 64
+MANIFEST_VERSION = 1
+
+# Column name -> dtype; every column is one file named <column>.bin
+COLUMNS: Dict[str, np.dtype] = {
+    "ids": np.dtype(f"S{ID_WIDTH}"),
+    "rows_student": np.dtype("<i4"),
+    "rows_attendance": np.dtype("<f8"),
+    "rows_semester": np.dtype("<i2"),
+    "rows_applications": np.dtype("<i4"),
+    "rows_marks_start": np.dtype("<i8"),
+    "rows_marks_length": np.dtype("<i4"),
+    "rows_skills_start": np.dtype("<i8"),
+    "rows_skills_length": np.dtype("<i4"),
+    "marks": np.dtype("<f8"),
+    "skills": np.dtype("<i4"),
+    "events_student": np.dtype("<i4"),
+    "events_day": np.dtype("<i4"),
+    "events_status": np.dtype("u1"),
+}
+
+
+class ConcurrentWriteError(RuntimeError):
+    """Another process appended to the store without holding the write lock; retry the call"""
+
+
+def _day_ordinal(value: Any) -> int:
+    """Day number of an ISO date or datetime string (or a date)"""
+    if isinstance(value, date):
+        return value.toordinal()
+    return date.fromisoformat(str(value)[:10]).toordinal()
+
+
+class FeatureStore:
+    """
+    Reader and writer for one feature store directory
+    
+    Any number of processes may read. Writes (upsert_students,
+    append_attendance) take an exclusive file lock before planning, so
+    concurrent writers from several workers queue up instead of failing.
+    """
+    
+    def __init__(self, path: str = DEFAULT_STORE_DIR):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._generation = -1
+        self._manifest_mtime = None
+        self.refresh()
+    
+    # Reading
+    
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.path, "manifest.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"version": MANIFEST_VERSION, "generation": 0, "counts": {name: 0 for name in COLUMNS},
+                    "skills": []}
+    
+    def _map(self, name: str, count: int) -> np.ndarray:
+        dtype = COLUMNS[name]
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(self.path, f"{name}.bin"), dtype=dtype, mode="r", shape=(count,))
+    
+    def refresh(self) -> bool:
+        """
+        Pick up appends made since the last refresh (by any process)
+        
+        Returns:
+            True if the store changed
+        """
+        manifest_path = os.path.join(self.path, "manifest.json")
+        try:
+            mtime = os.stat(manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime is not None and mtime == self._manifest_mtime:
+            return False
+        
+        manifest = self._read_manifest()
+        with self._lock:
+            if manifest["generation"] == self._generation:
+                self._manifest_mtime = mtime
+                return False
+            self._counts = manifest["counts"]
+            self._columns = {name: self._map(name, self._counts[name]) for name in COLUMNS}
+            self._skill_names: List[str] = manifest["skills"]
+            self._skill_ids = {name: i for i, name in enumerate(self._skill_names)}
+            self._ordinals = {raw.decode("utf-8"): i for i, raw in enumerate(self._columns["ids"].tolist())}
+            
+            # Newest version row per student (-1: no features yet)
+            latest = np.full(len(self._ordinals), -1, dtype=np.int64)
+            rows_student = self._columns["rows_student"]
+            np.maximum.at(latest, rows_student, np.arange(len(rows_student)))
+            self._latest = latest
+            self._events = None
+            self._generation = manifest["generation"]
+            self._manifest_mtime = mtime
+            return True
+    
+    def __len__(self) -> int:
+        return len(self._ordinals)
+    
+    def __contains__(self, student_id: Any) -> bool:
+        return str(student_id) in self._ordinals
+    
+    @property
+    def generation(self) -> int:
+        return self._generation
+    
+    def student_ids(self, with_features: bool = True) -> List[str]:
+        """IDs of every student with features (or with anything at all), in ordinal order"""
+        if not with_features:
+            return list(self._ordinals)
+        return [sid for sid, i in self._ordinals.items() if self._latest[i] >= 0]
+    
+    def _rows_for(self, student_ids: Optional[Sequence[Any]]) -> Tuple[List[str], np.ndarray]:
+        if student_ids is None:
+            ordinals = np.flatnonzero(self._latest >= 0)
+            ids = self._columns["ids"][ordinals]
+            return [raw.decode("utf-8") for raw in ids.tolist()], self._latest[ordinals]
+        ids = [str(sid) for sid in student_ids]
+        try:
+            rows = self._latest[[self._ordinals[sid] for sid in ids]]
+        except KeyError as e:
+            raise KeyError(f"Student not in feature store: {e.args[0]}")
+        if (rows < 0).any():
+            raise KeyError("Student has attendance events but no features yet")
+        return ids, rows
+    
+    @staticmethod
+    def _gather(values: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Concatenate values[start:start + length] segments into values + offsets"""
+        offsets = np.zeros(len(starts) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        index = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return values[index], offsets
+    
+    def risk_columns(self, student_ids: Optional[Sequence[Any]] = None) -> Dict[str, Any]:
+        """
+        Features of the given students (all when None) in the argument layout
+        of RiskPredictor.predict_columns
+        
+        Raises:
+            KeyError: If a student has no features in the store
+        """
+        ids, rows = self._rows_for(student_ids)
+        c = self._columns
+        marks_values, marks_offsets = self._gather(
+            c["marks"], c["rows_marks_start"][rows], c["rows_marks_length"][rows].astype(np.int64)
+        )
+        return {
+            "student_ids": ids,
+            "attendance": np.asarray(c["rows_attendance"][rows]),
+            "marks_values": marks_values,
+            "marks_offsets": marks_offsets,
+            "skills_count": np.asarray(c["rows_skills_length"][rows]),
+            "applications_count": np.asarray(c["rows_applications"][rows]),
+            "semester": np.asarray(c["rows_semester"][rows])
+        }
+    
+    def student(self, student_id: Any) -> Dict[str, Any]:
+        """One student's features as plain values"""
+        columns = self.risk_columns([student_id])
+        row = self._rows_for([student_id])[1][0]
+        start, length = self._columns["rows_skills_start"][row], self._columns["rows_skills_length"][row]
+        return {
+            "student_id": columns["student_ids"][0],
+            "attendance": float(columns["attendance"][0]),
+            "internal_marks": columns["marks_values"].tolist(),
+            "skills": [self._skill_names[i] for i in self._columns["skills"][start:start + length].tolist()],
+            "applications_count": int(columns["applications_count"][0]),
+            "semester": int(columns["semester"][0])
+        }
+    
+    def _event_index(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        # Deduplicated events ordered by (student, day), plus each student's slice
+        if self._events is None:
+            c = self._columns
+            student, day, status = c["events_student"], c["events_day"], c["events_status"]
+            order = np.lexsort((np.arange(len(day)), day, student))
+            student, day, status = student[order], day[order], status[order]
+            # A later event for the same student and day replaces the earlier one
+            last = np.ones(len(day), dtype=bool)
+            last[:-1] = (student[1:] != student[:-1]) | (day[1:] != day[:-1])
+            student, day, status = student[last], day[last], status[last]
+            bounds = np.searchsorted(student, np.arange(len(self._ordinals) + 1))
+            self._events = (day, status, bounds[:-1], bounds[1:])
+        return self._events
+    
+    def attendance_history(self, student_id: Any) -> List[Dict[str, Any]]:
+        """One student's attendance in the record shape of detect_anomalies"""
+        day, status, starts, ends = self._event_index()
+        ordinal = self._ordinals[str(student_id)]
+        start, end = starts[ordinal], ends[ordinal]
+        return [{"date": date.fromordinal(d).isoformat(), "status": s}
+                for d, s in zip(day[start:end].tolist(), status[start:end].tolist())]
+    
+    def attendance_groups(self, student_ids: Optional[Sequence[Any]] = None):
+        """
+        Yield (student_ids, dates, students x days status matrix) for groups of
+        students that share the same session calendar, in first-seen order
+        
+        Students without any attendance events are yielded as one group with
+        a matrix of zero columns.
+        """
+        day, status, starts, ends = self._event_index()
+        if student_ids is None:
+            ordinals = list(self._ordinals.values())
+            ids = list(self._ordinals)
+        else:
+            ids = [str(sid) for sid in student_ids]
+            ordinals = [self._ordinals[sid] for sid in ids]
+        
+        groups: Dict[bytes, List[Tuple[str, int]]] = {}
+        for sid, ordinal in zip(ids, ordinals):
+            groups.setdefault(day[starts[ordinal]:ends[ordinal]].tobytes(), []).append((sid, ordinal))
+        for members in groups.values():
+            first = members[0][1]
+            days = day[starts[first]:ends[first]]
+            matrix = np.stack([status[starts[o]:ends[o]] for _, o in members])
+            yield [sid for sid, _ in members], [date.fromordinal(d).isoformat() for d in days.tolist()], matrix
+    
+    # Writing
+    
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """Hold the store's exclusive file lock, with this reader moved to the latest generation"""
+        lock_path = os.path.join(self.path, ".lock")
+        with open(lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Re-read the manifest even if its mtime looks unchanged (coarse timestamps)
+                self._manifest_mtime = None
+                self.refresh()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _write(self, appends: Dict[str, np.ndarray], new_skills: List[str]) -> None:
+        """Append planned values and publish a new manifest (called inside _writing)"""
+        manifest = self._read_manifest()
+        # The plan was made against this reader's generation under the lock;
+        # only a writer ignoring the lock (no fcntl) can have moved it
+        if manifest["generation"] != self._generation:
+            raise ConcurrentWriteError("Feature store changed while preparing the write; retry")
+        counts = manifest["counts"]
+        for name, values in appends.items():
+            if not len(values):
+                continue
+            # Truncate anything past the manifest (left by a crashed writer)
+            with open(os.path.join(self.path, f"{name}.bin"), "ab") as f:
+                f.truncate(counts[name] * COLUMNS[name].itemsize)
+                f.write(np.ascontiguousarray(values, dtype=COLUMNS[name]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            counts[name] += len(values)
+        manifest["skills"] = manifest["skills"] + new_skills
+        manifest["generation"] += 1
+        tmp = os.path.join(self.path, f"manifest.json.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.path, "manifest.json"))
+        self.refresh()
+    
+    def _plan_ids(self, student_ids: Sequence[str], new_ids: Dict[str, int]) -> List[int]:
+        """
+        Raises:
+            ValueError: If an ID does not fit the fixed-width ids column (it would be truncated)
+        """
+        ordinals = []
+        for sid in student_ids:
+            ordinal = self._ordinals.get(sid)
+            if ordinal is None:
+                if len(sid.encode("utf-8")) > ID_WIDTH:
+                    raise ValueError(f"Student ID longer than {ID_WIDTH} bytes: {sid}")
+                ordinal = new_ids.setdefault(sid, len(self._ordinals) + len(new_ids))
+            ordinals.append(ordinal)
+        return ordinals
+    
+    def upsert_students(self, students: List[Dict[str, Any]]) -> int:
+        """
+        Add or replace student features
+        
+        Args:
+            students: Dicts with student_id and any of attendance,
+                      internal_marks, skills, applications_count, semester;
+                      omitted fields keep the student's previous value
+        
+        Returns:
+            Number of students written
+        """
+        # Ordinals and offsets are planned under the file lock, against the latest generation
+        with self._writing():
+            new_ids: Dict[str, int] = {}
+            new_skills: Dict[str, int] = {}
+            ids = [str(s["student_id"]) for s in students]
+            ordinals = self._plan_ids(ids, new_ids)
+            
+            marks_count, skills_count = self._counts["marks"], self._counts["skills"]
+            rows = {name: [] for name in COLUMNS if name.startswith("rows_")}
+            marks: List[float] = []
+            skills: List[int] = []
+            for student, sid, ordinal in zip(students, ids, ordinals):
+                previous = self.student(sid) if sid in self._ordinals and self._latest[ordinal] >= 0 else {}
+                values = {**previous, **{k: v for k, v in student.items() if v is not None}}
+                student_marks = [float(m) for m in values.get("internal_marks", [])]
+                student_skills = []
+                for name in values.get("skills", []):
+                    name = str(name).lower().strip()
+                    skill_id = self._skill_ids.get(name)
+                    if skill_id is None:
+                        skill_id = new_skills.setdefault(name, len(self._skill_names) + len(new_skills))
+                    student_skills.append(skill_id)
+                
+                rows["rows_student"].append(ordinal)
+                rows["rows_attendance"].append(float(values.get("attendance", 0.0)))
+                rows["rows_semester"].append(int(values.get("semester", 0)))
+                rows["rows_applications"].append(int(values.get("applications_count", 0)))
+                rows["rows_marks_start"].append(marks_count + len(marks))
+                rows["rows_marks_length"].append(len(student_marks))
+                rows["rows_skills_start"].append(skills_count + len(skills))
+                rows["rows_skills_length"].append(len(student_skills))
+                marks.extend(student_marks)
+                skills.extend(student_skills)
+            
+            appends = {name: np.array(values, dtype=COLUMNS[name]) for name, values in rows.items()}
+            appends["ids"] = np.array([sid.encode("utf-8") for sid in new_ids], dtype=COLUMNS["ids"])
+            appends["marks"] = np.array(marks, dtype=COLUMNS["marks"])
+            appends["skills"] = np.array(skills, dtype=COLUMNS["skills"])
+            self._write(appends, list(new_skills))
+        return len(students)
+    
+    def append_attendance(self, events: List[Dict[str, Any]]) -> int:
+        """
+        Append attendance events
+        
+        Args:
+            events: Dicts with student_id, date (ISO) and status (1=present, 0=absent)
+        
+        Returns:
+            Number of events written
+        """
+        with self._writing():
+            new_ids: Dict[str, int] = {}
+            ids = [str(e["student_id"]) for e in events]
+            ordinals = self._plan_ids(ids, new_ids)
+            appends = {
+                "ids": np.array([sid.encode("utf-8") for sid in new_ids], dtype=COLUMNS["ids"]),
+                "events_student": np.array(ordinals, dtype=COLUMNS["events_student"]),
+                "events_day": np.array([_day_ordinal(e["date"]) for e in events], dtype=COLUMNS["events_day"]),
+                "events_status": np.array([int(e["status"]) for e in events], dtype=COLUMNS["events_status"]),
+            }
+            self._write(appends, [])
+        return len(events)
@@ -0,0 +1,378 @@
+"""
+Metrics and Tracing
+In-process counters, gauges and histograms with Prometheus text exposition, plus per-request trace spans
+
+Call sites create their instruments once at import time and keep the
+labelled child around, so recording a value is a couple of attribute
+lookups. With ML_METRICS_ENABLED=0 and no trace active, stage timers
+return a shared no-op context manager and nothing is recorded.
+"""
+import contextvars
+import functools
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.environ.get("ML_METRICS_ENABLED", "1") == "1"
+# With ML_TRACE_ALL=1 every request is traced; otherwise only those that ask for it (see trace())
+TRACE_ALL = os.environ.get("ML_TRACE_ALL", "0") == "1"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from 100 microseconds (a single risk prediction) to 30 s (a resume timeout)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+
+_enabled = METRICS_ENABLED
+
+
+def set_enabled(enabled: bool) -> None:
+    """Turn metric recording on or off at runtime (traces are unaffected)"""
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+    
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+    
+    def labels(self, *values: Any):
+        """Child instrument for one combination of label values (created on first use)"""
+        key = tuple(str(v) for v in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+    
+    def _new_child(self):
+        raise NotImplementedError
+    
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+    
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+    
+    def __init__(self):
+        self.value = 0
+    
+    def inc(self, amount: float = 1) -> None:
+        if _enabled:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonic count, e.g. jobs finished or cache misses"""
+    kind = "counter"
+    
+    def _new_child(self):
+        return _CounterChild()
+    
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+                for key, child in sorted(self._children.items())]
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+    
+    def __init__(self):
+        self.value = 0
+    
+    def set(self, value: float) -> None:
+        self.value = value
+    
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+    
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+
+class Gauge(Counter):
+    """Value that goes up and down, e.g. jobs in flight; always tracked so it never drifts"""
+    kind = "gauge"
+    
+    def _new_child(self):
+        return _GaugeChild()
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+    
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float) -> None:
+        if _enabled:
+            self.counts[bisect_left(self.bounds, value)] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Histogram(_Metric):
+    """Distribution over fixed buckets, e.g. stage latency or batch size"""
+    kind = "histogram"
+    
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+    
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+    
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, child in sorted(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = 'le="' + _format_value(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Registry:
+    """Named set of metrics rendered together"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+    
+    def register(self, metric: _Metric) -> _Metric:
+        """Add a metric; registering the same name again returns the existing one"""
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered with a different shape")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+    
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help_text, labelnames))
+
+
+def gauge(name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, help_text, labelnames))
+
+
+def histogram(name: str, help_text: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help_text, labelnames, buckets))
+
+
+def render() -> str:
+    """Body for a /metrics endpoint (serve it with CONTENT_TYPE)"""
+    return REGISTRY.render()
+
+
+STAGE_SECONDS = histogram("ml_stage_seconds", "Time spent in each internal stage of a service",
+                          ("service", "stage"))
+BATCH_ITEMS = histogram("ml_batch_items", "Items handled per call of a batch API",
+                        ("service", "operation"), SIZE_BUCKETS)
+
+
+class Trace:
+    """Spans recorded while handling one request"""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+    
+    def add_span(self, service: str, stage: str, start: float, duration: float) -> None:
+        self.spans.append({
+            "service": service,
+            "stage": stage,
+            "start_ms": round((start - self.started) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3)
+        })
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "spans": list(self.spans)
+        }
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("ml_trace", default=None)
+
+
+class trace:
+    """
+    Collect spans for one request
+        
+        with trace("resume.parse", enabled=request_wants_trace) as t:
+            ...
+        t.to_dict()  # None when tracing was off
+    
+    enabled defaults to ML_TRACE_ALL. Spans are recorded by every stage timer
+    that runs inside the block, including in tasks it starts.
+    """
+    
+    def __init__(self, name: str, enabled: Optional[bool] = None):
+        self.trace = Trace(name) if (TRACE_ALL if enabled is None else enabled) else None
+        self._token = None
+    
+    def __enter__(self) -> Optional[Trace]:
+        if self.trace is not None:
+            self._token = _current_trace.set(self.trace)
+        return self.trace
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._token is not None:
+            _current_trace.reset(self._token)
+            self._token = None
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+class _NoopTimer:
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+class _Timer:
+    __slots__ = ("stage", "trace", "start")
+    
+    def __init__(self, stage: "Stage", active_trace: Optional[Trace]):
+        self.stage = stage
+        self.trace = active_trace
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        self.stage.histogram.observe(duration)
+        if self.trace is not None:
+            self.trace.add_span(self.stage.service, self.stage.name, self.start, duration)
+        return None
+
+
+class Stage:
+    """
+    Timer for one internal stage of a service
+        
+        EXTRACT = Stage("resume", "extract_text")   # at import time
+        with EXTRACT():
+            ...
+    """
+    __slots__ = ("service", "name", "histogram")
+    
+    def __init__(self, service: str, name: str):
+        self.service = service
+        self.name = name
+        self.histogram = STAGE_SECONDS.labels(service, name)
+    
+    def __call__(self):
+        active_trace = _current_trace.get()
+        if not _enabled and active_trace is None:
+            return _NOOP_TIMER
+        return _Timer(self, active_trace)
+    
+    def record(self, duration: float, start: Optional[float] = None) -> None:
+        """Record a duration measured elsewhere (e.g. in a worker process)"""
+        self.histogram.observe(duration)
+        active_trace = _current_trace.get()
+        if active_trace is not None:
+            active_trace.add_span(self.service, self.name,
+                                  start if start is not None else time.perf_counter() - duration, duration)
+
+
+def timed(service: str, stage: str):
+    """Decorator timing every call of a function as one stage"""
+    def decorate(fn):
+        timer = Stage(service, stage)
+        
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled and _current_trace.get() is None:
+                return fn(*args, **kwargs)
+            with timer():
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_spans(spans: List[Dict[str, Any]], start: float) -> None:
+    """
+    Replay spans collected by a Trace in another process into this process'
+    metrics and current trace; start is the local perf_counter() at which
+    the remote work began
+    """
+    for span in spans:
+        Stage(span["service"], span["stage"]).record(span["duration_ms"] / 1000,
+                                                     start + span["start_ms"] / 1000)
@@ -0,0 +1,411 @@
+"""
+On-Demand Profiling
+Admin-triggered profiling of the next N requests (or N seconds) of one route, across all workers
+
+Sessions live in a small SQLite file that every uvicorn worker on the host
+opens, so "profile the next 20 requests of /parse-resume" is honoured by
+whichever workers receive them. Each captured request leaves one artifact in
+the session directory: a pstats file (deterministic mode, cProfile) or a
+collapsed-stack file (sampling mode) ready for flamegraph.pl / speedscope.
+
+When no session is active, profile() costs a clock read and a set lookup;
+the session table is only re-read once per refresh interval.
+
+cProfile and the sampler record one thread. profile() records the thread it
+is entered on, which for an async handler is the event loop thread: requests
+the loop serves while the capture is open are attributed to the profiled
+route too. call() runs a request's synchronous work in a dedicated thread
+when it is captured and records only that thread, so captures hold the
+handler's own work.
+"""
+import asyncio
+import contextvars
+import cProfile
+import hmac
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Any, Callable, Optional
+
+PROFILE_DIR = os.environ.get("ML_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "ml_service_profiles"))
+# Empty token: the admin operations refuse every caller
+ADMIN_TOKEN = os.environ.get("ML_PROFILE_ADMIN_TOKEN", "")
+REFRESH_SECONDS = float(os.environ.get("ML_PROFILE_REFRESH_SECONDS", "1"))
+
+MODES = ("sampling", "deterministic")
+MAX_REQUESTS = 1000
+MAX_SECONDS = 3600
+DEFAULT_SECONDS = 300
+DEFAULT_INTERVAL_MS = 5.0
+
+_SESSION_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class ProfilingError(Exception):
+    """Invalid profiling request (unknown mode, bad limits, unknown session)"""
+
+
+def check_admin_token(token: Optional[str]) -> bool:
+    """True if token matches ML_PROFILE_ADMIN_TOKEN (always False when it is unset)"""
+    return bool(ADMIN_TOKEN) and bool(token) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+class _Noop:
+    __slots__ = ()
+    
+    def __enter__(self):
+        return None
+    
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+
+_NOOP = _Noop()
+
+# Spec of the capture running in this context, so work handed to another
+# process (e.g. the resume pipeline) can be profiled under the same session
+_current_spec: contextvars.ContextVar = contextvars.ContextVar("ml_profile_spec", default=None)
+
+
+class _Sampler(threading.Thread):
+    """Samples one thread's stack every interval and counts collapsed stacks"""
+    
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="ml-profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop_event = threading.Event()
+    
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+    
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+class _Capture:
+    """Profiles the enclosed block and writes one artifact into the session directory"""
+    
+    def __init__(self, spec: Dict[str, Any]):
+        self.spec = spec
+        self._profiler: Optional[cProfile.Profile] = None
+        self._sampler: Optional[_Sampler] = None
+        self._token = None
+        self.path: Optional[str] = None
+        # Holds _capture_lock from creation until __exit__ or discard()
+        self._state_lock = threading.Lock()
+        self._entered = False
+        self._discarded = False
+    
+    def __enter__(self):
+        with self._state_lock:
+            self._entered = not self._discarded
+        if not self._entered:
+            return self
+        self._token = _current_spec.set(self.spec)
+        if self.spec["mode"] == "deterministic":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = _Sampler(threading.get_ident(), self.spec["interval_ms"] / 1000)
+            self._sampler.start()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if not self._entered:
+            return None
+        try:
+            _current_spec.reset(self._token)
+            if self._profiler is not None:
+                self._profiler.disable()
+            else:
+                self._sampler.stop()
+            os.makedirs(self.spec["directory"], exist_ok=True)
+            name = f"{os.getpid()}-{time.time_ns()}"
+            if self._profiler is not None:
+                self.path = os.path.join(self.spec["directory"], name + ".pstats")
+                self._profiler.dump_stats(self.path)
+            else:
+                self.path = os.path.join(self.spec["directory"], name + ".collapsed")
+                with open(self.path, "w", encoding="utf-8") as f:
+                    for stack, count in self._sampler.stacks.items():
+                        f.write(f"{stack} {count}\n")
+        finally:
+            _capture_lock.release()
+        return None
+    
+    def discard(self) -> None:
+        """Give up a capture whose block never started (e.g. its request was cancelled first)"""
+        with self._state_lock:
+            if self._entered or self._discarded:
+                return
+            self._discarded = True
+        _capture_lock.release()
+
+
+# cProfile and the sampler both assume one capture per process at a time
+_capture_lock = threading.Lock()
+
+
+def _run_captured(capture: _Capture, fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> Any:
+    # Entered here so the profiler/sampler attach to this thread, not the event loop
+    with capture:
+        return fn(*args, **kwargs)
+
+
+def current_spec() -> Optional[Dict[str, Any]]:
+    """Spec of the capture active in this context (picklable), or None"""
+    return _current_spec.get()
+
+
+def capture_from_spec(spec: Optional[Dict[str, Any]]):
+    """
+    Profile a block under an existing capture's session, e.g. in a worker
+    process that received current_spec() with its job; no-op for None
+    """
+    if spec is None or not _capture_lock.acquire(blocking=False):
+        return _NOOP
+    return _Capture(spec)
+
+
+class ProfileController:
+    """
+    Starts, stops and serves profiling sessions
+    
+    start()/stop()/sessions()/artifacts() are admin operations; guard the
+    endpoints exposing them with check_admin_token(). call(route, fn) (or
+    the profile(route) context manager, see the module notes) wraps request
+    handling and is what every worker calls on every request.
+    """
+    
+    def __init__(self, directory: str = PROFILE_DIR, refresh_seconds: float = REFRESH_SECONDS):
+        self.directory = directory
+        self.refresh_seconds = refresh_seconds
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, "sessions.db"), timeout=10,
+                                   isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS profile_sessions (
+                   id TEXT PRIMARY KEY,
+                   route TEXT NOT NULL,
+                   mode TEXT NOT NULL,
+                   interval_ms REAL NOT NULL,
+                   requests_left INTEGER,
+                   expires_at REAL NOT NULL,
+                   captured INTEGER NOT NULL DEFAULT 0,
+                   stopped INTEGER NOT NULL DEFAULT 0,
+                   created_at REAL NOT NULL
+               )"""
+        )
+        self._lock = threading.Lock()
+        self._active_routes: frozenset = frozenset()
+        self._next_refresh = 0.0
+    
+    def start(self, route: str, mode: str = "sampling", requests: Optional[int] = None,
+              seconds: Optional[float] = None, interval_ms: float = DEFAULT_INTERVAL_MS) -> Dict[str, Any]:
+        """
+        Profile the next `requests` requests of route, for at most `seconds`
+        
+        Raises:
+            ProfilingError: If mode or limits are invalid
+        """
+        if mode not in MODES:
+            raise ProfilingError(f"Unknown profiling mode: {mode}")
+        if requests is not None and not 0 < requests <= MAX_REQUESTS:
+            raise ProfilingError(f"requests must be between 1 and {MAX_REQUESTS}")
+        if seconds is None:
+            seconds = DEFAULT_SECONDS
+        if not 0 < seconds <= MAX_SECONDS:
+            raise ProfilingError(f"seconds must be between 0 and {MAX_SECONDS}")
+        if not 0.5 <= interval_ms <= 1000:
+            raise ProfilingError("interval_ms must be between 0.5 and 1000")
+        
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO profile_sessions (id, route, mode, interval_ms, requests_left, expires_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session_id, route, mode, interval_ms, requests, now + seconds, now)
+            )
+        self._next_refresh = 0.0
+        return self.session(session_id)
+    
+    def stop(self, session_id: str) -> Dict[str, Any]:
+        """End a session early; its artifacts are kept"""
+        with self._lock:
+            self._db.execute("UPDATE profile_sessions SET stopped = 1 WHERE id = ?", (session_id,))
+        self._next_refresh = 0.0
+        return self.session(session_id)
+    
+    def session(self, session_id: str) -> Dict[str, Any]:
+        """
+        Raises:
+            ProfilingError: If the session does not exist
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, route, mode, interval_ms, requests_left, expires_at, captured, stopped, created_at "
+                "FROM profile_sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            raise ProfilingError(f"Unknown profiling session: {session_id}")
+        return self._describe(row)
+    
+    def sessions(self) -> List[Dict[str, Any]]:
+        """All sessions, newest first"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, route, mode, interval_ms, requests_left, expires_at, captured, stopped, created_at "
+                "FROM profile_sessions ORDER BY created_at DESC"
+            ).fetchall()
+        return [self._describe(row) for row in rows]
+    
+    def _describe(self, row) -> Dict[str, Any]:
+        session_id, route, mode, interval_ms, requests_left, expires_at, captured, stopped, created_at = row
+        return {
+            "id": session_id,
+            "route": route,
+            "mode": mode,
+            "interval_ms": interval_ms,
+            "requests_left": requests_left,
+            "expires_at": expires_at,
+            "captured": captured,
+            "active": not stopped and expires_at > time.time() and requests_left != 0,
+            "created_at": created_at,
+            "artifacts": [os.path.basename(p) for p in self.artifacts(session_id)]
+        }
+    
+    def _session_dir(self, session_id: str) -> str:
+        if not _SESSION_ID.match(session_id):
+            raise ProfilingError(f"Invalid session id: {session_id}")
+        return os.path.join(self.directory, session_id)
+    
+    def artifacts(self, session_id: str) -> List[str]:
+        """Paths of the pstats / collapsed-stack files captured so far"""
+        directory = self._session_dir(session_id)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(os.path.join(directory, name) for name in os.listdir(directory))
+    
+    def collapsed(self, session_id: str) -> str:
+        """All sampled stacks of a session merged into one collapsed-stack file"""
+        stacks: Counter = Counter()
+        for path in self.artifacts(session_id):
+            if not path.endswith(".collapsed"):
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    stack, _, count = line.rstrip("\n").rpartition(" ")
+                    if stack:
+                        stacks[stack] += int(count)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+    
+    def merged_stats(self, session_id: str, path: str) -> Optional[str]:
+        """Combine a session's pstats files into one file at path (None if there are none)"""
+        import pstats
+        files = [p for p in self.artifacts(session_id) if p.endswith(".pstats")]
+        if not files:
+            return None
+        stats = pstats.Stats(files[0])
+        for extra in files[1:]:
+            stats.add(extra)
+        stats.dump_stats(path)
+        return path
+    
+    def _refresh(self, now: float) -> None:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT route FROM profile_sessions WHERE stopped = 0 AND expires_at > ? "
+                "AND (requests_left IS NULL OR requests_left > 0)", (time.time(),)
+            ).fetchall()
+        self._active_routes = frozenset(row[0] for row in rows)
+        self._next_refresh = now + self.refresh_seconds
+    
+    def _claim(self, route: str) -> Optional[Dict[str, Any]]:
+        # One transaction, so workers racing for the last request cannot both win
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id, mode, interval_ms FROM profile_sessions WHERE route = ? AND stopped = 0 "
+                    "AND expires_at > ? AND (requests_left IS NULL OR requests_left > 0) "
+                    "ORDER BY created_at LIMIT 1", (route, time.time())
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE profile_sessions SET captured = captured + 1, "
+                        "requests_left = CASE WHEN requests_left IS NULL THEN NULL ELSE requests_left - 1 END "
+                        "WHERE id = ?", (row[0],)
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        session_id, mode, interval_ms = row
+        return {"session_id": session_id, "mode": mode, "interval_ms": interval_ms,
+                "directory": self._session_dir(session_id)}
+    
+    def profile(self, route: str):
+        """
+        Context manager around handling one request of route; profiles it when
+        a session for the route has requests left, and does nothing otherwise
+        """
+        now = time.monotonic()
+        if now >= self._next_refresh:
+            self._refresh(now)
+        if route not in self._active_routes:
+            return _NOOP
+        if not _capture_lock.acquire(blocking=False):
+            # Another request in this process is being captured
+            return _NOOP
+        try:
+            spec = self._claim(route)
+        except Exception:
+            _capture_lock.release()
+            raise
+        if spec is None:
+            _capture_lock.release()
+            self._next_refresh = 0.0
+            return _NOOP
+        return _Capture(spec)
+    
+    async def call(self, route: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run one request's synchronous work for route, returning fn's result
+        
+        When a session captures the request, fn runs in a dedicated thread
+        and only that thread is profiled, so other requests the event loop
+        serves meanwhile stay out of the capture. Otherwise fn runs inline,
+        exactly as it would without profiling.
+        """
+        capture = self.profile(route)
+        if capture is _NOOP:
+            return fn(*args, **kwargs)
+        try:
+            return await asyncio.to_thread(_run_captured, capture, fn, args, kwargs)
+        finally:
+            # No-op once the thread entered the capture; its __exit__ releases the lock
+            capture.discard()
+    
+    def close(self) -> None:
+        self._db.close()
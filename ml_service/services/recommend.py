@@ -2,29 +2,279 @@
 Placement Recommendation Engine
 Recommends placement posts based on student skills
 """
-from typing import List, Dict, Any
+import heapq
+from typing import List, Dict, Any, Optional, Set, Callable
 from collections import Counter
 
+from . import metrics
+from .skill_matcher import SkillMatcher
+from .skill_vectors import ENGINE_SUBSTRING, ENGINE_TFIDF, check_engine, get_default_engine
+
+POSTS_SCANNED = metrics.histogram(
+    "ml_recommend_posts_scanned", "Posts scored per recommendation call", ("mode",), metrics.SIZE_BUCKETS
+)
+_SCANNED_POSTS = POSTS_SCANNED.labels("scan")
+_INDEXED_POSTS = POSTS_SCANNED.labels("indexed")
+
+SNAPSHOT_VERSION = 1
+
+
+def _default_normalize(skill: str) -> str:
+    return skill.lower().strip()
+
+
+class PostIndex:
+    """
+    Incrementally updatable index of placement posts
+    
+    Required skills are normalized and interned to integer IDs once, when a
+    post is registered. An inverted index maps each skill ID to the posts that
+    require it, and a containment table records, for every student skill seen
+    so far, which interned skills it matches under the substring rule of
+    PlacementRecommender.recommend. A query only touches posts sharing at
+    least one matched skill.
+    """
+    
+    def __init__(self, normalize: Optional[Callable[[str], str]] = None):
+        self._normalize = normalize or _default_normalize
+        self._skill_ids: Dict[str, int] = {}
+        # skill ID -> {post_id: number of times the post requires it}
+        self._postings: Dict[int, Dict[Any, int]] = {}
+        # post_id -> registered post; dict order is registration order
+        self._posts: Dict[Any, Dict[str, Any]] = {}
+        self._unskilled: Set[Any] = set()
+        # normalized student skill -> IDs of interned skills it matches
+        self._containment: Dict[str, Set[int]] = {}
+        self._next_seq = 0
+    
+    def __len__(self) -> int:
+        return len(self._posts)
+    
+    def __contains__(self, post_id: Any) -> bool:
+        return post_id in self._posts
+    
+    def add_post(self, post: Dict[str, Any]) -> None:
+        """Register a post, replacing (in place) any post with the same id"""
+        post_id = post.get("id", "")
+        required_skills = post.get("required_skills", []) or []
+        
+        previous = self._posts.get(post_id)
+        if previous is not None:
+            self._unlink(post_id, previous)
+            seq = previous["seq"]
+        else:
+            seq = self._next_seq
+            self._next_seq += 1
+        
+        skill_counts = Counter(self._intern(self._normalize(s)) for s in required_skills)
+        for skill_id, count in skill_counts.items():
+            self._postings.setdefault(skill_id, {})[post_id] = count
+        if not required_skills:
+            self._unskilled.add(post_id)
+        
+        self._posts[post_id] = {
+            "post_id": post_id,
+            "company": post.get("company", ""),
+            "title": post.get("title", ""),
+            "skill_counts": skill_counts,
+            "total_required_skills": len(required_skills),
+            "seq": seq
+        }
+    
+    def add_posts(self, posts: List[Dict[str, Any]]) -> None:
+        """Register several posts"""
+        for post in posts:
+            self.add_post(post)
+    
+    def remove_post(self, post_id: Any) -> bool:
+        """Remove a post; returns False if it was not registered"""
+        entry = self._posts.pop(post_id, None)
+        if entry is None:
+            return False
+        self._unlink(post_id, entry)
+        return True
+    
+    def normalize(self, skill: str) -> str:
+        """Skill in the form it is interned and matched in"""
+        return self._normalize(skill)
+    
+    def post_skill_counts(self, post_id: Any) -> Dict[int, int]:
+        """Interned ID -> number of times a registered post requires that skill"""
+        entry = self._posts.get(post_id)
+        return dict(entry["skill_counts"]) if entry is not None else {}
+    
+    def student_skills_matching(self, skill_ids: Set[int]) -> List[str]:
+        """Normalized student skills queried so far that match any of the given interned skills"""
+        return [skill for skill, matched in self._containment.items() if not matched.isdisjoint(skill_ids)]
+    
+    def matching_skill_ids(self, skills: List[str]) -> Set[int]:
+        """IDs of interned skills matched by any of the given student skills"""
+        matched: Set[int] = set()
+        for skill in skills:
+            matched |= self._contained(self._normalize(skill))
+        return matched
+    
+    @metrics.timed("recommend", "index_query")
+    def query(self, skills: List[str], top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Score registered posts against a student's skills
+        
+        Args:
+            skills: List of student skills
+            top_k: Only return the best k posts (all posts when None)
+            
+        Returns:
+            Recommendations in the same shape and order as
+            PlacementRecommender.recommend would give for the registered posts
+        """
+        hits: Dict[Any, int] = {}
+        for skill_id in self.matching_skill_ids(skills):
+            for post_id, count in self._postings.get(skill_id, {}).items():
+                hits[post_id] = hits.get(post_id, 0) + count
+        _INDEXED_POSTS.observe(len(hits) + len(self._unskilled))
+        
+        scored = []
+        for post_id, matched in hits.items():
+            entry = self._posts[post_id]
+            scored.append((round(matched / entry["total_required_skills"], 3), -entry["seq"], matched, entry))
+        for post_id in self._unskilled:
+            entry = self._posts[post_id]
+            scored.append((0.1, -entry["seq"], 0, entry))
+        
+        if top_k is None:
+            top_k = len(self._posts)
+        # Ties keep registration order, like the stable sort in recommend()
+        best = heapq.nlargest(top_k, scored, key=lambda item: item[:2])
+        recommendations = [self._format(score, matched, entry) for score, _, matched, entry in best]
+        
+        # Posts sharing no skill score 0 and follow in registration order
+        if len(recommendations) < top_k:
+            for post_id, entry in self._posts.items():
+                if post_id not in hits and post_id not in self._unskilled:
+                    recommendations.append(self._format(0.0, 0, entry))
+                    if len(recommendations) == top_k:
+                        break
+        
+        return recommendations
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Registered posts, interned skills and the containment table (see services.snapshot)
+        
+        Postings and the set of posts without required skills are derived
+        from the posts on restore, so they are not stored.
+        """
+        return {
+            "version": SNAPSHOT_VERSION,
+            "skills": list(self._skill_ids),
+            "posts": [
+                [entry["post_id"], entry["company"], entry["title"], entry["total_required_skills"], entry["seq"],
+                 list(entry["skill_counts"]), list(entry["skill_counts"].values())]
+                for entry in self._posts.values()
+            ],
+            "containment": {skill: sorted(matched) for skill, matched in self._containment.items()},
+            "next_seq": self._next_seq
+        }
+    
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict[str, Any], normalize: Optional[Callable[[str], str]] = None) -> "PostIndex":
+        """
+        Index restored from snapshot() output; normalize must be the function the snapshot was taken with
+        
+        Raises:
+            ValueError: If the snapshot is from another format version
+        """
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Post index snapshot version {snapshot.get('version')} (expected {SNAPSHOT_VERSION})")
+        index = cls(normalize)
+        index._skill_ids = {skill: i for i, skill in enumerate(snapshot["skills"])}
+        for post_id, company, title, total, seq, skill_ids, counts in snapshot["posts"]:
+            skill_counts = Counter(dict(zip(skill_ids, counts)))
+            for skill_id, count in skill_counts.items():
+                index._postings.setdefault(skill_id, {})[post_id] = count
+            if not total:
+                index._unskilled.add(post_id)
+            index._posts[post_id] = {
+                "post_id": post_id,
+                "company": company,
+                "title": title,
+                "skill_counts": skill_counts,
+                "total_required_skills": total,
+                "seq": seq
+            }
+        index._containment = {skill: set(matched) for skill, matched in snapshot["containment"].items()}
+        index._next_seq = snapshot["next_seq"]
+        return index
+    
+    def _format(self, score: float, matched: int, entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "post_id": entry["post_id"],
+            "score": score,
+            "company": entry["company"],
+            "title": entry["title"],
+            "matched_skills_count": matched,
+            "total_required_skills": entry["total_required_skills"]
+        }
+    
+    def _unlink(self, post_id: Any, entry: Dict[str, Any]) -> None:
+        for skill_id in entry["skill_counts"]:
+            self._postings[skill_id].pop(post_id, None)
+        self._unskilled.discard(post_id)
+    
+    def _intern(self, skill: str) -> int:
+        skill_id = self._skill_ids.get(skill)
+        if skill_id is None:
+            skill_id = len(self._skill_ids)
+            self._skill_ids[skill] = skill_id
+            # Keep the containment table complete for student skills already seen
+            for student_skill, matched in self._containment.items():
+                if skill in student_skill or student_skill in skill:
+                    matched.add(skill_id)
+        return skill_id
+    
+    def _contained(self, student_skill: str) -> Set[int]:
+        matched = self._containment.get(student_skill)
+        if matched is None:
+            matched = {
+                skill_id for skill, skill_id in self._skill_ids.items()
+                if skill in student_skill or student_skill in skill
+            }
+            self._containment[student_skill] = matched
+        return matched
+
 
 class PlacementRecommender:
-    def __init__(self):
-        pass
+    def __init__(self, matcher: Optional[SkillMatcher] = None):
+        # With a matcher, aliases compare as their canonical skill ("k8s" -> "kubernetes")
+        self.matcher = matcher
+        self._normalize = matcher.canonicalize if matcher is not None else _default_normalize
+        self.index = PostIndex(self._normalize)
     
-    def recommend(self, skills: List[str], posts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    @metrics.timed("recommend", "recommend")
+    def recommend(self, skills: List[str], posts: List[Dict[str, Any]],
+                  engine: str = ENGINE_SUBSTRING) -> List[Dict[str, Any]]:
         """
         Recommend placement posts based on student skills
         
         Args:
             skills: List of student skills
             posts: List of post dictionaries with id, required_skills, company, title
+            engine: "substring" (partial string match) or "tfidf" (character
+                    n-gram similarity, see skill_vectors)
             
         Returns:
             List of recommendations sorted by score (highest first)
         """
+        if check_engine(engine) == ENGINE_TFIDF:
+            _SCANNED_POSTS.observe(len(posts))
+            return get_default_engine(self.matcher).rank_posts(skills, posts)
+        
         recommendations = []
         
+        _SCANNED_POSTS.observe(len(posts))
+        
         # Normalize student skills
-        student_skills_normalized = [s.lower().strip() for s in skills]
+        student_skills_normalized = [self._normalize(s) for s in skills]
         
         for post in posts:
             # Posts are now always dictionaries (converted from Pydantic in the endpoint)
@@ -38,7 +288,7 @@ class PlacementRecommender:
                 score = 0.1
             else:
                 # Normalize required skills
-                required_skills_normalized = [s.lower().strip() for s in required_skills]
+                required_skills_normalized = [self._normalize(s) for s in required_skills]
                 
                 # Calculate skill overlap
                 matched_skills = []
@@ -65,4 +315,43 @@ class PlacementRecommender:
         recommendations.sort(key=lambda x: x["score"], reverse=True)
         
         return recommendations
-
+    
+    def register_posts(self, posts: List[Dict[str, Any]]) -> None:
+        """Add or update posts in the persistent index used by recommend_indexed"""
+        self.index.add_posts(posts)
+    
+    def remove_post(self, post_id: Any) -> bool:
+        """Drop a post (e.g. past its deadline) from the persistent index"""
+        return self.index.remove_post(post_id)
+    
+    def recommend_indexed(self, skills: List[str], top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Recommend registered posts based on student skills
+        
+        Args:
+            skills: List of student skills
+            top_k: Number of recommendations to return (all posts when None)
+            
+        Returns:
+            List of recommendations sorted by score (highest first), scored
+            exactly as recommend() scores the same posts
+        """
+        return self.index.query(skills, top_k)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Persistent index state, tagged with the skills dictionary it was normalized with"""
+        return {
+            "matcher": self.matcher.fingerprint if self.matcher is not None else None,
+            "index": self.index.snapshot()
+        }
+    
+    def restore(self, snapshot: Dict[str, Any]) -> None:
+        """
+        Replace the persistent index with one from snapshot()
+        
+        Raises:
+            ValueError: If the snapshot was taken with another skills dictionary or format version
+        """
+        if snapshot.get("matcher") != (self.matcher.fingerprint if self.matcher is not None else None):
+            raise ValueError("Recommender snapshot was taken with a different skills dictionary")
+        self.index = PostIndex.from_snapshot(snapshot["index"], self._normalize)
@@ -0,0 +1,281 @@
+"""
+Recommendation Store Service
+Materialized top-k placement recommendations per student, refreshed on writes
+
+Dashboards read a student's recommendations with one dictionary lookup.
+The work happens when something changes: a post added, edited or removed
+recomputes only the students it can move in or out of their top k, and a
+student's skills changing recomputes only that student. Rows are computed
+with the recommender's PostIndex, so they equal recommend_indexed(skills, top_k).
+"""
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Any, Iterable, Optional, Set
+
+from . import metrics
+from .recommend import PlacementRecommender
+
+DEFAULT_TOP_K = int(os.environ.get("RECOMMEND_STORE_TOP_K", "20"))
+
+ROWS_RECOMPUTED = metrics.histogram(
+    "ml_recommend_store_rows_recomputed", "Student rows recomputed per store write, by trigger", ("trigger",),
+    metrics.SIZE_BUCKETS
+)
+_RECOMPUTED_POST = ROWS_RECOMPUTED.labels("post")
+_RECOMPUTED_STUDENT = ROWS_RECOMPUTED.labels("student")
+READS = metrics.counter("ml_recommend_store_reads_total", "Recommendation store reads, by result", ("result",))
+_READ_HIT = READS.labels("hit")
+_READ_MISS = READS.labels("miss")
+
+
+class RecommendationStore:
+    """
+    Top-k recommendations per student, kept current as posts and skills change
+    
+    The first tier is process memory. With db_path, posts, student skills and
+    materialized rows are also written through to a SQLite file, and a new
+    store opened on the same file starts with every row already computed.
+    
+    Which students a post write touches:
+        - students whose row holds the post (its score changed or it is gone)
+        - students with a skill matching one of the post's required skills,
+          if the post's score for them reaches their k-th score
+        - students whose row is short of k entries, or ends in scores no
+          higher than the post would get without a match (0, or 0.1 for a
+          post without required skills)
+    """
+    
+    def __init__(self, recommender: Optional[PlacementRecommender] = None, top_k: int = DEFAULT_TOP_K,
+                 db_path: Optional[str] = None):
+        self.top_k = top_k
+        self.recommender = recommender or PlacementRecommender()
+        self.index = self.recommender.index
+        self._skills: Dict[str, List[str]] = {}
+        self._rows: Dict[str, List[Dict[str, Any]]] = {}
+        # normalized skill -> students having it; post ID -> students whose row holds it
+        self._by_skill: Dict[str, Set[str]] = {}
+        self._by_post: Dict[Any, Set[str]] = {}
+        self._lock = threading.Lock()
+        
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS recommend_posts (
+                       post_key TEXT PRIMARY KEY,
+                       seq INTEGER NOT NULL,
+                       post TEXT NOT NULL
+                   )"""
+            )
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS recommend_students (
+                       student_id TEXT PRIMARY KEY,
+                       skills TEXT NOT NULL,
+                       top_k INTEGER NOT NULL,
+                       recommendations TEXT NOT NULL
+                   )"""
+            )
+            self._db.commit()
+            self._load()
+    
+    def __len__(self) -> int:
+        return len(self._rows)
+    
+    def __contains__(self, student_id: Any) -> bool:
+        return str(student_id) in self._rows
+    
+    def get(self, student_id: Any) -> Optional[List[Dict[str, Any]]]:
+        """
+        Materialized recommendations of a student (sorted by score, highest
+        first), or None for a student the store does not know
+        """
+        rows = self._rows.get(str(student_id))
+        if rows is None:
+            _READ_MISS.inc()
+            return None
+        _READ_HIT.inc()
+        return list(rows)
+    
+    # Writes
+    
+    def set_student(self, student_id: Any, skills: List[str]) -> List[Dict[str, Any]]:
+        """Add a student or replace their skills; recomputes only that student's row"""
+        student_id = str(student_id)
+        skills = list(skills or [])
+        with self._lock:
+            self._unlink_skills(student_id)
+            self._skills[student_id] = skills
+            for skill in skills:
+                self._by_skill.setdefault(self.index.normalize(skill), set()).add(student_id)
+            self._recompute([student_id])
+            self._persist_students([student_id])
+            _RECOMPUTED_STUDENT.observe(1)
+            return list(self._rows[student_id])
+    
+    def set_students(self, students: Iterable[Dict[str, Any]]) -> None:
+        """Bulk set_student for {"student_id", "skills"} records"""
+        for student in students:
+            self.set_student(student["student_id"], student.get("skills", []))
+    
+    def remove_student(self, student_id: Any) -> bool:
+        """Forget a student; returns False if they were not stored"""
+        student_id = str(student_id)
+        with self._lock:
+            if student_id not in self._skills:
+                return False
+            self._unlink_skills(student_id)
+            self._unlink_row(student_id)
+            del self._skills[student_id]
+            del self._rows[student_id]
+            if self._db is not None:
+                self._db.execute("DELETE FROM recommend_students WHERE student_id = ?", (student_id,))
+                self._db.commit()
+            return True
+    
+    def upsert_post(self, post: Dict[str, Any]) -> int:
+        """
+        Add or edit a post
+        
+        Returns:
+            Number of student rows recomputed
+        """
+        post_id = post.get("id", "")
+        with self._lock:
+            is_new = post_id not in self.index
+            self.index.add_post(post)
+            
+            affected = set(self._by_post.get(post_id, ()))
+            skill_counts = self.index.post_skill_counts(post_id)
+            total = sum(skill_counts.values())
+            candidates: Set[str] = set()
+            for skill in self.index.student_skills_matching(set(skill_counts)):
+                candidates |= self._by_skill.get(skill, set())
+            for student_id in candidates - affected:
+                rows = self._rows[student_id]
+                if len(rows) < self.top_k:
+                    affected.add(student_id)
+                    continue
+                matched_ids = self.index.matching_skill_ids(self._skills[student_id])
+                score = round(sum(c for i, c in skill_counts.items() if i in matched_ids) / total, 3)
+                # A new post loses ties (it registered last); an edited one may win them
+                if score > rows[-1]["score"] or (score == rows[-1]["score"] and not is_new):
+                    affected.add(student_id)
+            # Score the post gets from a student matching none of its skills
+            fallback = 0.1 if not total else 0.0
+            for student_id, rows in self._rows.items():
+                if len(rows) < self.top_k or (rows[-1]["score"] <= fallback and (fallback > 0 or not is_new)):
+                    affected.add(student_id)
+            
+            self._recompute(affected)
+            self._persist_post(post_id, post)
+            self._persist_students(affected)
+            _RECOMPUTED_POST.observe(len(affected))
+            return len(affected)
+    
+    def upsert_posts(self, posts: Iterable[Dict[str, Any]]) -> int:
+        """Add or edit several posts; returns the total rows recomputed"""
+        return sum(self.upsert_post(post) for post in posts)
+    
+    def remove_post(self, post_id: Any) -> int:
+        """
+        Remove a post (e.g. past its deadline)
+        
+        Returns:
+            Number of student rows recomputed (-1 if the post was not stored)
+        """
+        with self._lock:
+            if not self.index.remove_post(post_id):
+                return -1
+            affected = set(self._by_post.pop(post_id, ()))
+            self._recompute(affected)
+            if self._db is not None:
+                self._db.execute("DELETE FROM recommend_posts WHERE post_key = ?", (json.dumps(post_id),))
+            self._persist_students(affected)
+            _RECOMPUTED_POST.observe(len(affected))
+            return len(affected)
+    
+    def rebuild(self) -> None:
+        """Recompute every row (e.g. after changing top_k)"""
+        with self._lock:
+            self._recompute(list(self._skills))
+            self._persist_students(list(self._skills))
+    
+    # Internals (called with the lock held)
+    
+    def _recompute(self, student_ids: Iterable[str]) -> None:
+        for student_id in student_ids:
+            self._unlink_row(student_id)
+            rows = self.index.query(self._skills[student_id], self.top_k)
+            self._rows[student_id] = rows
+            for row in rows:
+                self._by_post.setdefault(row["post_id"], set()).add(student_id)
+    
+    def _unlink_row(self, student_id: str) -> None:
+        for row in self._rows.get(student_id, ()):
+            holders = self._by_post.get(row["post_id"])
+            if holders is not None:
+                holders.discard(student_id)
+    
+    def _unlink_skills(self, student_id: str) -> None:
+        for skill in self._skills.get(student_id, ()):
+            holders = self._by_skill.get(self.index.normalize(skill))
+            if holders is not None:
+                holders.discard(student_id)
+    
+    def _persist_post(self, post_id: Any, post: Dict[str, Any]) -> None:
+        if self._db is None:
+            return
+        key = json.dumps(post_id)
+        row = self._db.execute("SELECT seq FROM recommend_posts WHERE post_key = ?", (key,)).fetchone()
+        if row is None:
+            row = self._db.execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM recommend_posts").fetchone()
+        self._db.execute("INSERT OR REPLACE INTO recommend_posts (post_key, seq, post) VALUES (?, ?, ?)",
+                         (key, row[0], json.dumps(post)))
+    
+    def _persist_students(self, student_ids: Iterable[str]) -> None:
+        if self._db is None:
+            return
+        self._db.executemany(
+            "INSERT OR REPLACE INTO recommend_students (student_id, skills, top_k, recommendations) "
+            "VALUES (?, ?, ?, ?)",
+            [(sid, json.dumps(self._skills[sid]), self.top_k, json.dumps(self._rows[sid])) for sid in student_ids]
+        )
+        self._db.commit()
+    
+    def _load(self) -> None:
+        for (post_json,) in self._db.execute("SELECT post FROM recommend_posts ORDER BY seq"):
+            self.index.add_post(json.loads(post_json))
+        stale = []
+        for student_id, skills_json, top_k, rows_json in self._db.execute(
+                "SELECT student_id, skills, top_k, recommendations FROM recommend_students"):
+            skills = json.loads(skills_json)
+            self._skills[student_id] = skills
+            for skill in skills:
+                self._by_skill.setdefault(self.index.normalize(skill), set()).add(student_id)
+            # Queried once so later post writes can find this student by skill
+            self.index.matching_skill_ids(skills)
+            if top_k != self.top_k:
+                stale.append(student_id)
+                continue
+            self._rows[student_id] = json.loads(rows_json)
+            for row in self._rows[student_id]:
+                self._by_post.setdefault(row["post_id"], set()).add(student_id)
+        if stale:
+            self._recompute(stale)
+            self._persist_students(stale)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "students": len(self._rows),
+            "posts": len(self.index),
+            "top_k": self.top_k,
+            "persistent": self._db is not None
+        }
+    
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -3,48 +3,324 @@ Resume Parser Service
 Extracts structured information from PDF resumes
 """
 import pdfplumber
+import asyncio
 import re
-import spacy
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Iterator, Set, TYPE_CHECKING
+import gc
+import hashlib
 import io
+import os
+import threading
+import time
 
-# Load spaCy model (will download on first run if not present)
-try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-    print("Warning: spaCy model 'en_core_web_sm' not found. Install with: python -m spacy download en_core_web_sm")
-    nlp = None
-
-# Common tech skills dictionary
-TECH_SKILLS = [
-    "python", "java", "javascript", "typescript", "react", "node.js", "express",
-    "django", "flask", "fastapi", "sql", "postgresql", "mongodb", "redis",
-    "docker", "kubernetes", "aws", "azure", "gcp", "git", "github", "gitlab",
-    "html", "css", "bootstrap", "tailwind", "vue", "angular", "next.js",
-    "machine learning", "deep learning", "tensorflow", "pytorch", "scikit-learn",
-    "data science", "pandas", "numpy", "matplotlib", "seaborn",
-    "c++", "c#", ".net", "spring", "hibernate", "jpa",
-    "rest api", "graphql", "microservices", "ci/cd", "jenkins",
-    "linux", "bash", "shell scripting", "agile", "scrum"
+from . import metrics
+from .skill_matcher import get_default_matcher
+
+if TYPE_CHECKING:
+    from .resume_cache import ResumeCache
+
+# spaCy model, loaded on first use. Only NER on the first line is needed
+# (_extract_name), so the other components are excluded at load time.
+SPACY_MODEL = os.environ.get("SPACY_MODEL", "en_core_web_sm")
+SPACY_EXCLUDED_COMPONENTS = ["parser", "lemmatizer", "tagger", "attribute_ruler", "senter"]
+
+_nlp = None
+_nlp_loaded = False
+_nlp_lock = threading.Lock()
+_nlp_load_stats: Dict[str, Any] = {"model": SPACY_MODEL, "loaded": False, "load_seconds": None}
+
+# Stage timers: PDF text extraction, spaCy, and the regex/dictionary field extractors
+STAGE_NLP_LOAD = metrics.Stage("resume", "nlp_load")
+STAGE_EXTRACT_TEXT = metrics.Stage("resume", "extract_text")
+STAGE_SEGMENT = metrics.Stage("resume", "segment")
+STAGE_NAME = metrics.Stage("resume", "name_nlp")
+STAGE_SKILLS = metrics.Stage("resume", "skills_dictionary")
+STAGE_FIELDS = metrics.Stage("resume", "fields_regex")
+PAGES_READ = metrics.histogram(
+    "ml_resume_pages_read", "PDF pages laid out per resume", buckets=(1, 2, 3, 5, 10, 20, 50)
+).labels()
+
+
+def get_nlp():
+    """The shared spaCy pipeline (None if the model is not installed)"""
+    global _nlp, _nlp_loaded
+    if not _nlp_loaded:
+        with _nlp_lock:
+            if not _nlp_loaded:
+                start = time.perf_counter()
+                try:
+                    import spacy
+                    _nlp = spacy.load(SPACY_MODEL, exclude=SPACY_EXCLUDED_COMPONENTS)
+                except OSError:
+                    print(f"Warning: spaCy model '{SPACY_MODEL}' not found. Install with: python -m spacy download {SPACY_MODEL}")
+                    _nlp = None
+                elapsed = time.perf_counter() - start
+                STAGE_NLP_LOAD.record(elapsed, start)
+                _nlp_load_stats.update({
+                    "loaded": _nlp is not None,
+                    "load_seconds": round(elapsed, 3),
+                    "components": list(_nlp.pipe_names) if _nlp is not None else []
+                })
+                _nlp_loaded = True
+    return _nlp
+
+
+def preload_nlp(freeze: bool = True):
+    """
+    Load the spaCy model now, e.g. in a gunicorn master (preload_app) before
+    workers fork, so every worker shares its pages copy-on-write.
+    
+    freeze moves everything allocated so far into the permanent GC generation;
+    otherwise the collector touching the objects would copy those pages into
+    each worker anyway.
+    """
+    nlp = get_nlp()
+    if freeze:
+        gc.freeze()
+    return nlp
+
+
+def nlp_load_stats() -> Dict[str, Any]:
+    """Model name, whether it loaded, load time in seconds and enabled components"""
+    return dict(_nlp_load_stats)
+
+
+if os.environ.get("PRELOAD_SPACY_MODEL") == "1":
+    preload_nlp()
+
+# Common tech skills dictionary, compiled once from data/skills.json (with aliases)
+SKILL_MATCHER = get_default_matcher()
+TECH_SKILLS = SKILL_MATCHER.canonical
+
+# Field patterns, compiled once
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+PHONE_PATTERNS = [
+    re.compile(r'\b\d{10}\b'),
+    re.compile(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b'),
+    re.compile(r'\b\+?\d{1,3}[-.\s]?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}\b')
 ]
+SKILL_SEPARATORS = re.compile(r'[,;•\n]')
+SKILL_SUBHEADING = re.compile(r'^[^:,]{1,30}:\s*')
+BLANK_LINES = re.compile(r'\n\s*\n')
+
+# A section heading: a known label at the start of a line, alone or followed
+# by a colon and inline content ("Skills", "Projects:", "Education: B.Tech ...")
+SECTION_LINE = re.compile(
+    r'^[ \t]*(?P<label>summary|objective|about(?:[ \t]+me)?|profile'
+    r'|(?:technical[ \t]+)?skills?|technolog(?:y|ies)'
+    r'|education|academics?|qualifications?|degree|university|college'
+    r'|(?:work[ \t]+)?experience|work|employment|internships?'
+    r'|(?:academic[ \t]+|personal[ \t]+)?projects?)'
+    r'[ \t]*(?::[ \t]*(?P<inline>[^\n]*))?[ \t]*$',
+    re.IGNORECASE | re.MULTILINE
+)
+SECTION_LABELS = {
+    "summary": "summary", "objective": "summary", "about": "summary", "profile": "summary",
+    "skill": "skills", "technolog": "skills",
+    "education": "education", "academic": "education", "qualification": "education",
+    "degree": "education", "university": "education", "college": "education",
+    "experience": "experience", "work": "experience", "employment": "experience",
+    "internship": "experience", "project": "projects",
+}
+
+
+def _section_name(label: str) -> str:
+    words = label.lower().split()
+    # "About Me" is the one heading whose last word is not the label
+    if words[0] == "about":
+        return "summary"
+    # "Technical Skills" / "Work Experience" / "Academic Projects": the last word decides
+    key = words[-1]
+    for prefix, name in SECTION_LABELS.items():
+        if key.startswith(prefix):
+            return name
+    return "header"
+
+
+def segment_sections(text: str) -> Dict[str, List[str]]:
+    """
+    Split resume text into labeled sections in a single pass
+    
+    Returns:
+        Section name ("header", "summary", "skills", "education",
+        "experience", "projects") -> bodies of every section with that name,
+        in document order. "header" is the text before the first heading.
+    """
+    sections: Dict[str, List[str]] = {"header": []}
+    name, start = "header", 0
+    pending_inline = ""
+    for match in SECTION_LINE.finditer(text):
+        body = pending_inline + text[start:match.start()]
+        sections.setdefault(name, []).append(body.strip())
+        name = _section_name(match.group("label"))
+        inline = match.group("inline")
+        pending_inline = inline + "\n" if inline else ""
+        start = match.end()
+    body = pending_inline + text[start:]
+    sections.setdefault(name, []).append(body.strip())
+    return sections
+
+
+# Sections field extraction relies on; streamed extraction can stop reading
+# pages once all of them (and an email address) were seen. Headings are found
+# with SECTION_LINE, exactly as segment_sections will split the text.
+SECTION_HEADINGS = ("skills", "education", "experience", "projects")
+
+
+def _sections_found(page_text: str) -> Set[str]:
+    found = {_section_name(match.group("label")) for match in SECTION_LINE.finditer(page_text)}
+    if EMAIL_PATTERN.search(page_text):
+        found.add("contact")
+    return found
+
+
+def iter_page_text(pdf_bytes: bytes, max_pages: Optional[int] = None) -> Iterator[str]:
+    """
+    Yield the text of each PDF page as it is extracted
+    
+    Pages are laid out one at a time and released right after, so stopping
+    the iteration early skips the layout work of the remaining pages.
+    """
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        for page in pdf.pages[:max_pages]:
+            try:
+                yield page.extract_text() or ""
+            finally:
+                page.close()
+
+
+def extract_text(pdf_bytes: bytes, max_pages: Optional[int] = None, max_chars: Optional[int] = None,
+                 early_exit: bool = False) -> str:
+    """
+    Extract PDF text, optionally stopping early
+    
+    Args:
+        pdf_bytes: Raw PDF file contents
+        max_pages: Page budget (all pages when None)
+        max_chars: Character budget; text is cut at this length (no limit when None)
+        early_exit: Stop one page after every section in SECTION_HEADINGS and an
+                    email address have been found (the last section found may
+                    continue on the next page)
+    """
+    parts = []
+    size = 0
+    pending = set(SECTION_HEADINGS) | {"contact"}
+    for page_text in iter_page_text(pdf_bytes, max_pages):
+        parts.append(page_text)
+        size += len(page_text)
+        if max_chars is not None and size >= max_chars:
+            break
+        if early_exit:
+            if not pending:
+                # This was the page after the last heading was found
+                break
+            pending -= _sections_found(page_text)
+    
+    PAGES_READ.observe(len(parts))
+    # One page per line block: a heading at the top of a page must start its own line
+    text = "\n".join(parts)
+    return text[:max_chars] if max_chars is not None else text
+
+
+def cache_variant(max_pages: Optional[int], max_chars: Optional[int], early_exit: bool) -> str:
+    """Cache variant for results produced with the given extraction budget"""
+    return f"{max_pages}:{max_chars}:{int(early_exit)}"
+
+
+# Bump when parsing output changes for reasons not visible in this module
+PARSER_VERSION = "1"
+_parser_version: Optional[str] = None
+
+
+def parser_version() -> str:
+    """
+    Version tag for cached parse results: PARSER_VERSION plus a hash of the
+    skills dictionary (aliases included) and of this module's source
+    (extraction regexes included)
+    """
+    global _parser_version
+    if _parser_version is None:
+        digest = hashlib.sha256(PARSER_VERSION.encode())
+        digest.update(SKILL_MATCHER.fingerprint.encode())
+        try:
+            with open(__file__, "rb") as source:
+                digest.update(source.read())
+        except OSError:
+            pass
+        _parser_version = f"{PARSER_VERSION}-{digest.hexdigest()[:12]}"
+    return _parser_version
 
 
 class ResumeParser:
-    def __init__(self):
-        self.nlp = nlp
+    def __init__(self, cache: Optional["ResumeCache"] = None, max_chars: Optional[int] = None,
+                 early_exit: bool = False):
+        self.cache = cache
+        # Streaming mode: stop reading pages at max_chars or once all sections were found
+        self.max_chars = max_chars
+        self.early_exit = early_exit
+    
+    @property
+    def nlp(self):
+        return get_nlp()
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Parser version and which spaCy pipeline this worker had loaded
+        
+        The skills automaton compiles in about a millisecond and spaCy
+        pipelines have no faster restore path than loading them, so neither
+        is embedded; restore() loads the pipeline up front instead of on the
+        first resume.
+        """
+        return {"parser_version": parser_version(), "nlp": nlp_load_stats()}
+    
+    def restore(self, snapshot: Dict[str, Any]) -> None:
+        """
+        Load the spaCy pipeline now if the snapshotted worker had it loaded
+        
+        Raises:
+            ValueError: If the snapshot was taken with another parser version
+        """
+        if snapshot.get("parser_version") != parser_version():
+            raise ValueError("Resume parser snapshot was taken with a different parser version")
+        nlp = snapshot.get("nlp") or {}
+        if nlp.get("loaded") and nlp.get("model") == SPACY_MODEL:
+            get_nlp()
     
     async def parse_pdf(self, pdf_bytes: bytes) -> Dict[str, Any]:
         """
         Parse PDF resume and extract structured information
+        
+        Parsing (and the cache lookup) runs in a worker thread, so the event
+        loop keeps serving other requests; use ResumePipeline to also run
+        parses in parallel across processes.
         """
+        return await asyncio.to_thread(self.parse, pdf_bytes)
+    
+    def parse(self, pdf_bytes: bytes, max_pages: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Parse PDF resume and extract structured information
+        
+        Args:
+            pdf_bytes: Raw PDF file contents
+            max_pages: Only read the first max_pages pages (all pages when None)
+        """
+        if self.cache is None:
+            return self._parse(pdf_bytes, max_pages)
+        
+        variant = cache_variant(max_pages, self.max_chars, self.early_exit)
+        cached = self.cache.get(pdf_bytes, variant=variant)
+        if cached is not None:
+            return cached
+        result = self._parse(pdf_bytes, max_pages)
+        self.cache.put(pdf_bytes, result, variant=variant)
+        return result
+    
+    def _parse(self, pdf_bytes: bytes, max_pages: Optional[int]) -> Dict[str, Any]:
         try:
             # Extract text from PDF
-            pdf_file = io.BytesIO(pdf_bytes)
-            text = ""
-            
-            with pdfplumber.open(pdf_file) as pdf:
-                for page in pdf.pages:
-                    text += page.extract_text() or ""
+            with STAGE_EXTRACT_TEXT():
+                text = extract_text(pdf_bytes, max_pages, self.max_chars, self.early_exit)
             
             if not text:
                 return {
@@ -58,15 +334,22 @@ class ResumeParser:
                     "summary": ""
                 }
             
+            # Split into sections once; each extractor reads only its own
+            with STAGE_SEGMENT():
+                sections = segment_sections(text)
+            
             # Extract information
-            name = self._extract_name(text)
-            email = self._extract_email(text)
-            phone = self._extract_phone(text)
-            skills = self._extract_skills(text)
-            projects = self._extract_projects(text)
-            education = self._extract_education(text)
-            experience = self._extract_experience(text)
-            summary = self._extract_summary(text)
+            with STAGE_NAME():
+                name = self._extract_name(text)
+            with STAGE_SKILLS():
+                skills = self._extract_skills(text, sections)
+            with STAGE_FIELDS():
+                email = self._extract_email(text, sections)
+                phone = self._extract_phone(text, sections)
+                projects = self._extract_projects(sections)
+                education = self._extract_education(sections)
+                experience = self._extract_experience(sections)
+                summary = self._extract_summary(sections)
             
             return {
                 "name": name,
@@ -84,101 +367,87 @@ class ResumeParser:
     def _extract_name(self, text: str) -> str:
         """Extract name (usually first line or from NER)"""
         lines = text.split('\n')[:5]
-        if self.nlp:
-            doc = self.nlp(lines[0])
+        nlp = self.nlp
+        if nlp:
+            doc = nlp(lines[0])
             for ent in doc.ents:
                 if ent.label_ == "PERSON":
                     return ent.text.strip()
         return lines[0].strip() if lines else ""
     
-    def _extract_email(self, text: str) -> str:
-        """Extract email using regex"""
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        matches = re.findall(email_pattern, text)
-        return matches[0] if matches else ""
-    
-    def _extract_phone(self, text: str) -> str:
-        """Extract phone number using regex"""
-        phone_patterns = [
-            r'\b\d{10}\b',
-            r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b',
-            r'\b\+?\d{1,3}[-.\s]?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}\b'
-        ]
-        for pattern in phone_patterns:
-            matches = re.findall(pattern, text)
-            if matches:
-                return matches[0]
+    def _extract_email(self, text: str, sections: Dict[str, List[str]]) -> str:
+        """Extract email using regex (contact details usually sit in the header)"""
+        for source in (sections["header"][0], text):
+            match = EMAIL_PATTERN.search(source)
+            if match:
+                return match.group(0)
+        return ""
+    
+    def _extract_phone(self, text: str, sections: Dict[str, List[str]]) -> str:
+        """Extract phone number using regex (header first, then the whole text)"""
+        for source in (sections["header"][0], text):
+            for pattern in PHONE_PATTERNS:
+                match = pattern.search(source)
+                if match:
+                    return match.group(0)
         return ""
     
-    def _extract_skills(self, text: str) -> List[str]:
+    def _extract_skills(self, text: str, sections: Dict[str, List[str]]) -> List[str]:
         """Extract technical skills"""
-        text_lower = text.lower()
         found_skills = []
         
-        # Check against skills dictionary
-        for skill in TECH_SKILLS:
-            if skill.lower() in text_lower:
-                found_skills.append(skill.title())
+        # Check against skills dictionary (single pass, whole words only)
+        for skill in SKILL_MATCHER.find_all(text):
+            found_skills.append(skill.title())
         
-        # Look for skills section
-        skills_section_pattern = r'(?:skills?|technical skills?|technologies?)[:]\s*(.+?)(?:\n\n|\n[A-Z]|$)'
-        match = re.search(skills_section_pattern, text, re.IGNORECASE | re.DOTALL)
-        if match:
-            skills_text = match.group(1)
-            # Extract comma/separated skills
-            skills_list = re.split(r'[,;•\n]', skills_text)
-            for skill in skills_list:
-                skill = skill.strip()
-                if skill and len(skill) > 2:
-                    found_skills.append(skill)
+        # Items listed in the skills section(s)
+        found_skills.extend(self._extract_listed_skills(sections))
         
         # Remove duplicates and return
         return list(set(found_skills))
     
-    def _extract_projects(self, text: str) -> List[str]:
+    def _extract_listed_skills(self, sections: Dict[str, List[str]]) -> List[str]:
+        """Comma/semicolon/bullet separated items of the skills section(s)"""
+        listed = []
+        for skills_text in sections.get("skills", []):
+            # Drop "Languages:"-style sub-headings in front of each item
+            for skill in SKILL_SEPARATORS.split(skills_text):
+                skill = SKILL_SUBHEADING.sub("", skill.strip()).strip()
+                if skill and len(skill) > 2:
+                    listed.append(skill)
+        return listed
+    
+    def _section_entries(self, sections: Dict[str, List[str]], name: str, limit: int) -> List[str]:
+        """Paragraphs of the named sections, each cut to 200 characters"""
+        entries = []
+        for body in sections.get(name, []):
+            for entry in BLANK_LINES.split(body):
+                entry = entry.strip()
+                if entry:
+                    entries.append(entry[:200])  # Limit length
+                    if len(entries) == limit:
+                        return entries
+        return entries
+    
+    def _extract_projects(self, sections: Dict[str, List[str]]) -> List[str]:
         """Extract project descriptions"""
-        projects = []
-        project_pattern = r'(?:project|projects?)[:]\s*(.+?)(?:\n\n|\n(?:Education|Experience|Skills)|$)'
-        matches = re.finditer(project_pattern, text, re.IGNORECASE | re.DOTALL)
-        for match in matches:
-            project_text = match.group(1).strip()
-            if project_text:
-                projects.append(project_text[:200])  # Limit length
-        return projects[:5]  # Return top 5
-    
-    def _extract_education(self, text: str) -> List[str]:
+        return self._section_entries(sections, "projects", 5)  # Return top 5
+    
+    def _extract_education(self, sections: Dict[str, List[str]]) -> List[str]:
         """Extract education information"""
-        education = []
-        edu_pattern = r'(?:education|degree|university|college)[:]\s*(.+?)(?:\n\n|\n(?:Experience|Skills|Projects)|$)'
-        matches = re.finditer(edu_pattern, text, re.IGNORECASE | re.DOTALL)
-        for match in matches:
-            edu_text = match.group(1).strip()
-            if edu_text:
-                education.append(edu_text[:200])
-        return education[:3]  # Return top 3
-    
-    def _extract_experience(self, text: str) -> List[str]:
+        return self._section_entries(sections, "education", 3)  # Return top 3
+    
+    def _extract_experience(self, sections: Dict[str, List[str]]) -> List[str]:
         """Extract work experience"""
-        experience = []
-        exp_pattern = r'(?:experience|work|employment)[:]\s*(.+?)(?:\n\n|\n(?:Education|Skills|Projects)|$)'
-        matches = re.finditer(exp_pattern, text, re.IGNORECASE | re.DOTALL)
-        for match in matches:
-            exp_text = match.group(1).strip()
-            if exp_text:
-                experience.append(exp_text[:200])
-        return experience[:5]  # Return top 5
-    
-    def _extract_summary(self, text: str) -> str:
-        """Extract summary/objective"""
-        summary_patterns = [
-            r'(?:summary|objective|about)[:]\s*(.+?)(?:\n\n|\n(?:Education|Experience|Skills)|$)',
-            r'^(.{0,300})(?:\n\n|\n(?:Education|Experience|Skills))'
-        ]
-        for pattern in summary_patterns:
-            match = re.search(pattern, text, re.IGNORECASE | re.DOTALL | re.MULTILINE)
-            if match:
-                summary = match.group(1).strip()
-                if len(summary) > 50:
-                    return summary[:300]
+        return self._section_entries(sections, "experience", 5)  # Return top 5
+    
+    def _extract_summary(self, sections: Dict[str, List[str]]) -> str:
+        """Extract summary/objective (or the introduction before the first heading)"""
+        candidates = [BLANK_LINES.split(body)[0] for body in sections.get("summary", [])]
+        # The header minus its first line (the name) often holds a short introduction
+        candidates.append(sections["header"][0].partition("\n")[2])
+        for summary in candidates:
+            summary = summary.strip()
+            if len(summary) > 50:
+                return summary[:300]
         return ""
-
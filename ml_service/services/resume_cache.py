@@ -0,0 +1,175 @@
+"""
+Resume Cache Service
+Content-addressed cache of parsed resumes, keyed by a hash of the PDF bytes
+"""
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from . import metrics
+from .resume import parser_version
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get("RESUME_CACHE_SIZE", "1024"))
+# SQLite tier bounds: row count, and age in days (0 disables either)
+DEFAULT_MAX_DISK_ENTRIES = int(os.environ.get("RESUME_CACHE_DISK_SIZE", "50000"))
+DEFAULT_MAX_AGE_DAYS = float(os.environ.get("RESUME_CACHE_MAX_AGE_DAYS", "30"))
+# The SQLite tier is pruned at open and after this many writes from this process
+PRUNE_EVERY = 100
+
+LOOKUPS = metrics.counter("ml_resume_cache_lookups_total", "Resume cache lookups, by result", ("result",))
+_MEMORY_HIT = LOOKUPS.labels("hit")
+_DISK_HIT = LOOKUPS.labels("disk_hit")
+_MISS = LOOKUPS.labels("miss")
+
+
+class ResumeCache:
+    """
+    Two-tier cache of ResumeParser results
+    
+    The first tier is an in-process LRU bounded by entry count. The optional
+    second tier is a SQLite file that every worker process can open, so a
+    resume parsed by one worker is a hit for the others. Keys combine the
+    parser version with the SHA-256 of the PDF, so changing the parser or
+    its skills dictionary invalidates older entries.
+    
+    The SQLite tier keeps at most max_disk_entries rows, none older than
+    max_age_days; the oldest rows are deleted first.
+    """
+    
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, db_path: Optional[str] = None,
+                 version: Optional[str] = None, max_disk_entries: int = DEFAULT_MAX_DISK_ENTRIES,
+                 max_age_days: float = DEFAULT_MAX_AGE_DAYS):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.max_age_days = max_age_days
+        self.version = version or parser_version()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self._writes_since_prune = 0
+        
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS resume_cache (
+                       key TEXT PRIMARY KEY,
+                       version TEXT NOT NULL,
+                       result TEXT NOT NULL,
+                       created_at REAL NOT NULL
+                   )"""
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS resume_cache_created ON resume_cache (created_at)")
+            # Entries written by other parser versions can never be hit again
+            self._db.execute("DELETE FROM resume_cache WHERE version != ?", (self.version,))
+            self._prune()
+            self._db.commit()
+    
+    def key(self, pdf_bytes: bytes, variant: Any = None) -> str:
+        """Cache key for a PDF (variant distinguishes e.g. different page limits)"""
+        return f"{self.version}:{variant}:{hashlib.sha256(pdf_bytes).hexdigest()}"
+    
+    def get(self, pdf_bytes: bytes, variant: Any = None) -> Optional[Dict[str, Any]]:
+        """Cached result for a PDF, or None"""
+        key = self.key(pdf_bytes, variant)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                _MEMORY_HIT.inc()
+                return copy.deepcopy(result)
+            
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT result FROM resume_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    result = json.loads(row[0])
+                    self._remember(key, result)
+                    self.disk_hits += 1
+                    _DISK_HIT.inc()
+                    return copy.deepcopy(result)
+            
+            self.misses += 1
+            _MISS.inc()
+            return None
+    
+    def put(self, pdf_bytes: bytes, result: Dict[str, Any], variant: Any = None) -> None:
+        """Store a parse result"""
+        key = self.key(pdf_bytes, variant)
+        result = copy.deepcopy(result)
+        with self._lock:
+            self._remember(key, result)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO resume_cache (key, version, result, created_at) VALUES (?, ?, ?, ?)",
+                    (key, self.version, json.dumps(result), time.time())
+                )
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= PRUNE_EVERY:
+                    self._prune()
+                self._db.commit()
+    
+    def _prune(self) -> None:
+        """Delete SQLite rows past max_age_days, then the oldest rows past max_disk_entries"""
+        self._writes_since_prune = 0
+        if self.max_age_days > 0:
+            cursor = self._db.execute("DELETE FROM resume_cache WHERE created_at < ?",
+                                      (time.time() - self.max_age_days * 86400,))
+            self.disk_evictions += cursor.rowcount
+        if self.max_disk_entries > 0:
+            cursor = self._db.execute(
+                "DELETE FROM resume_cache WHERE key IN ("
+                "SELECT key FROM resume_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,)
+            )
+            self.disk_evictions += cursor.rowcount
+    
+    def _remember(self, key: str, result: Dict[str, Any]) -> None:
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def clear(self) -> None:
+        """Drop every entry from both tiers (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM resume_cache")
+                self._db.commit()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters and current size, for sizing the cache"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "max_disk_entries": self.max_disk_entries,
+                "disk_evictions": self.disk_evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0
+            }
+    
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,208 @@
+"""
+Resume Parsing Pipeline
+Runs ResumeParser in a pool of worker processes so parsing never blocks the event loop
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Any, Optional, Iterable, Tuple, AsyncIterator
+
+from . import metrics, profiling
+from .resume import ResumeParser, cache_variant, get_nlp
+from .resume_cache import ResumeCache
+
+# Defaults, overridable per deployment through the environment
+DEFAULT_WORKERS = int(os.environ.get("RESUME_PARSER_WORKERS", "2"))
+DEFAULT_TIMEOUT = float(os.environ.get("RESUME_PARSE_TIMEOUT", "30"))
+DEFAULT_MAX_PAGES = int(os.environ.get("RESUME_MAX_PAGES", "10"))
+DEFAULT_MAX_CHARS = int(os.environ.get("RESUME_MAX_TEXT_CHARS", "100000"))
+DEFAULT_EARLY_EXIT = os.environ.get("RESUME_EARLY_EXIT", "1") == "1"
+
+STAGE_QUEUE_WAIT = metrics.Stage("resume_pipeline", "queue_wait")
+STAGE_WORKER = metrics.Stage("resume_pipeline", "worker_roundtrip")
+JOBS = metrics.counter("ml_resume_pipeline_jobs_total", "Resumes handled by the pipeline, by outcome", ("outcome",))
+IN_FLIGHT = metrics.gauge("ml_resume_pipeline_in_flight", "Resumes currently submitted to worker processes").labels()
+
+# Parser owned by each worker process (created once, so spaCy loads once per worker)
+_worker_parser: Optional[ResumeParser] = None
+
+
+class ResumeParseTimeout(TimeoutError):
+    """Raised when a single resume takes longer than the pipeline timeout"""
+
+
+class _Deadline(BaseException):
+    """Raised in a worker by SIGALRM; a BaseException so library code catching Exception cannot swallow it"""
+
+
+def _init_worker(max_chars: Optional[int], early_exit: bool) -> None:
+    global _worker_parser
+    _worker_parser = ResumeParser(max_chars=max_chars, early_exit=early_exit)
+    # Load spaCy up front so the worker's first job does not pay for it
+    get_nlp()
+
+
+def _raise_deadline(signum, frame):
+    raise _Deadline()
+
+
+def _parse_in_worker(pdf_bytes: bytes, max_pages: Optional[int], timeout: Optional[float],
+                     profile_spec: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Parse one resume inside a worker, interrupting it once timeout elapses
+    
+    Returns the result together with the stage spans recorded in the worker,
+    so the parent can account for them in its own metrics. With a profile
+    spec (the submitting request is being profiled), the parse is profiled
+    here, where the work actually happens.
+    """
+    use_alarm = bool(timeout) and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _raise_deadline)
+    try:
+        try:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, timeout)
+            with metrics.trace("resume_worker", enabled=True) as spans, profiling.capture_from_spec(profile_spec):
+                result = _worker_parser.parse(pdf_bytes, max_pages=max_pages)
+        finally:
+            # Disarmed where a late alarm is still caught below; the timer is one-shot
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    except _Deadline:
+        raise ResumeParseTimeout("Resume parsing timed out")
+    finally:
+        if use_alarm:
+            signal.signal(signal.SIGALRM, previous)
+    return result, spans.spans
+
+
+class ResumePipeline:
+    """
+    Parses resumes in a process pool with bounded concurrency
+    
+    At most max_pending jobs are handed to the pool at once; further callers
+    wait their turn instead of piling work into the executor queue. With a
+    cache, repeated uploads are answered in this process without a worker.
+    """
+    
+    def __init__(self, workers: int = DEFAULT_WORKERS, timeout: Optional[float] = DEFAULT_TIMEOUT,
+                 max_pages: Optional[int] = DEFAULT_MAX_PAGES, max_pending: Optional[int] = None,
+                 cache: Optional[ResumeCache] = None, max_chars: Optional[int] = DEFAULT_MAX_CHARS,
+                 early_exit: bool = DEFAULT_EARLY_EXIT):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.max_pages = max_pages
+        self.max_chars = max_chars
+        self.early_exit = early_exit
+        self.cache = cache
+        self._cache_variant = cache_variant(max_pages, max_chars, early_exit)
+        self._semaphore = asyncio.Semaphore(max_pending or self.workers * 2)
+        self._executor: Optional[ProcessPoolExecutor] = None
+    
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that runs an event loop and threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.max_chars, self.early_exit)
+            )
+        return self._executor
+    
+    async def parse(self, pdf_bytes: bytes) -> Dict[str, Any]:
+        """
+        Parse one resume in the pool
+        
+        Raises:
+            ResumeParseTimeout: If parsing exceeds the configured timeout
+            Exception: If the PDF cannot be parsed
+        """
+        # Hashing the PDF and reading SQLite stay off the event loop too
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, pdf_bytes, self._cache_variant)
+            if cached is not None:
+                JOBS.labels("cached").inc()
+                return cached
+        
+        with STAGE_QUEUE_WAIT():
+            await self._semaphore.acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            start = time.perf_counter()
+            IN_FLIGHT.inc()
+            future = loop.run_in_executor(
+                self._pool(), _parse_in_worker, pdf_bytes, self.max_pages, self.timeout,
+                profiling.current_spec()
+            )
+            # The worker enforces the timeout itself; the grace period only
+            # covers platforms without SIGALRM and a stuck pool
+            wait = self.timeout + 5 if self.timeout else None
+            try:
+                result, spans = await asyncio.wait_for(future, wait)
+            except (asyncio.TimeoutError, ResumeParseTimeout):
+                JOBS.labels("timeout").inc()
+                raise ResumeParseTimeout("Resume parsing timed out")
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory); start a fresh pool for later jobs
+                JOBS.labels("crashed").inc()
+                self._discard_pool()
+                raise Exception("Error parsing PDF: worker process crashed")
+            except Exception:
+                JOBS.labels("failed").inc()
+                raise
+            finally:
+                IN_FLIGHT.dec()
+            STAGE_WORKER.record(time.perf_counter() - start, start)
+            metrics.record_spans(spans, start)
+            JOBS.labels("parsed").inc()
+        finally:
+            self._semaphore.release()
+        
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, pdf_bytes, result, self._cache_variant)
+        return result
+    
+    async def parse_many(self, pdfs: Iterable[Tuple[Any, bytes]]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Parse many resumes, yielding each result as soon as it finishes
+        
+        Args:
+            pdfs: (id, pdf_bytes) pairs
+        
+        Yields:
+            {"id": ..., "result": {...}} or {"id": ..., "error": "..."}
+        """
+        async def run(resume_id, pdf_bytes):
+            try:
+                return {"id": resume_id, "result": await self.parse(pdf_bytes)}
+            except Exception as e:
+                return {"id": resume_id, "error": str(e)}
+        
+        tasks = [asyncio.ensure_future(run(resume_id, pdf_bytes)) for resume_id, pdf_bytes in pdfs]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def stream_ndjson(self, pdfs: Iterable[Tuple[Any, bytes]]) -> AsyncIterator[bytes]:
+        """parse_many as newline-delimited JSON, ready for a StreamingResponse"""
+        async for item in self.parse_many(pdfs):
+            yield (json.dumps(item) + "\n").encode("utf-8")
+    
+    def _discard_pool(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
+    def shutdown(self) -> None:
+        """Stop the worker processes"""
+        self._discard_pool()
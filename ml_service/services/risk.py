@@ -2,7 +2,32 @@
 At-Risk Student Prediction Service
 Predicts if a student is at-risk based on multiple factors
 """
-from typing import List, Dict, Any
+from itertools import chain
+from typing import List, Dict, Any, Optional, Sequence, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from . import metrics
+
+if TYPE_CHECKING:
+    from .feature_store import FeatureStore
+
+
+# Risk factor codes (in evaluation order) and the text reported for each
+RISK_FACTOR_MESSAGES = {
+    "attendance_very_low": "Very low attendance (below 60%)",
+    "attendance_low_warning": "Low attendance (60-65%)",
+    "attendance_low": "Low attendance",
+    "marks_very_low": "Very low academic performance",
+    "marks_below_average": "Below average academic performance",
+    "marks_declining": "Declining academic performance",
+    "marks_missing": "No assessment data available",
+    "skills_limited": "Limited technical skills",
+    "applications_none": "No placement applications",
+}
+RISK_FACTOR_CODES = list(RISK_FACTOR_MESSAGES)
+
+_BATCH_ITEMS = metrics.BATCH_ITEMS.labels("risk", "predict_columns")
 
 
 class RiskPredictor:
@@ -16,7 +41,10 @@ class RiskPredictor:
         self.MARKS_THRESHOLD_MEDIUM = 55  # Changed from 65
         self.SKILLS_THRESHOLD_LOW = 2  # Changed from 3 (less strict for students without resumes)
         self.APPLICATIONS_THRESHOLD_LOW = 1
+        # Recommendation lists keyed by _recommendation_keys (at most 64 distinct)
+        self._recommendation_cache: Dict[int, Tuple[str, ...]] = {}
     
+    @metrics.timed("risk", "predict")
     def predict(self, attendance: float, internal_marks: List[float], 
                 skills_count: int, applications_count: int, semester: int) -> Dict[str, Any]:
         """
@@ -41,24 +69,24 @@ class RiskPredictor:
         if attendance < self.ATTENDANCE_THRESHOLD_HIGH_RISK and attendance < 100:
             if attendance < self.ATTENDANCE_THRESHOLD_MEDIUM_RISK:
                 # Below 60% = high risk
-                risk_factors.append("Very low attendance (below 60%)")
+                risk_factors.append("attendance_very_low")
                 risk_score += 5.0  # High risk - enough to trigger high risk level
             else:
                 # 60-65% = medium risk
-                risk_factors.append("Low attendance (60-65%)")
+                risk_factors.append("attendance_low_warning")
                 risk_score += 3.0  # Medium risk - enough to trigger medium risk level
         elif attendance < self.ATTENDANCE_THRESHOLD_MEDIUM and attendance < 100:
-            risk_factors.append("Low attendance")
+            risk_factors.append("attendance_low")
             risk_score += 1.5  # Low-medium risk
         
         # Factor 2: Internal Marks
         if internal_marks:
             avg_marks = sum(internal_marks) / len(internal_marks)
             if avg_marks < self.MARKS_THRESHOLD_LOW:
-                risk_factors.append("Very low academic performance")
+                risk_factors.append("marks_very_low")
                 risk_score += 2.5  # Balanced value
             elif avg_marks < self.MARKS_THRESHOLD_MEDIUM:
-                risk_factors.append("Below average academic performance")
+                risk_factors.append("marks_below_average")
                 risk_score += 1.5  # Balanced value
             
             # Check for declining trend (only if significant drop)
@@ -66,7 +94,7 @@ class RiskPredictor:
                 recent_avg = sum(internal_marks[-2:]) / 2
                 earlier_avg = sum(internal_marks[:-2]) / len(internal_marks[:-2])
                 if recent_avg < earlier_avg - 12:  # Balanced: 12 point drop
-                    risk_factors.append("Declining academic performance")
+                    risk_factors.append("marks_declining")
                     risk_score += 1
         else:
             # No assessment data - don't penalize at all for early semesters
@@ -74,12 +102,12 @@ class RiskPredictor:
                 # Don't add any risk factors or score for early semesters
                 pass
             else:
-                risk_factors.append("No assessment data available")
+                risk_factors.append("marks_missing")
                 risk_score += 0.5
         
         # Factor 3: Skills (only penalize if student has uploaded resume but still has few skills)
         if skills_count > 0 and skills_count < self.SKILLS_THRESHOLD_LOW:
-            risk_factors.append("Limited technical skills")
+            risk_factors.append("skills_limited")
             risk_score += 1
         elif skills_count == 0:
             # No resume uploaded - don't penalize at all (not a risk factor)
@@ -87,7 +115,7 @@ class RiskPredictor:
         
         # Factor 4: Placement Applications (only penalize if student is in final year)
         if semester >= 3 and applications_count < self.APPLICATIONS_THRESHOLD_LOW:
-            risk_factors.append("No placement applications")
+            risk_factors.append("applications_none")
             risk_score += 0.5  # Only for final year students
         
         # Factor 5: Semester (higher semester with low performance is more concerning)
@@ -114,44 +142,209 @@ class RiskPredictor:
         return {
             "risk_level": risk_level,
             "risk_score": round(risk_score, 1),  # Round to 1 decimal place
-            "risk_factors": risk_factors,
+            "risk_factors": [RISK_FACTOR_MESSAGES[code] for code in risk_factors],
             "recommendations": recommendations
         }
     
+    def predict_batch(self, attendance: List[float], internal_marks: List[List[float]],
+                      skills_count: List[int], applications_count: List[int],
+                      semester: List[int]) -> Dict[str, Any]:
+        """
+        Predict risk for a whole cohort in one vectorized pass
+        
+        Args:
+            attendance: Attendance percentage per student (0-100)
+            internal_marks: Internal assessment marks per student (ragged lists)
+            skills_count: Number of skills per student
+            applications_count: Number of placement applications per student
+            semester: Current semester number per student
+            
+        Returns:
+            Columnar dictionary with risk_levels, risk_scores and risk_factors
+            (factor codes from RISK_FACTOR_MESSAGES) per student. Recommendations
+            are deduplicated: recommendation_sets holds each distinct list once and
+            recommendation_index points every student at its list.
+        """
+        n = len(attendance)
+        lengths = np.fromiter((len(m) for m in internal_marks), dtype=np.int64, count=n)
+        marks_values = np.fromiter(chain.from_iterable(internal_marks), dtype=np.float64,
+                                   count=int(lengths.sum()))
+        marks_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(lengths, out=marks_offsets[1:])
+        return self.predict_columns(attendance, marks_values, marks_offsets,
+                                    skills_count, applications_count, semester)
+    
+    def predict_stored(self, store: "FeatureStore", student_ids: Optional[Sequence[Any]] = None) -> Dict[str, Any]:
+        """
+        Predict risk for students held in a FeatureStore, by ID
+        
+        Args:
+            store: Feature store to read attendance, marks, skills and semester from
+            student_ids: Students to score (every student in the store when None)
+            
+        Returns:
+            predict_batch output plus student_ids, in the same order
+        """
+        columns = store.risk_columns(student_ids)
+        result = self.predict_columns(columns["attendance"], columns["marks_values"], columns["marks_offsets"],
+                                      columns["skills_count"], columns["applications_count"], columns["semester"])
+        return {"student_ids": columns["student_ids"], **result}
+    
+    @metrics.timed("risk", "predict_columns")
+    def predict_columns(self, attendance, marks_values, marks_offsets,
+                        skills_count, applications_count, semester) -> Dict[str, Any]:
+        """
+        Same as predict_batch, but with marks already flattened into a values
+        array plus an offsets array of length n + 1 (student i owns
+        marks_values[marks_offsets[i]:marks_offsets[i + 1]])
+        """
+        attendance = np.asarray(attendance, dtype=np.float64)
+        marks_values = np.asarray(marks_values, dtype=np.float64)
+        marks_offsets = np.asarray(marks_offsets, dtype=np.int64)
+        skills_count = np.asarray(skills_count, dtype=np.int64)
+        applications_count = np.asarray(applications_count, dtype=np.int64)
+        semester = np.asarray(semester, dtype=np.int64)
+        n = len(attendance)
+        _BATCH_ITEMS.observe(n)
+        
+        if n == 0:
+            return {
+                "risk_levels": [],
+                "risk_scores": [],
+                "risk_factors": [],
+                "recommendation_index": [],
+                "recommendation_sets": []
+            }
+        
+        # Per-student marks sums and averages (segmented over the flat array)
+        lengths = np.diff(marks_offsets)
+        owner = np.repeat(np.arange(n), lengths)
+        has_marks = lengths > 0
+        marks_sum = np.bincount(owner, weights=marks_values, minlength=n)
+        avg_marks = np.divide(marks_sum, lengths, out=np.zeros(n), where=has_marks)
+        
+        # Declining trend: last two marks vs. everything before them
+        has_trend = lengths >= 3
+        last = marks_offsets[1:][has_trend] - 1
+        recent_avg = np.zeros(n)
+        recent_avg[has_trend] = (marks_values[last - 1] + marks_values[last]) / 2
+        position = np.arange(len(marks_values)) - marks_offsets[:-1][owner]
+        earlier = position < (lengths[owner] - 2)
+        earlier_sum = np.bincount(owner[earlier], weights=marks_values[earlier], minlength=n)
+        earlier_avg = np.divide(earlier_sum, lengths - 2, out=np.zeros(n), where=has_trend)
+        
+        # Factor matrix, one column per code in RISK_FACTOR_CODES
+        below_100 = attendance < 100
+        marks_very_low = has_marks & (avg_marks < self.MARKS_THRESHOLD_LOW)
+        factors = np.column_stack([
+            below_100 & (attendance < self.ATTENDANCE_THRESHOLD_MEDIUM_RISK),
+            below_100 & (attendance >= self.ATTENDANCE_THRESHOLD_MEDIUM_RISK)
+                      & (attendance < self.ATTENDANCE_THRESHOLD_HIGH_RISK),
+            below_100 & (attendance >= self.ATTENDANCE_THRESHOLD_HIGH_RISK)
+                      & (attendance < self.ATTENDANCE_THRESHOLD_MEDIUM),
+            marks_very_low,
+            has_marks & ~marks_very_low & (avg_marks < self.MARKS_THRESHOLD_MEDIUM),
+            has_trend & (recent_avg < earlier_avg - 12),
+            ~has_marks & (semester > 2),
+            (skills_count > 0) & (skills_count < self.SKILLS_THRESHOLD_LOW),
+            (semester >= 3) & (applications_count < self.APPLICATIONS_THRESHOLD_LOW),
+        ])
+        weights = np.array([5.0, 3.0, 1.5, 2.5, 1.5, 1.0, 0.5, 1.0, 0.5])
+        risk_score = factors @ weights
+        risk_score += np.where((semester >= 3) & (risk_score >= 3), 0.5, 0.0)
+        
+        # np.round rounds half to even, like the builtin round() used in predict
+        risk_score_rounded = np.round(risk_score)
+        level_codes = (risk_score_rounded >= 3).astype(np.int64) + (risk_score_rounded >= 5)
+        level_names = np.array(["low", "medium", "high"])
+        
+        # Factor codes per student, decoded once per distinct factor combination
+        factor_bits = factors @ (1 << np.arange(factors.shape[1]))
+        decoded = {
+            int(bits): [code for j, code in enumerate(RISK_FACTOR_CODES) if bits >> j & 1]
+            for bits in np.unique(factor_bits)
+        }
+        
+        # Recommendations, built once per distinct key
+        keys = self._recommendation_keys(attendance, has_marks & (avg_marks < 60),
+                                         skills_count, applications_count, level_codes == 2)
+        unique_keys, recommendation_index = np.unique(keys, return_inverse=True)
+        
+        return {
+            "risk_levels": level_names[level_codes].tolist(),
+            "risk_scores": np.round(risk_score, 1).tolist(),
+            "risk_factors": [list(decoded[bits]) for bits in factor_bits.tolist()],
+            "recommendation_index": recommendation_index.tolist(),
+            "recommendation_sets": [list(self._recommendations_for_key(int(key)))
+                                    for key in unique_keys]
+        }
+    
+    def _recommendation_keys(self, attendance, low_marks, skills_count,
+                             applications_count, high_risk):
+        """
+        Pack every input that affects recommendation text into a small integer:
+        attendance band (0-3), low marks, few skills, few applications, high risk
+        """
+        band = np.select(
+            [attendance < self.ATTENDANCE_THRESHOLD_MEDIUM_RISK,
+             attendance < self.ATTENDANCE_THRESHOLD_HIGH_RISK,
+             attendance < 75],
+            [0, 1, 2], default=3
+        )
+        return (band * 16 + np.asarray(low_marks, dtype=np.int64) * 8
+                + (np.asarray(skills_count) < 5) * 4
+                + (np.asarray(applications_count) < 2) * 2
+                + np.asarray(high_risk, dtype=np.int64))
+    
     def _generate_recommendations(self, risk_level: str, risk_factors: List[str],
                                   attendance: float, internal_marks: List[float],
                                   skills_count: int, applications_count: int) -> List[str]:
         """Generate personalized recommendations based on risk factors"""
+        low_marks = bool(internal_marks) and sum(internal_marks) / len(internal_marks) < 60
+        key = self._recommendation_keys(
+            np.float64(attendance), low_marks, skills_count,
+            applications_count, risk_level == "high"
+        )
+        return list(self._recommendations_for_key(int(key)))
+    
+    def _recommendations_for_key(self, key: int) -> Tuple[str, ...]:
+        """Build (or fetch from cache) the recommendation list for a packed key"""
+        cached = self._recommendation_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        band, low_marks, few_skills = key // 16, key & 8, key & 4
+        few_applications, high_risk = key & 2, key & 1
         recommendations = []
         
-        if attendance < self.ATTENDANCE_THRESHOLD_MEDIUM_RISK:
+        if band == 0:
             recommendations.append("URGENT: Attendance is critically low (below 60%). Immediate action required")
             recommendations.append("Contact faculty or HOD immediately to discuss attendance issues")
             recommendations.append("Attend all remaining classes to improve attendance percentage")
-        elif attendance < self.ATTENDANCE_THRESHOLD_HIGH_RISK:
+        elif band == 1:
             recommendations.append("WARNING: Attendance is low (60-65%). Action needed")
             recommendations.append("Contact faculty or HOD to discuss attendance improvement")
             recommendations.append("Attend all remaining classes to improve attendance percentage")
-        elif attendance < 75:
+        elif band == 2:
             recommendations.append("Improve attendance by attending all classes regularly")
             recommendations.append("Contact faculty or HOD if facing attendance issues")
         
-        if internal_marks and sum(internal_marks) / len(internal_marks) < 60:
+        if low_marks:
             recommendations.append("Focus on improving academic performance")
             recommendations.append("Seek help from faculty or tutoring services")
             recommendations.append("Review and practice course materials regularly")
         
-        if skills_count < 5:
+        if few_skills:
             recommendations.append("Develop technical skills through online courses or projects")
             recommendations.append("Participate in coding competitions or hackathons")
             recommendations.append("Build portfolio projects to showcase skills")
         
-        if applications_count < 2:
+        if few_applications:
             recommendations.append("Start applying to placement opportunities")
             recommendations.append("Prepare resume and cover letters")
             recommendations.append("Attend placement preparation workshops")
         
-        if risk_level == "high":
+        if high_risk:
             recommendations.append("Schedule a meeting with academic advisor or HOD")
             recommendations.append("Consider additional support services or counseling")
         
@@ -159,5 +352,6 @@ class RiskPredictor:
             recommendations.append("Continue maintaining good academic performance")
             recommendations.append("Keep building skills and applying to opportunities")
         
-        return recommendations
-
+        cached = tuple(recommendations)
+        self._recommendation_cache[key] = cached
+        return cached
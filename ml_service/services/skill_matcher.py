@@ -0,0 +1,136 @@
+"""
+Skill Matcher Service
+Finds dictionary skills in free text in a single pass (Aho-Corasick) and canonicalizes skill names
+"""
+import hashlib
+import json
+import os
+import re
+from collections import deque
+from typing import Dict, List, Optional
+
+DEFAULT_SKILLS_PATH = os.environ.get(
+    "SKILLS_DICTIONARY_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "skills.json")
+)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize(term: str) -> str:
+    return _WHITESPACE.sub(" ", term.lower()).strip()
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class SkillMatcher:
+    """
+    Compiled skill dictionary
+
+    Every canonical skill and alias is compiled once into an Aho-Corasick
+    automaton, so scanning a resume costs one pass over its text regardless
+    of dictionary size. A match only counts when it is not glued to other
+    letters or digits ("java" does not match inside "javascript"); edges that
+    are punctuation, like the dot in ".net", need no boundary.
+    """
+
+    def __init__(self, skills: Dict[str, List[str]]):
+        """
+        Args:
+            skills: Mapping of canonical skill name to its aliases
+        """
+        self.canonical: List[str] = []
+        self._aliases: Dict[str, str] = {}
+        for name, aliases in skills.items():
+            canonical = _normalize(name)
+            self.canonical.append(canonical)
+            for term in [name, *aliases]:
+                self._aliases.setdefault(_normalize(term), canonical)
+        # Every term the matcher recognizes: canonical names and aliases, normalized
+        self.terms: List[str] = list(self._aliases)
+
+        digest = hashlib.sha256(json.dumps(skills, sort_keys=True).encode())
+        self.fingerprint = digest.hexdigest()[:12]
+        self._build()
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_SKILLS_PATH) -> "SkillMatcher":
+        """Load a JSON file of {"canonical skill": ["alias", ...]}"""
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _build(self) -> None:
+        # Trie over every term; out[node] lists the terms ending at node
+        goto: List[Dict[str, int]] = [{}]
+        out: List[List[int]] = [[]]
+        for index, term in enumerate(self.terms):
+            node = 0
+            for ch in term:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                node = nxt
+            out[node].append(index)
+
+        # Failure links, breadth first; outputs inherit those of their fallback
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in goto[node].items():
+                queue.append(nxt)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] = out[nxt] + out[fail[nxt]]
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def find_all(self, text: str) -> List[str]:
+        """
+        Canonical names of all dictionary skills mentioned in text
+
+        Returns:
+            Distinct canonical skills in order of first mention
+        """
+        text = _normalize(text)
+        goto, fail, out, terms = self._goto, self._fail, self._out, self.terms
+        found: Dict[str, None] = {}
+        node = 0
+        for end, ch in enumerate(text, 1):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for index in out[node]:
+                term = terms[index]
+                start = end - len(term)
+                if _is_word_char(term[0]) and start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if _is_word_char(term[-1]) and end < len(text) and _is_word_char(text[end]):
+                    continue
+                found.setdefault(self._aliases[term], None)
+        return list(found)
+
+    def canonicalize(self, skill: str) -> str:
+        """Canonical name for a skill or alias; unknown skills are just normalized"""
+        normalized = _normalize(skill)
+        return self._aliases.get(normalized, normalized)
+
+
+_default_matcher: Optional[SkillMatcher] = None
+
+
+def get_default_matcher() -> SkillMatcher:
+    """Shared matcher compiled from DEFAULT_SKILLS_PATH (built on first use)"""
+    global _default_matcher
+    if _default_matcher is None:
+        _default_matcher = SkillMatcher.from_file()
+    return _default_matcher
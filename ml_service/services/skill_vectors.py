@@ -0,0 +1,418 @@
+"""
+TF-IDF Skill Matching Engine
+Scores skills by character n-gram TF-IDF similarity instead of substring containment
+
+Each skill is embedded as a TF-IDF vector of its character 2-4-grams, so
+"ReactJS", "React.js" and "react js" land on the same vector while "c" no
+longer matches every skill that contains the letter. A required skill
+counts as covered when a student skill's cosine similarity to it reaches
+the threshold. Post vectors are compiled once per distinct set of posts,
+and a whole ranking is a few sparse matrix products.
+"""
+import os
+import re
+import threading
+import weakref
+from collections import Counter, OrderedDict
+from typing import Dict, List, Any, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from scipy import sparse
+
+from . import metrics
+from .skill_matcher import SkillMatcher, get_default_matcher
+from .wire import InternedLists
+
+DEFAULT_THRESHOLD = float(os.environ.get("SKILL_TFIDF_THRESHOLD", "0.5"))
+
+ENGINE_SUBSTRING = "substring"
+ENGINE_TFIDF = "tfidf"
+ENGINES = (ENGINE_SUBSTRING, ENGINE_TFIDF)
+
+# Separators that do not change what a skill is ("Node.js" / "node-js" / "NodeJS")
+_SEPARATORS = re.compile(r"[\s._\-/]+")
+
+# Bound on cached skill vectors (free-text skills are unbounded in principle)
+MAX_CACHED_SKILLS = 50000
+
+_STAGE_COMPILE = metrics.Stage("skill_vectors", "compile_posts")
+_STAGE_RANK = metrics.Stage("skill_vectors", "rank")
+
+SNAPSHOT_VERSION = 1
+
+
+def check_engine(engine: str) -> str:
+    """
+    Raises:
+        ValueError: If engine is not one of ENGINES
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown skill matching engine: {engine} (expected one of {', '.join(ENGINES)})")
+    return engine
+
+
+def _char_wb_ngrams(text: str, ngram_range: Tuple[int, int]) -> List[str]:
+    """Character n-grams inside word boundaries, words padded with a space (sklearn's "char_wb")"""
+    min_n, max_n = ngram_range
+    ngrams = []
+    for word in text.split():
+        word = " " + word + " "
+        length = len(word)
+        for n in range(min_n, max_n + 1):
+            offset = 0
+            ngrams.append(word[offset:offset + n])
+            while offset + n < length:
+                offset += 1
+                ngrams.append(word[offset:offset + n])
+            if offset == 0:  # a word shorter than n is counted once
+                break
+    return ngrams
+
+
+class CompiledPosts:
+    """Required-skill vectors and post incidence for one list of posts"""
+    
+    def __init__(self, skills: List[str], vectors: sparse.csr_matrix, incidence: sparse.csr_matrix):
+        # Distinct required skills (display form), their vectors (K x V), and
+        # posts x K counts of how often each post requires each skill
+        self.skills = skills
+        self.vectors = vectors
+        self.incidence = incidence
+        self.totals = np.asarray(incidence.sum(axis=1)).ravel()
+
+
+class TfidfSkillEngine:
+    """
+    Character n-gram TF-IDF similarity between skills
+    
+    The vectorizer is fitted on the skills dictionary (canonical names and
+    aliases); skills outside it still embed through the n-grams they share.
+    With a matcher, aliases are canonicalized first ("k8s" -> "kubernetes").
+    
+    Only fitting needs scikit-learn; skills are embedded from the fitted
+    n-gram columns and IDF weights, which snapshot() saves so a worker can
+    restore the engine (and its cached skill vectors) without refitting.
+    """
+    
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, matcher: Optional[SkillMatcher] = None,
+                 vocabulary: Optional[Sequence[str]] = None, ngram_range: Tuple[int, int] = (2, 4),
+                 cache_size: int = 16):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        
+        self.matcher = matcher
+        if vocabulary is None:
+            base = matcher or get_default_matcher()
+            vocabulary = base.canonical + base.terms
+        vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=ngram_range,
+                                     lowercase=False, sublinear_tf=True, dtype=np.float32)
+        vectorizer.fit([self.key(s) for s in vocabulary])
+        self._setup(threshold, ngram_range, cache_size, vectorizer.get_feature_names_out().tolist(),
+                    vectorizer.idf_)
+    
+    def _setup(self, threshold: float, ngram_range: Sequence[int], cache_size: int,
+               ngrams: List[str], idf: np.ndarray) -> None:
+        self.threshold = threshold
+        self.ngram_range = (int(ngram_range[0]), int(ngram_range[1]))
+        self._columns: Dict[str, int] = {ngram: i for i, ngram in enumerate(ngrams)}
+        self._idf = np.asarray(idf, dtype=np.float32)
+        self._width = len(self._columns)
+        # Embedded form -> (column indices, weights); skill names repeat endlessly across requests
+        self._rows: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._cache_size = cache_size
+        self._compiled: "OrderedDict[Tuple, CompiledPosts]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Fitted state and cached skill vectors, as arrays (see services.snapshot)"""
+        with self._lock:
+            keys = list(self._rows)
+            rows = [self._rows[k] for k in keys]
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(indices) for indices, _ in rows], out=offsets[1:])
+        return {
+            "version": SNAPSHOT_VERSION,
+            "matcher": self.matcher.fingerprint if self.matcher is not None else None,
+            "threshold": self.threshold,
+            "ngram_range": list(self.ngram_range),
+            "cache_size": self._cache_size,
+            "ngrams": sorted(self._columns, key=self._columns.__getitem__),
+            "idf": self._idf,
+            "rows": {
+                "keys": keys,
+                "offsets": offsets,
+                "indices": np.concatenate([i for i, _ in rows]) if rows else np.zeros(0, dtype=np.int32),
+                "data": np.concatenate([d for _, d in rows]) if rows else np.zeros(0, dtype=np.float32)
+            }
+        }
+    
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict[str, Any], matcher: Optional[SkillMatcher] = None) -> "TfidfSkillEngine":
+        """
+        Engine restored from snapshot() output, without scikit-learn
+        
+        Raises:
+            ValueError: If the snapshot is from another format version or another skills dictionary
+        """
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"TF-IDF snapshot version {snapshot.get('version')} (expected {SNAPSHOT_VERSION})")
+        if snapshot.get("matcher") != (matcher.fingerprint if matcher is not None else None):
+            raise ValueError("TF-IDF snapshot was taken with a different skills dictionary")
+        engine = cls.__new__(cls)
+        engine.matcher = matcher
+        engine._setup(snapshot["threshold"], snapshot["ngram_range"], snapshot["cache_size"],
+                      snapshot["ngrams"], snapshot["idf"])
+        rows = snapshot["rows"]
+        offsets = rows["offsets"].tolist()
+        indices, data = rows["indices"], rows["data"]
+        for i, key in enumerate(rows["keys"]):
+            engine._rows[key] = (indices[offsets[i]:offsets[i + 1]], data[offsets[i]:offsets[i + 1]])
+        return engine
+    
+    @property
+    def matcher(self) -> Optional[SkillMatcher]:
+        """
+        Matcher skills are canonicalized with; held weakly so the shared
+        engine of a matcher does not keep it alive
+        
+        Raises:
+            ReferenceError: If the matcher no longer exists
+        """
+        if self._matcher_ref is None:
+            return None
+        matcher = self._matcher_ref()
+        if matcher is None:
+            raise ReferenceError("The TF-IDF engine's skill matcher no longer exists")
+        return matcher
+    
+    @matcher.setter
+    def matcher(self, matcher: Optional[SkillMatcher]) -> None:
+        self._matcher_ref = weakref.ref(matcher) if matcher is not None else None
+    
+    def display(self, skill: str) -> str:
+        """Skill as reported back (normalized like the substring rule reports it)"""
+        matcher = self.matcher
+        if matcher is not None:
+            return matcher.canonicalize(skill)
+        return skill.lower().strip()
+    
+    def key(self, skill: str) -> str:
+        """Form a skill is embedded in"""
+        return _SEPARATORS.sub("", self.display(skill))
+    
+    def vectorize(self, skills: Sequence[str]) -> sparse.csr_matrix:
+        """L2-normalized TF-IDF rows, one per skill"""
+        keys = [self.key(s) for s in skills]
+        with self._lock:
+            unseen = [k for k in dict.fromkeys(keys) if k not in self._rows]
+            if unseen:
+                fresh = self._embed(unseen)
+                if len(self._rows) + len(unseen) > MAX_CACHED_SKILLS:
+                    self._rows.clear()
+                for i, k in enumerate(unseen):
+                    start, end = fresh.indptr[i], fresh.indptr[i + 1]
+                    self._rows[k] = (fresh.indices[start:end], fresh.data[start:end])
+            rows = [self._rows[k] for k in keys]
+        
+        indptr = np.zeros(len(rows) + 1, dtype=np.int32)
+        np.cumsum([len(indices) for indices, _ in rows], out=indptr[1:])
+        if not rows:
+            return sparse.csr_matrix((0, self._width), dtype=np.float32)
+        return sparse.csr_matrix(
+            (np.concatenate([data for _, data in rows]), np.concatenate([indices for indices, _ in rows]), indptr),
+            shape=(len(rows), self._width)
+        )
+    
+    def _embed(self, keys: List[str]) -> sparse.csr_matrix:
+        """
+        TF-IDF rows for embedded forms, computed as the fitted TfidfVectorizer
+        would (sublinear tf, IDF weights, L2 norm accumulated in double precision)
+        """
+        columns = self._columns
+        indptr = np.zeros(len(keys) + 1, dtype=np.int64)
+        indices: List[int] = []
+        counts: List[int] = []
+        for i, key in enumerate(keys):
+            row = Counter(columns[g] for g in _char_wb_ngrams(key, self.ngram_range) if g in columns)
+            present = sorted(row)
+            indices.extend(present)
+            counts.extend(row[column] for column in present)
+            indptr[i + 1] = len(indices)
+        
+        indices = np.asarray(indices, dtype=np.int32)
+        data = np.asarray(counts, dtype=np.float32)
+        np.log(data, out=data)
+        data += 1
+        data *= self._idf[indices]
+        lengths = np.diff(indptr)
+        squares = np.bincount(np.repeat(np.arange(len(keys)), lengths), weights=data * data, minlength=len(keys))
+        norms = np.sqrt(squares)
+        norms[norms == 0] = 1
+        data = (data / np.repeat(norms, lengths)).astype(np.float32)
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(keys), self._width))
+    
+    def similarity(self, left: Sequence[str], right: Sequence[str]) -> np.ndarray:
+        """Cosine similarity of every skill in left to every skill in right"""
+        return (self.vectorize(left) @ self.vectorize(right).T).toarray()
+    
+    def covers(self, student_vectors: sparse.csr_matrix, required_vectors: sparse.csr_matrix) -> sparse.csr_matrix:
+        """Boolean student-skill x required-skill matrix of pairs at or above the threshold"""
+        similar = (student_vectors @ required_vectors.T).tocsr()
+        similar.data = (similar.data >= self.threshold - 1e-6).astype(np.float32)
+        similar.eliminate_zeros()
+        return similar
+    
+    def compile_posts(self, posts_required_skills: Sequence[Sequence[str]]) -> CompiledPosts:
+        """Vectors for a list of posts; recent lists are cached, so repeated calls are free"""
+        cache_key = tuple(tuple(skills) for skills in posts_required_skills)
+        with self._lock:
+            compiled = self._compiled.get(cache_key)
+            if compiled is not None:
+                self._compiled.move_to_end(cache_key)
+                return compiled
+        
+        with _STAGE_COMPILE():
+            vocab: Dict[str, int] = {}
+            skills: List[str] = []
+            rows, cols = [], []
+            for j, required in enumerate(posts_required_skills):
+                for skill in required:
+                    name = self.display(skill)
+                    index = vocab.get(name)
+                    if index is None:
+                        index = vocab[name] = len(skills)
+                        skills.append(name)
+                    rows.append(j)
+                    cols.append(index)
+            incidence = sparse.csr_matrix(
+                (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                shape=(len(posts_required_skills), len(skills))
+            )
+            compiled = CompiledPosts(skills, self.vectorize(skills), incidence)
+        
+        with self._lock:
+            self._compiled[cache_key] = compiled
+            while len(self._compiled) > self._cache_size:
+                self._compiled.popitem(last=False)
+        return compiled
+    
+    def matched_counts(self, students_skills: Union[Sequence[Sequence[str]], InternedLists],
+                       compiled: CompiledPosts) -> np.ndarray:
+        """Students x posts matrix of how many required skills each student covers"""
+        with _STAGE_RANK():
+            if isinstance(students_skills, InternedLists):
+                vocab, has_skills = students_skills.incidence(self.display, np.float32)
+            else:
+                vocab: Dict[str, int] = {}
+                rows, cols = [], []
+                for i, skills in enumerate(students_skills):
+                    for skill in skills:
+                        rows.append(i)
+                        cols.append(vocab.setdefault(self.display(skill), len(vocab)))
+                has_skills = sparse.csr_matrix(
+                    (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(len(students_skills), len(vocab))
+                )
+            covered = (has_skills @ self.covers(self.vectorize(list(vocab)), compiled.vectors)).tocsr()
+            covered.data[:] = 1
+            return np.asarray((covered @ compiled.incidence.T).todense())
+    
+    def rank_posts(self, skills: List[str], posts: List[Dict[str, Any]],
+                   top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Score posts for one student
+        
+        Returns:
+            Recommendations in the shape of PlacementRecommender.recommend,
+            sorted by score (highest first, ties in post order)
+        """
+        compiled = self.compile_posts([post.get("required_skills", []) for post in posts])
+        matched = self.matched_counts([skills], compiled)[0] if posts else np.zeros(0)
+        totals = compiled.totals
+        scores = np.where(totals > 0, matched / np.maximum(totals, 1), 0.1).round(3)
+        order = np.argsort(-scores, kind="stable")
+        if top_k is not None:
+            order = order[:top_k]
+        return [
+            {
+                "post_id": posts[j].get("id", ""),
+                "score": float(scores[j]),
+                "company": posts[j].get("company", ""),
+                "title": posts[j].get("title", ""),
+                "matched_skills_count": int(matched[j]),
+                "total_required_skills": int(totals[j])
+            }
+            for j in order.tolist()
+        ]
+    
+    def rank_students(self, required_skills: List[str], students_skills: List[List[str]],
+                      top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Score every student against one post
+        
+        Returns:
+            [{"student_index", "match_percentage", "matched_skills_count"}]
+            sorted by match (highest first, ties in student order)
+        """
+        compiled = self.compile_posts([required_skills])
+        matched = self.matched_counts(students_skills, compiled)[:, 0] if students_skills else np.zeros(0)
+        total = compiled.totals[0] if len(compiled.totals) else 0
+        percentages = (matched / total * 100 if total else np.full(len(matched), 100.0)).round(2)
+        order = np.argsort(-percentages, kind="stable")
+        if top_k is not None:
+            order = order[:top_k]
+        return [
+            {"student_index": i, "match_percentage": float(percentages[i]), "matched_skills_count": int(matched[i])}
+            for i in order.tolist()
+        ]
+    
+    def analyze(self, student_skills: List[str], required_skills: List[str]) -> Dict[str, Any]:
+        """Skill gap in the shape of SkillGapAnalyzer.analyze, by similarity"""
+        student = [self.display(s) for s in student_skills]
+        required = [self.display(s) for s in required_skills]
+        covers = self.covers(self.vectorize(student), self.vectorize(required)).toarray() > 0
+        missing = [r.title() for r, hit in zip(required, covers.any(axis=0)) if not hit] if required else []
+        strengths = [s.title() for s, hit in zip(student, covers.any(axis=1)) if not hit]
+        if not required:
+            match_percentage = 100.0
+        else:
+            match_percentage = (len(required) - len(missing)) / len(required) * 100
+        return {
+            "missing": missing,
+            "strengths": strengths,
+            "match_percentage": round(match_percentage, 2)
+        }
+
+
+# Shared engines by matcher, dropped with their matcher (engines hold it
+# weakly); the engine for matcher=None lives in its own slot
+_default_engines: "weakref.WeakKeyDictionary[SkillMatcher, TfidfSkillEngine]" = weakref.WeakKeyDictionary()
+_default_engine: Optional[TfidfSkillEngine] = None
+_default_lock = threading.Lock()
+
+
+def get_default_engine(matcher: Optional[SkillMatcher] = None) -> TfidfSkillEngine:
+    """Shared engine per matcher (built on first use, so sklearn loads only when needed)"""
+    global _default_engine
+    with _default_lock:
+        engine = _default_engine if matcher is None else _default_engines.get(matcher)
+        if engine is None:
+            engine = TfidfSkillEngine(matcher=matcher)
+            if matcher is None:
+                _default_engine = engine
+            else:
+                _default_engines[matcher] = engine
+        return engine
+
+
+def has_default_engine(matcher: Optional[SkillMatcher] = None) -> bool:
+    """Whether the shared engine for a matcher has been built (or restored) yet"""
+    return (_default_engine if matcher is None else _default_engines.get(matcher)) is not None
+
+
+def set_default_engine(engine: TfidfSkillEngine) -> None:
+    """Make an engine (e.g. one restored from a snapshot) the shared one for its matcher"""
+    global _default_engine
+    with _default_lock:
+        if engine.matcher is None:
+            _default_engine = engine
+        else:
+            _default_engines[engine.matcher] = engine
@@ -2,27 +2,53 @@
 Skill Gap Analysis Service
 Analyzes the gap between student skills and required skills
 """
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Union
+
+import numpy as np
+from scipy import sparse
+
+from . import metrics
+from .skill_matcher import SkillMatcher
+from .skill_vectors import (
+    ENGINE_SUBSTRING, ENGINE_TFIDF, TfidfSkillEngine, check_engine, get_default_engine, set_default_engine
+)
+from .wire import InternedLists
+
+_MANY_ITEMS = metrics.BATCH_ITEMS.labels("skills", "analyze_many")
+_MATRIX_ITEMS = metrics.BATCH_ITEMS.labels("skills", "analyze_matrix")
 
 
 class SkillGapAnalyzer:
-    def __init__(self):
-        pass
+    def __init__(self, matcher: Optional[SkillMatcher] = None):
+        # With a matcher, aliases compare as their canonical skill ("k8s" -> "kubernetes")
+        self.matcher = matcher
     
-    def analyze(self, student_skills: List[str], required_skills: List[str]) -> Dict[str, Any]:
+    def _normalize(self, skill: str) -> str:
+        if self.matcher is not None:
+            return self.matcher.canonicalize(skill)
+        return skill.lower().strip()
+    
+    @metrics.timed("skills", "analyze")
+    def analyze(self, student_skills: List[str], required_skills: List[str],
+                engine: str = ENGINE_SUBSTRING) -> Dict[str, Any]:
         """
         Analyze skill gap between student skills and required skills
         
         Args:
             student_skills: List of student's skills
             required_skills: List of required skills for a position
+            engine: "substring" (partial string match) or "tfidf" (character
+                    n-gram similarity, see skill_vectors)
             
         Returns:
             Dictionary with missing skills, strengths, and match percentage
         """
+        if check_engine(engine) == ENGINE_TFIDF:
+            return get_default_engine(self.matcher).analyze(student_skills, required_skills)
+        
         # Normalize skills (lowercase, strip)
-        student_skills_normalized = [s.lower().strip() for s in student_skills]
-        required_skills_normalized = [s.lower().strip() for s in required_skills]
+        student_skills_normalized = [self._normalize(s) for s in student_skills]
+        required_skills_normalized = [self._normalize(s) for s in required_skills]
         
         # Find missing skills
         missing = []
@@ -59,4 +85,184 @@ class SkillGapAnalyzer:
             "strengths": strengths,
             "match_percentage": round(match_percentage, 2)
         }
-
+    
+    @metrics.timed("skills", "analyze_many")
+    def analyze_many(self, pairs: List[Tuple[List[str], List[str]]]) -> List[Dict[str, Any]]:
+        """
+        Analyze many (student_skills, required_skills) pairs in one call
+        
+        Each distinct skill list is normalized once and each distinct pair of
+        skills is compared once across the whole batch.
+        
+        Returns:
+            One result per pair, identical to analyze()
+        """
+        _MANY_ITEMS.observe(len(pairs))
+        normalized: Dict[Tuple[str, ...], List[str]] = {}
+        related: Dict[Tuple[str, str], bool] = {}
+        
+        def normalize_list(skills: List[str]) -> List[str]:
+            key = tuple(skills)
+            result = normalized.get(key)
+            if result is None:
+                result = normalized[key] = [self._normalize(s) for s in skills]
+            return result
+        
+        def is_related(req_skill: str, student_skill: str) -> bool:
+            key = (req_skill, student_skill)
+            result = related.get(key)
+            if result is None:
+                result = related[key] = req_skill in student_skill or student_skill in req_skill
+            return result
+        
+        results = []
+        for student_skills, required_skills in pairs:
+            student_normalized = normalize_list(student_skills)
+            required_normalized = normalize_list(required_skills)
+            missing = [r.title() for r in required_normalized
+                       if not any(is_related(r, s) for s in student_normalized)]
+            strengths = [s.title() for s in student_normalized
+                         if not any(is_related(r, s) for r in required_normalized)]
+            if not required_normalized:
+                match_percentage = 100.0
+            else:
+                matched_count = len(required_normalized) - len(missing)
+                match_percentage = (matched_count / len(required_normalized)) * 100
+            results.append({
+                "missing": missing,
+                "strengths": strengths,
+                "match_percentage": round(match_percentage, 2)
+            })
+        return results
+    
+    @metrics.timed("skills", "analyze_matrix")
+    def analyze_matrix(self, students_skills: Union[List[List[str]], InternedLists],
+                       posts_required_skills: List[List[str]], top_missing: int = 5,
+                       engine: str = ENGINE_SUBSTRING, as_arrays: bool = False) -> Dict[str, Any]:
+        """
+        Analyze every student against every post at once
+        
+        Builds sparse student x skill and skill x post incidence matrices once,
+        plus a containment matrix between the two skill vocabularies, so the
+        whole match-percentage matrix comes out of two sparse products.
+        
+        Args:
+            students_skills: Skills of each student (lists, or InternedLists
+                             decoded from a binary request)
+            posts_required_skills: Required skills of each post
+            top_missing: Number of most-missing skills to report per post
+            engine: "substring" or "tfidf" (how a student skill covers a
+                    required skill)
+            as_arrays: Return match_percentages as a NumPy array instead of
+                       nested lists (for binary responses)
+            
+        Returns:
+            Dictionary with match_percentages (students x posts, same values as
+            analyze() gives for each pair) and per-post aggregates over the
+            students that have at least one skill
+        """
+        n_students, n_posts = len(students_skills), len(posts_required_skills)
+        _MATRIX_ITEMS.observe(n_students * n_posts)
+        
+        # Student x student-skill incidence
+        if isinstance(students_skills, InternedLists):
+            student_vocab, has_skills = students_skills.incidence(self._normalize)
+        else:
+            student_vocab: Dict[str, int] = {}
+            rows, cols = [], []
+            for i, skills in enumerate(students_skills):
+                for skill in skills:
+                    rows.append(i)
+                    cols.append(student_vocab.setdefault(self._normalize(skill), len(student_vocab)))
+            has_skills = sparse.csr_matrix(
+                (np.ones(len(rows)), (rows, cols)), shape=(n_students, len(student_vocab))
+            )
+        
+        # Required-skill x post counts (a skill listed twice counts twice)
+        required_vocab: Dict[str, int] = {}
+        rows, cols = [], []
+        for j, skills in enumerate(posts_required_skills):
+            for skill in skills:
+                rows.append(required_vocab.setdefault(self._normalize(skill), len(required_vocab)))
+                cols.append(j)
+        requires = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)), shape=(len(required_vocab), n_posts)
+        )
+        
+        # Student-skill x required-skill containment (partial matches, as in analyze)
+        if check_engine(engine) == ENGINE_TFIDF:
+            tfidf = get_default_engine(self.matcher)
+            contains = tfidf.covers(tfidf.vectorize(list(student_vocab)), tfidf.vectorize(list(required_vocab)))
+        else:
+            rows, cols = [], []
+            student_items = list(student_vocab.items())
+            for req_skill, r in required_vocab.items():
+                for student_skill, s in student_items:
+                    if req_skill in student_skill or student_skill in req_skill:
+                        rows.append(s)
+                        cols.append(r)
+            contains = sparse.csr_matrix(
+                (np.ones(len(rows)), (rows, cols)), shape=(len(student_vocab), len(required_vocab))
+            )
+        
+        # Which required skills each student covers, then matched counts per post
+        covered = (has_skills @ contains).tocsr()
+        covered.data[:] = 1
+        matched = np.asarray((covered @ requires).todense())
+        totals = np.asarray(requires.sum(axis=0)).ravel()
+        
+        match_percentages = np.full((n_students, n_posts), 100.0)
+        with_required = totals > 0
+        match_percentages[:, with_required] = (matched[:, with_required] / totals[with_required]) * 100
+        match_percentages = np.round(match_percentages, 2)
+        
+        # Aggregates over students that have any skills
+        if isinstance(students_skills, InternedLists):
+            analyzed = students_skills.lengths() > 0
+        else:
+            analyzed = np.fromiter((len(skills) > 0 for skills in students_skills), dtype=bool, count=n_students)
+        n_analyzed = int(analyzed.sum())
+        missing_counts = n_analyzed - np.asarray(covered[analyzed].sum(axis=0)).ravel()
+        required_names = list(required_vocab)
+        requires_csc = requires.tocsc()
+        
+        posts = []
+        for j in range(n_posts):
+            skill_ids = requires_csc.indices[requires_csc.indptr[j]:requires_csc.indptr[j + 1]]
+            ranked = sorted(skill_ids.tolist(), key=lambda r: -missing_counts[r])[:top_missing]
+            posts.append({
+                "average_match_percentage": round(float(match_percentages[analyzed, j].mean()), 2)
+                if n_analyzed else 0.0,
+                "students_analyzed": n_analyzed,
+                "most_missing": [
+                    {"skill": required_names[r].title(), "missing_count": int(missing_counts[r])}
+                    for r in ranked if missing_counts[r] > 0
+                ]
+            })
+        
+        return {
+            "match_percentages": match_percentages if as_arrays else match_percentages.tolist(),
+            "posts": posts
+        }
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Fitted TF-IDF engine for this analyzer's matcher, with its cached skill
+        vectors (the engine is built first if no request has needed it yet)
+        """
+        return {
+            "matcher": self.matcher.fingerprint if self.matcher is not None else None,
+            "tfidf": get_default_engine(self.matcher).snapshot()
+        }
+    
+    def restore(self, snapshot: Dict[str, Any]) -> None:
+        """
+        Install the TF-IDF engine from snapshot() as the shared engine for this
+        analyzer's matcher, so tfidf requests skip fitting (and importing sklearn)
+        
+        Raises:
+            ValueError: If the snapshot was taken with another skills dictionary or format version
+        """
+        if snapshot.get("matcher") != (self.matcher.fingerprint if self.matcher is not None else None):
+            raise ValueError("Skill gap snapshot was taken with a different skills dictionary")
+        set_default_engine(TfidfSkillEngine.from_snapshot(snapshot["tfidf"], self.matcher))
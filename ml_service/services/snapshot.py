@@ -0,0 +1,217 @@
+"""
+Snapshot Service
+Fast worker start: precomputed service state saved to one versioned file and restored at startup
+
+A snapshot holds what the services would otherwise compute on their first
+requests: the fitted TF-IDF engine and its cached skill vectors
+(SkillGapAnalyzer), the persistent post index with its containment table
+(PlacementRecommender), and the parser version plus spaCy load state
+(ResumeParser). Restoring the TF-IDF engine does not import scikit-learn,
+which alone takes about a second.
+
+File layout:
+    
+    MAGIC                     b"INSIGHTLY-SNAPSHOT\\n"
+    MessagePack document      (services.wire codec; arrays as binary blobs)
+        {"format": FORMAT_VERSION, "created_at": ..., "components": {name: state}}
+
+Each component checks its own state (format version, skills dictionary,
+parser version) on restore. A missing, unreadable or stale component is
+built the normal way instead, and warm_start() reports why, together with
+the time every startup phase took.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Any, Iterator, Optional
+
+from . import metrics
+from .wire import WireFormatError, packb, unpackb
+
+SNAPSHOT_PATH = os.environ.get("ML_SNAPSHOT_PATH", "")
+FORMAT_VERSION = 1
+MAGIC = b"INSIGHTLY-SNAPSHOT\n"
+
+_stages: Dict[str, metrics.Stage] = {}
+_last_report: Optional[Dict[str, Any]] = None
+
+
+class SnapshotError(ValueError):
+    """Snapshot file that is not a readable snapshot of this format version"""
+
+
+def _components(parser=None, recommender=None, analyzer=None) -> List[tuple]:
+    return [(name, service) for name, service in
+            (("resume", parser), ("recommend", recommender), ("skills", analyzer)) if service is not None]
+
+
+def save_snapshot(path: str, parser=None, recommender=None, analyzer=None) -> Dict[str, Any]:
+    """
+    Write the state of the given services to path (atomically, via a temporary file)
+    
+    Args:
+        path: Snapshot file
+        parser: ResumeParser
+        recommender: PlacementRecommender (its persistent index is saved)
+        analyzer: SkillGapAnalyzer (its TF-IDF engine is fitted first if needed)
+    
+    Returns:
+        Path, size in bytes and saved component names
+    """
+    components = {name: service.snapshot() for name, service in _components(parser, recommender, analyzer)}
+    body = packb({"format": FORMAT_VERSION, "created_at": time.time(), "components": components})
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(body)
+    os.replace(tmp_path, path)
+    return {"path": path, "bytes": len(MAGIC) + len(body), "components": list(components)}
+
+
+def load_snapshot(path: str) -> Dict[str, Any]:
+    """
+    Read a snapshot file
+    
+    Raises:
+        OSError: If the file cannot be read
+        SnapshotError: If it is not a snapshot, or one of another format version
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise SnapshotError(f"{path} is not a service snapshot")
+    try:
+        document = unpackb(memoryview(data)[len(MAGIC):])
+    except WireFormatError as exc:
+        raise SnapshotError(f"Corrupt snapshot {path}: {exc}") from exc
+    if not isinstance(document, dict) or document.get("format") != FORMAT_VERSION:
+        found = document.get("format") if isinstance(document, dict) else None
+        raise SnapshotError(f"Snapshot format {found} (expected {FORMAT_VERSION})")
+    return document
+
+
+class StartupReport:
+    """Timings of startup phases, and which components were restored or rebuilt"""
+    
+    def __init__(self, path: Optional[str]):
+        self.path = path or None
+        self.phases: List[Dict[str, Any]] = []
+        self.restored: List[str] = []
+        self.rebuilt: Dict[str, str] = {}
+        self._start = time.perf_counter()
+    
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time one phase; also recorded as the metrics stage startup/<name>"""
+        stage = _stages.get(name)
+        if stage is None:
+            stage = _stages[name] = metrics.Stage("startup", name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stage.record(elapsed, start)
+            self.phases.append({"phase": name, "seconds": round(elapsed, 4)})
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "snapshot": self.path,
+            "restored": list(self.restored),
+            "rebuilt": dict(self.rebuilt),
+            "phases": list(self.phases),
+            "total_seconds": round(time.perf_counter() - self._start, 4)
+        }
+
+
+def _build(name: str, service) -> None:
+    """What the first request would otherwise do for a component without usable state"""
+    if name == "resume":
+        service.nlp
+    elif name == "skills":
+        from .skill_vectors import get_default_engine
+        get_default_engine(service.matcher)
+    # The recommender's index is filled by register_posts from the caller's store
+
+
+def warm_start(path: Optional[str] = None, parser=None, recommender=None, analyzer=None) -> Dict[str, Any]:
+    """
+    Restore services from a snapshot, building any component it cannot supply
+    
+    Args:
+        path: Snapshot file (ML_SNAPSHOT_PATH when None; no snapshot when empty)
+        parser: ResumeParser
+        recommender: PlacementRecommender
+        analyzer: SkillGapAnalyzer
+    
+    Returns:
+        Startup report: snapshot path, restored and rebuilt components (with
+        the reason), and seconds per phase
+    """
+    global _last_report
+    path = SNAPSHOT_PATH if path is None else path
+    report = StartupReport(path)
+    
+    states: Dict[str, Any] = {}
+    missing = "no snapshot configured"
+    if path:
+        with report.phase("read_snapshot"):
+            try:
+                states = load_snapshot(path)["components"]
+                missing = "not in snapshot"
+            except (OSError, SnapshotError) as exc:
+                missing = str(exc)
+    
+    for name, service in _components(parser, recommender, analyzer):
+        reason = missing
+        if name in states:
+            try:
+                with report.phase(f"restore_{name}"):
+                    service.restore(states[name])
+                report.restored.append(name)
+                continue
+            except (KeyError, TypeError, ValueError) as exc:
+                reason = f"stale snapshot: {exc}"
+        with report.phase(f"build_{name}"):
+            _build(name, service)
+        report.rebuilt[name] = reason
+    
+    _last_report = report.as_dict()
+    return _last_report
+
+
+def startup_report() -> Optional[Dict[str, Any]]:
+    """Report of the last warm_start in this process (None before it ran)"""
+    return _last_report
+
+
+if __name__ == "__main__":
+    from .recommend import PlacementRecommender
+    from .resume import ResumeParser
+    from .skill_matcher import get_default_matcher
+    from .skills import SkillGapAnalyzer
+    
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    arg_parser.add_argument("command", choices=("save", "load"))
+    arg_parser.add_argument("path", help="Snapshot file")
+    arg_parser.add_argument("--posts", help="JSON list of placement posts to index before saving")
+    arg_parser.add_argument("--matcher", action="store_true", help="Services canonicalize skill aliases")
+    args = arg_parser.parse_args()
+    
+    matcher = get_default_matcher() if args.matcher else None
+    parser, recommender, analyzer = ResumeParser(), PlacementRecommender(matcher), SkillGapAnalyzer(matcher)
+    if args.command == "save":
+        if args.posts:
+            with open(args.posts, encoding="utf-8") as f:
+                recommender.register_posts(json.load(f))
+        parser.nlp
+        print(json.dumps(save_snapshot(args.path, parser, recommender, analyzer), indent=2))
+    else:
+        try:
+            load_snapshot(args.path)
+        except (OSError, SnapshotError) as exc:
+            sys.exit(f"error: {exc}")
+        print(json.dumps(warm_start(args.path, parser, recommender, analyzer), indent=2))
@@ -0,0 +1,75 @@
+"""Attendance anomaly detection: matrix and incremental paths against detect_anomalies"""
+import random
+
+import numpy as np
+
+from benchmarks.generators import attendance_records, generate_cohort
+from services.attendance import AttendanceAnomalyDetector, AttendanceState, IncrementalAnomalyDetector
+from services.wire import packb, unpackb
+
+
+def test_incremental_detector_keys_students_by_str():
+    detector = IncrementalAnomalyDetector()
+    detector.record(42, "2024-01-01", 0)
+    detector.record("42", "2024-01-02", 0)
+    assert list(detector.states) == ["42"]
+    assert detector.status(42) == detector.status("42")
+    
+    restored = IncrementalAnomalyDetector()
+    restored.restore(detector.snapshot())
+    restored.record(42, "2024-01-03", 1)
+    assert list(restored.states) == ["42"]
+    
+    detector.record(42, "2024-01-03", 1)
+    assert restored.status(42) == detector.status(42)
+
+
+def _cohort_records(seed: int, students: int, sessions: int):
+    cohort = generate_cohort(seed=seed, students=students, sessions=sessions)
+    return cohort, [attendance_records(cohort, i) for i in range(students)]
+
+
+def test_matrix_matches_detect_anomalies():
+    detector = AttendanceAnomalyDetector()
+    for sessions in (1, 4, 13, 39, 90):
+        cohort, records = _cohort_records(seed=sessions, students=150, sessions=sessions)
+        matrix = detector.detect_anomalies_matrix(cohort["attendance"], cohort["dates"])
+        assert matrix == [detector.detect_anomalies(r) for r in records]
+
+
+def test_incremental_matches_detect_anomalies():
+    detector = AttendanceAnomalyDetector()
+    cohort, records = _cohort_records(seed=5, students=60, sessions=45)
+    incremental = IncrementalAnomalyDetector()
+    for day in range(45):
+        for i, student in enumerate(cohort["students"]):
+            status = incremental.record(student["student_id"], cohort["dates"][day], int(cohort["attendance"][i, day]))
+            if day % 11 == 0 or day == 44:
+                assert status == detector.detect_anomalies(records[i][:day + 1])
+        if day == 22:
+            # Restoring from a snapshot mid-term changes nothing
+            restored = IncrementalAnomalyDetector()
+            restored.restore(unpackb(packb(incremental.snapshot())))
+            incremental = restored
+    
+    reloaded = IncrementalAnomalyDetector()
+    for i, student in enumerate(cohort["students"]):
+        assert reloaded.load_history(student["student_id"], records[i]) == incremental.status(student["student_id"])
+
+
+def test_state_matches_detect_anomalies_at_z_boundaries():
+    # Absence counts whose z-score lands on the threshold in floating point
+    rng = random.Random(3)
+    detector = AttendanceAnomalyDetector()
+    for n, present in [(13, 9), (26, 18), (39, 27), (52, 36)]:
+        for _ in range(10):
+            statuses = [1] * present + [0] * (n - present)
+            rng.shuffle(statuses)
+            records = [{"date": f"2024-01-{day:02d}", "status": s} for day, s in enumerate(statuses, 1)]
+            state = AttendanceState()
+            for record in records:
+                state.update(record["date"], record["status"])
+            expected = detector.detect_anomalies(records)
+            assert state.result() == expected
+            matrix = np.array([statuses], dtype=np.uint8)
+            assert detector.detect_anomalies_matrix(matrix, [r["date"] for r in records])[0] == expected
@@ -0,0 +1,17 @@
+"""Attendance export ingestion: format detection"""
+import pytest
+
+from services.attendance_ingest import IngestError, iter_rows
+
+
+def test_legacy_xls_is_rejected(tmp_path):
+    path = tmp_path / "attendance.xls"
+    path.write_bytes(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1" + bytes(504))
+    with pytest.raises(IngestError, match="legacy .xls"):
+        iter_rows(path)
+
+
+def test_csv_rows(tmp_path):
+    path = tmp_path / "attendance.csv"
+    path.write_text("student_id,date,status\n1,2024-01-02,1\n", encoding="utf-8")
+    assert [row[:2] for row in iter_rows(path)] == [["student_id", "date"], ["1", "2024-01-02"]]
@@ -0,0 +1,23 @@
+"""Request coalescing: MicroBatcher lifecycle"""
+import asyncio
+
+import pytest
+
+from services.batching import BatcherClosedError, MicroBatcher
+
+
+def test_close_fails_waiting_items_and_later_submits():
+    async def scenario():
+        batcher = MicroBatcher(lambda items: [item * 2 for item in items], max_batch_size=2, max_wait_ms=60_000)
+        assert await asyncio.wait_for(asyncio.gather(batcher.submit(1), batcher.submit(2)), 5) == [2, 4]
+        
+        # A batch that would wait a minute for a second item
+        pending = asyncio.create_task(batcher.submit(3))
+        await asyncio.sleep(0.01)
+        await batcher.close()
+        with pytest.raises(BatcherClosedError):
+            await asyncio.wait_for(pending, 5)
+        with pytest.raises(BatcherClosedError):
+            await batcher.submit(4)
+    
+    asyncio.run(scenario())
@@ -0,0 +1,41 @@
+"""Campus-wide scan: cohort validation and run status"""
+import numpy as np
+import pytest
+
+from services.campus_scan import CampusCohort, CampusScan
+
+STUDENTS = [
+    {"student_id": i, "department": "CSE" if i % 2 else "ECE", "attendance": 60 + i,
+     "internal_marks": [50 + i, 70], "skills": ["python"] if i % 3 else [], "applications_count": i % 4,
+     "semester": 1 + i % 8}
+    for i in range(10)
+]
+
+
+def test_failed_shard_marks_the_run_failed():
+    scan = CampusScan(workers=1, shard_size=4)
+    
+    def progress(status):
+        if status["shards_done"] == 2:
+            raise RuntimeError("merge target unavailable")
+    
+    with pytest.raises(RuntimeError):
+        scan.run(CampusCohort.from_records(STUDENTS), progress=progress)
+    status = scan.status()
+    assert status["state"] == "failed"
+    assert status["error"] == "merge target unavailable"
+    assert status["shards_done"] == 2
+    
+    scan.run(CampusCohort.from_records(STUDENTS))
+    assert scan.status()["state"] == "finished" and "error" not in scan.status()
+
+
+@pytest.mark.parametrize("column", ["marks_offsets", "applications_count", "semester"])
+def test_cohort_rejects_misaligned_columns(column):
+    cohort = CampusCohort.from_records(STUDENTS)
+    columns = dict(student_ids=cohort.student_ids, departments=cohort.departments, attendance=cohort.attendance,
+                   marks_values=cohort.marks_values, marks_offsets=cohort.marks_offsets, skills=cohort.skills,
+                   applications_count=cohort.applications_count, semester=cohort.semester)
+    columns[column] = np.asarray(columns[column])[:-1]
+    with pytest.raises(ValueError):
+        CampusCohort(**columns)
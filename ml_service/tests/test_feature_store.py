@@ -0,0 +1,72 @@
+"""Feature store: what is written reads back, and stored scoring matches direct scoring"""
+import pytest
+
+from benchmarks.generators import attendance_records, generate_cohort
+from services.attendance import AttendanceAnomalyDetector
+from services.feature_store import ID_WIDTH, FeatureStore
+from services.risk import RiskPredictor
+
+# IDs that stress the fixed-width column: non-string, multi-byte, exactly full
+ODD_IDS = [42, "étudiant-7", "学生" * 10, "x" * ID_WIDTH, "é" * (ID_WIDTH // 2)]
+
+
+@pytest.fixture
+def cohort():
+    cohort = generate_cohort(seed=23, students=40, sessions=20)
+    for student, student_id in zip(cohort["students"], ODD_IDS):
+        student["student_id"] = student_id
+    return cohort
+
+
+@pytest.fixture
+def store(tmp_path, cohort):
+    store = FeatureStore(str(tmp_path))
+    store.upsert_students(cohort["students"])
+    store.append_attendance([
+        {"student_id": s["student_id"], **record}
+        for i, s in enumerate(cohort["students"]) for record in attendance_records(cohort, i)
+    ])
+    return store
+
+
+def test_students_read_back_by_str_id(tmp_path, cohort, store):
+    reopened = FeatureStore(str(tmp_path))
+    assert reopened.student_ids() == [str(s["student_id"]) for s in cohort["students"]]
+    for i, s in enumerate(cohort["students"]):
+        expected = {
+            "student_id": str(s["student_id"]),
+            "attendance": s["attendance"],
+            "internal_marks": s["internal_marks"],
+            "skills": [skill.lower() for skill in s["skills"]],
+            "applications_count": s["applications_count"],
+            "semester": s["semester"]
+        }
+        for reader in (store, reopened):
+            assert reader.student(s["student_id"]) == expected
+            assert reader.attendance_history(s["student_id"]) == attendance_records(cohort, i)
+
+
+def test_overlong_ids_are_rejected_by_every_writer(store):
+    too_long = "é" * (ID_WIDTH // 2) + "x"
+    with pytest.raises(ValueError):
+        store.upsert_students([{"student_id": too_long, "attendance": 90}])
+    with pytest.raises(ValueError):
+        store.append_attendance([{"student_id": too_long, "date": "2024-07-01", "status": 1}])
+    assert too_long not in store and too_long[:-1] in store
+
+
+def test_stored_scoring_matches_direct_scoring(cohort, store):
+    students = cohort["students"]
+    stored = RiskPredictor().predict_stored(store)
+    direct = RiskPredictor().predict_batch(
+        [s["attendance"] for s in students], [s["internal_marks"] for s in students],
+        [len(s["skills"]) for s in students], [s["applications_count"] for s in students],
+        [s["semester"] for s in students]
+    )
+    assert stored == {"student_ids": [str(s["student_id"]) for s in students], **direct}
+    
+    detector = AttendanceAnomalyDetector()
+    assert detector.detect_stored(store) == {
+        str(s["student_id"]): detector.detect_anomalies(attendance_records(cohort, i))
+        for i, s in enumerate(students)
+    }
@@ -0,0 +1,54 @@
+"""On-demand profiling: the per-process capture lock"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services import profiling
+
+
+@pytest.fixture
+def controller(tmp_path):
+    controller = profiling.ProfileController(str(tmp_path))
+    controller.start("/parse-resume", mode="deterministic", requests=5)
+    yield controller
+    controller.close()
+
+
+def test_capture_lock_released_when_artifact_write_fails(controller):
+    capture = controller.profile("/parse-resume")
+    capture.spec["directory"] = os.path.join(capture.spec["directory"], "\0")
+    with pytest.raises(ValueError):
+        with capture:
+            pass
+    assert not profiling._capture_lock.locked()
+
+
+def test_capture_lock_released_when_call_cancelled_before_thread_starts(controller):
+    release = threading.Event()
+    
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        # One busy worker, so the captured call queues and never starts
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=1))
+        blocker = loop.run_in_executor(None, release.wait)
+        task = asyncio.create_task(controller.call("/parse-resume", lambda: "parsed"))
+        await asyncio.sleep(0.05)
+        assert profiling._capture_lock.locked()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        release.set()
+        await blocker
+    
+    asyncio.run(scenario())
+    assert not profiling._capture_lock.locked()
+
+
+def test_call_profiles_and_returns_result(controller):
+    assert asyncio.run(controller.call("/parse-resume", sum, [1, 2, 3])) == 6
+    assert not profiling._capture_lock.locked()
+    session_id = controller.sessions()[0]["id"]
+    assert len(controller.artifacts(session_id)) == 1
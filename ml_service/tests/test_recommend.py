@@ -0,0 +1,48 @@
+"""Placement recommendations: the post index against the full scan"""
+import random
+
+from benchmarks.generators import generate_posts, skill_vocabulary
+from services.recommend import PlacementRecommender
+from services.skill_matcher import get_default_matcher
+
+
+def _student_skills(rng: random.Random, vocabulary):
+    # Mixed casing and partial names exercise the substring rule
+    skills = rng.sample(vocabulary, rng.randint(0, 6))
+    return [s.upper() if rng.random() < 0.3 else s[:max(2, len(s) - 2)] if rng.random() < 0.2 else s
+            for s in skills]
+
+
+def test_recommend_indexed_matches_recommend():
+    rng = random.Random(13)
+    vocabulary = skill_vocabulary()
+    for matcher in (None, get_default_matcher()):
+        recommender = PlacementRecommender(matcher)
+        posts = {post["id"]: post for post in generate_posts(seed=13, count=150)}
+        recommender.register_posts(list(posts.values()))
+        
+        for step in range(120):
+            if step % 4 == 0:
+                post_id = rng.choice(list(posts))
+                if rng.random() < 0.5:
+                    del posts[post_id]
+                    recommender.remove_post(post_id)
+                else:
+                    post = dict(posts[post_id], required_skills=rng.sample(vocabulary, rng.randint(0, 5)))
+                    posts[post_id] = post
+                    recommender.register_posts([post])
+            skills = _student_skills(rng, vocabulary)
+            expected = recommender.recommend(skills, list(posts.values()))
+            assert recommender.recommend_indexed(skills) == expected
+            assert recommender.recommend_indexed(skills, top_k=5) == expected[:5]
+
+
+def test_restored_index_matches_original():
+    rng = random.Random(17)
+    recommender = PlacementRecommender(get_default_matcher())
+    recommender.register_posts(generate_posts(seed=17, count=80))
+    restored = PlacementRecommender(get_default_matcher())
+    restored.restore(recommender.snapshot())
+    for _ in range(50):
+        skills = _student_skills(rng, skill_vocabulary())
+        assert restored.recommend_indexed(skills, top_k=10) == recommender.recommend_indexed(skills, top_k=10)
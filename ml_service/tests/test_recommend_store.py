@@ -0,0 +1,55 @@
+"""Materialized recommendations against querying the post index"""
+import random
+
+from benchmarks.generators import generate_cohort, generate_posts, skill_vocabulary
+from services.recommend import PlacementRecommender
+from services.recommend_store import RecommendationStore
+
+
+def _assert_matches_index(store, students, posts):
+    reference = PlacementRecommender()
+    reference.register_posts(posts)
+    for student_id, skills in students.items():
+        assert store.get(student_id) == reference.index.query(skills, store.top_k), student_id
+
+
+def test_store_matches_index_query_through_writes(tmp_path):
+    rng = random.Random(19)
+    vocabulary = skill_vocabulary()
+    cohort = generate_cohort(seed=19, students=200, sessions=1)["students"]
+    posts = generate_posts(seed=19, count=120)
+    db_path = str(tmp_path / "recommend.db")
+    
+    store = RecommendationStore(top_k=8, db_path=db_path)
+    store.upsert_posts(posts[:80])
+    store.set_students(cohort)
+    students = {s["student_id"]: s["skills"] for s in cohort}
+    live = {post["id"]: post for post in posts[:80]}
+    
+    for step in range(120):
+        roll = rng.random()
+        if roll < 0.3:
+            post = posts[80 + step % 40]
+            live[post["id"]] = post
+            store.upsert_post(post)
+        elif roll < 0.55:
+            post_id = rng.choice(list(live))
+            live[post_id] = dict(live[post_id], required_skills=rng.sample(vocabulary, rng.randint(0, 4)))
+            store.upsert_post(live[post_id])
+        elif roll < 0.75:
+            post_id = rng.choice(list(live))
+            del live[post_id]
+            store.remove_post(post_id)
+        else:
+            student_id = rng.choice(list(students))
+            students[student_id] = rng.sample(vocabulary, rng.randint(0, 5))
+            store.set_student(student_id, students[student_id])
+    
+    # The reference registers posts in the store index's order, which breaks score ties
+    order = [live[post_id] for post_id in store.index._posts]
+    _assert_matches_index(store, students, order)
+    store.close()
+    
+    reopened = RecommendationStore(top_k=8, db_path=db_path)
+    _assert_matches_index(reopened, students, order)
+    reopened.close()
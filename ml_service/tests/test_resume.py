@@ -0,0 +1,35 @@
+"""Resume parsing: section segmentation and page handling"""
+from benchmarks.generators import render_pdf
+from services.resume import ResumeParser, extract_text, segment_sections
+
+SUMMARY = "Final year student who enjoys building reliable backend services and data pipelines"
+
+
+def test_about_me_heading_is_summary():
+    sections = segment_sections(f"Jane Doe\nAbout Me\n{SUMMARY}\nSkills\nPython")
+    assert sections["summary"] == [SUMMARY]
+    
+    pdf = render_pdf(f"Jane Doe\njane@example.com\nAbout Me\n{SUMMARY}\nSkills\nPython")
+    assert ResumeParser().parse(pdf)["summary"] == SUMMARY
+
+
+def test_heading_at_top_of_page_starts_its_section():
+    lines = ["Jane Doe", "jane@example.com", "Skills", "Python, Flask", "Experience", "Intern at Acme"]
+    pdf = render_pdf("\n".join(lines), lines_per_page=4)
+    assert "Flask\nExperience" in extract_text(pdf)
+    assert ResumeParser().parse(pdf)["experience"] == ["Intern at Acme"]
+
+
+def test_early_exit_reads_the_page_after_the_last_heading():
+    page_1 = ["Jane Doe", "jane@example.com", "Skills", "Python", "Education", "B.Tech CSE", "Projects", "Web app",
+              "Experience", "Intern at Acme"]
+    page_2 = ["Backend intern at Initech"] + ["Shipped billing APIs"] * (len(page_1) - 1)
+    page_3 = ["Unread trailing page"]
+    pdf = render_pdf("\n".join(page_1 + page_2 + page_3), lines_per_page=len(page_1))
+    
+    text = extract_text(pdf, early_exit=True)
+    assert "Backend intern at Initech" in text
+    assert "Unread trailing page" not in text
+    
+    two_pages = render_pdf("\n".join(page_1 + page_2), lines_per_page=len(page_1))
+    assert ResumeParser(early_exit=True).parse(two_pages) == ResumeParser().parse(two_pages)
@@ -0,0 +1,44 @@
+"""Resume pipeline: per-resume timeout inside the worker"""
+import signal
+import time
+
+import pytest
+
+from services import resume_pipeline
+from services.resume_pipeline import ResumeParseTimeout, _parse_in_worker
+
+pytestmark = pytest.mark.skipif(not hasattr(signal, "SIGALRM"), reason="needs SIGALRM")
+
+
+class _SlowParser:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+    
+    def parse(self, pdf_bytes, max_pages=None):
+        deadline = time.perf_counter() + self.seconds
+        while time.perf_counter() < deadline:
+            pass
+        return {"pages": max_pages}
+
+
+def test_slow_parse_times_out(monkeypatch):
+    monkeypatch.setattr(resume_pipeline, "_worker_parser", _SlowParser(0.2))
+    with pytest.raises(ResumeParseTimeout):
+        _parse_in_worker(b"", None, 0.01)
+    assert signal.getsignal(signal.SIGALRM) is not resume_pipeline._raise_deadline
+
+
+def test_alarm_arriving_just_before_disarm_is_a_timeout(monkeypatch):
+    real_setitimer = signal.setitimer
+    
+    def late_alarm(which, seconds, *interval):
+        if seconds == 0 and real_setitimer(which, 0) != (0.0, 0.0):
+            # The timer expires right as the finished parse disarms it
+            signal.getsignal(signal.SIGALRM)(signal.SIGALRM, None)
+        return real_setitimer(which, seconds, *interval)
+    
+    monkeypatch.setattr(resume_pipeline, "_worker_parser", _SlowParser(0))
+    monkeypatch.setattr(signal, "setitimer", late_alarm)
+    with pytest.raises(ResumeParseTimeout):
+        _parse_in_worker(b"", None, 5)
+    assert signal.getsignal(signal.SIGALRM) is not resume_pipeline._raise_deadline
@@ -0,0 +1,26 @@
+"""Risk prediction: vectorized batch against the per-student path"""
+from benchmarks.generators import generate_cohort
+from services.risk import RISK_FACTOR_MESSAGES, RiskPredictor
+
+
+def test_predict_batch_matches_predict():
+    students = generate_cohort(seed=11, students=400, sessions=30)["students"]
+    # Threshold values, where a float/int mix-up would change the level
+    for student, attendance in zip(students, [60, 59.99, 75, 74.9, 100, 0]):
+        student["attendance"] = attendance
+    predictor = RiskPredictor()
+    
+    batch = predictor.predict_batch(
+        [s["attendance"] for s in students], [s["internal_marks"] for s in students],
+        [len(s["skills"]) for s in students], [s["applications_count"] for s in students],
+        [s["semester"] for s in students]
+    )
+    for i, s in enumerate(students):
+        single = predictor.predict(s["attendance"], s["internal_marks"], len(s["skills"]),
+                                   s["applications_count"], s["semester"])
+        assert single == {
+            "risk_level": batch["risk_levels"][i],
+            "risk_score": batch["risk_scores"][i],
+            "risk_factors": [RISK_FACTOR_MESSAGES[code] for code in batch["risk_factors"][i]],
+            "recommendations": batch["recommendation_sets"][batch["recommendation_index"][i]]
+        }
@@ -0,0 +1,33 @@
+"""TF-IDF skill engine: shared engines per matcher"""
+import gc
+
+from services import skill_vectors
+from services.skill_matcher import SkillMatcher
+from services.skill_vectors import get_default_engine, has_default_engine, set_default_engine
+
+SKILLS = {"Python": ["py"], "React": ["react.js", "reactjs"], "SQL": []}
+
+
+def test_shared_engine_is_dropped_with_its_matcher():
+    matcher = SkillMatcher(SKILLS)
+    engine = get_default_engine(matcher)
+    assert get_default_engine(matcher) is engine and has_default_engine(matcher)
+    assert engine.display("ReactJS") == "react"
+    
+    before = len(skill_vectors._default_engines)
+    del matcher, engine
+    gc.collect()
+    assert len(skill_vectors._default_engines) == before - 1
+
+
+def test_restored_engine_replaces_the_shared_one():
+    matcher = SkillMatcher(SKILLS)
+    restored = type(get_default_engine(matcher)).from_snapshot(get_default_engine(matcher).snapshot(), matcher)
+    set_default_engine(restored)
+    assert get_default_engine(matcher) is restored
+
+
+def test_matcher_terms_cover_canonical_names_and_aliases():
+    matcher = SkillMatcher(SKILLS)
+    assert set(matcher.terms) == {"python", "py", "react", "react.js", "reactjs", "sql"}
+    assert all(matcher.canonicalize(term) in matcher.canonical for term in matcher.terms)
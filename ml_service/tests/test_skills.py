@@ -0,0 +1,26 @@
+"""Skill gap analysis: the cohort x posts matrix against analyze()"""
+import numpy as np
+import pytest
+
+from benchmarks.generators import generate_cohort, generate_posts
+from services.skill_matcher import get_default_matcher
+from services.skills import SkillGapAnalyzer
+from services.wire import InternedLists
+
+
+@pytest.mark.parametrize("engine", ["substring", "tfidf"])
+@pytest.mark.parametrize("canonicalize", [False, True])
+def test_analyze_matrix_matches_analyze(engine, canonicalize):
+    students = [s["skills"] for s in generate_cohort(seed=7, students=120, sessions=1)["students"]]
+    posts = [p["required_skills"] for p in generate_posts(seed=7, count=25)]
+    analyzer = SkillGapAnalyzer(get_default_matcher() if canonicalize else None)
+    
+    result = analyzer.analyze_matrix(students, posts, engine=engine)
+    for i, skills in enumerate(students):
+        for j, required in enumerate(posts):
+            expected = analyzer.analyze(skills, required, engine=engine)["match_percentage"]
+            assert result["match_percentages"][i][j] == expected
+    
+    interned = analyzer.analyze_matrix(InternedLists.from_lists(students), posts, engine=engine, as_arrays=True)
+    assert np.array_equal(interned["match_percentages"], np.array(result["match_percentages"]))
+    assert interned["posts"] == result["posts"]
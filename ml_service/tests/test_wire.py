@@ -0,0 +1,56 @@
+"""Wire format: NumPy blobs and interned lists"""
+import numpy as np
+import pytest
+
+from benchmarks.generators import generate_cohort
+from services.attendance import AttendanceAnomalyDetector
+from services.wire import CONTENT_TYPE_MSGPACK, InternedLists, WireFormatError, decode_body, encode_body, packb, unpackb
+
+
+def test_cohort_document_round_trip():
+    cohort = generate_cohort(seed=29, students=300, sessions=45)
+    students = cohort["students"]
+    document = {
+        "dates": cohort["dates"],
+        "attendance": cohort["attendance"].astype(bool),
+        "marks": np.random.default_rng(29).random((300, 5)),
+        "skills": InternedLists.from_lists([s["skills"] for s in students]),
+        "students": [{k: v for k, v in s.items() if k != "skills"} for s in students],
+        "scalars": [None, True, -1, 2 ** 40, 1.5, "é", b"\x00\xff", {"nested": [[]]}]
+    }
+    body, content_type = encode_body(document, "application/x-msgpack, application/json;q=0.5")
+    assert content_type == CONTENT_TYPE_MSGPACK
+    decoded = decode_body(body, "application/msgpack; charset=binary")
+    
+    assert np.array_equal(decoded["attendance"], document["attendance"])
+    assert np.array_equal(decoded["marks"], document["marks"])
+    assert decoded["skills"].to_lists() == [s["skills"] for s in students]
+    assert {k: decoded[k] for k in ("dates", "students", "scalars")} == \
+        {k: document[k] for k in ("dates", "students", "scalars")}
+    
+    detector = AttendanceAnomalyDetector()
+    assert (detector.detect_anomalies_matrix(decoded["attendance"], decoded["dates"])
+            == detector.detect_anomalies_matrix(cohort["attendance"], cohort["dates"]))
+
+
+def test_interned_lists_round_trip():
+    lists = [["python", "sql"], [], ["sql", "react", "python"]]
+    decoded = unpackb(packb({"skills": InternedLists.from_lists(lists)}))["skills"]
+    assert isinstance(decoded, InternedLists)
+    assert decoded.to_lists() == lists
+
+
+@pytest.mark.parametrize("vocabulary, offsets, ids", [
+    (["a", "b"], [0, 2, 1, 2], [0, 1]),            # decreasing offsets
+    (["a", "b"], [0.0, 1.0, 2.0], [0, 1]),         # float offsets
+    (["a", "b"], [0, 1, 2], [[0, 1]]),             # 2-D IDs
+    (["a", "b"], [0, 1, 2], [0.5, 1.0]),           # float IDs
+    (["a", 2], [0, 1, 2], [0, 1]),                 # non-string vocabulary
+    (["a"], [0, 1, 2], [0, 1]),                    # ID out of range
+])
+def test_malformed_interned_lists_are_rejected(vocabulary, offsets, ids):
+    with pytest.raises(WireFormatError):
+        InternedLists(vocabulary, np.array(offsets), np.array(ids))
+    document = packb({"__interned__": vocabulary, "offsets": np.array(offsets), "ids": np.array(ids)})
+    with pytest.raises(WireFormatError):
+        unpackb(document)